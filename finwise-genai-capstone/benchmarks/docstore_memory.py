@@ -0,0 +1,110 @@
+"""Heap memory of the RAG chunk store: pickled LangChain Documents vs the compact docstore.
+
+Builds a synthetic corpus of PDF chunks (about 1,000 characters each, with
+the metadata PyPDFLoader and dedup attach), then measures with tracemalloc:
+
+- pickled: what FAISS.load_local rebuilds, an InMemoryDocstore-style dict of
+  Documents plus the position -> UUID map;
+- compact: opening the memory-mapped CompactDocstore (arena, offsets and
+  metadata columns are page cache, not heap).
+
+Also times materializing the top-k Documents of random queries from the
+compact store. Figures are extrapolated to a million chunks.
+
+Usage:
+    python benchmarks/docstore_memory.py --chunks 200000 --top-k 4
+"""
+import argparse
+import os
+import pickle
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "task-03-04-Rag")]
+
+from langchain_core.documents import Document
+
+from compact_docstore import CompactDocstore, write_docstore
+
+WORDS = ("revenue profit crore lakh margin fund scheme risk equity debt portfolio quarter growth interest "
+         "liquidity credit exposure provision dividend capital asset liability").split()
+
+
+def synthetic_chunks(n, seed=7, chars=1000):
+    rng = random.Random(seed)
+    vocabulary = WORDS + [f"₹{rng.randint(1, 99999):,}" for _ in range(50)]
+    texts, metadatas = [], []
+    for i in range(n):
+        words = []
+        while sum(len(w) + 1 for w in words) < chars:
+            words.append(rng.choice(vocabulary))
+        texts.append(" ".join(words))
+        document = i // 400  # ~400 chunks per report
+        metadata = {"source": f"/home/finwise/.finwise/uploads/{document:064x}.pdf", "page": (i % 400) // 3,
+                    "producer": "Microsoft® Word for Microsoft 365", "creator": "Microsoft® Word",
+                    "total_pages": 134, "page_label": str((i % 400) // 3 + 1)}
+        if rng.random() < 0.05:
+            metadata.update(pages=[metadata["page"], metadata["page"] + 40], duplicates=1)
+        metadatas.append(metadata)
+    return texts, metadatas
+
+
+def measure(load):
+    tracemalloc.start()
+    result = load()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=200_000)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    texts, metadatas = synthetic_chunks(args.chunks)
+    directory = tempfile.mkdtemp(prefix="docstore-bench-")
+    try:
+        ids = [str(uuid.uuid4()) for _ in texts]
+        pickled = pickle.dumps(({i: Document(page_content=t, metadata=m) for i, t, m in zip(ids, texts, metadatas)},
+                                dict(enumerate(ids))))
+        start = time.perf_counter()
+        write_docstore(os.path.join(directory, "docstore"), texts, metadatas)
+        write_s = time.perf_counter() - start
+        del texts, metadatas
+
+        start = time.perf_counter()
+        legacy, legacy_bytes = measure(lambda: pickle.loads(pickled))
+        legacy_s = time.perf_counter() - start
+        del legacy, pickled
+
+        start = time.perf_counter()
+        store, compact_bytes = measure(lambda: CompactDocstore(os.path.join(directory, "docstore")))
+        open_s = time.perf_counter() - start
+
+        rng = random.Random(1)
+        start = time.perf_counter()
+        for _ in range(args.queries):
+            [store[rng.randrange(len(store))] for _ in range(args.top_k)]
+        fetch_ms = (time.perf_counter() - start) / args.queries * 1000
+
+        per_million = 1_000_000 / args.chunks / 1e6
+        print(f"{args.chunks:,} chunks ({store.mapped_nbytes / 1e6:,.1f} MB on disk, written in {write_s:.1f} s)")
+        print(f"pickled Documents  heap {legacy_bytes * per_million:10,.1f} MB per million chunks, load {legacy_s:.2f} s")
+        print(f"compact docstore   heap {compact_bytes * per_million:10,.1f} MB per million chunks, open {open_s * 1000:.1f} ms")
+        print(f"reduction          {legacy_bytes / max(compact_bytes, 1):10,.0f}x")
+        print(f"top-{args.top_k} fetch        {fetch_ms:10.3f} ms per query")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
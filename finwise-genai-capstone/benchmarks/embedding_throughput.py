@@ -0,0 +1,84 @@
+"""Embedding throughput and parity: PyTorch MiniLM vs int8 ONNX Runtime.
+
+Encodes a synthetic corpus of financial-report sentences with both backends,
+reports texts/second for ingestion-style batches and single-query latency,
+and checks cosine parity of the ONNX vectors against the PyTorch ones.
+
+Usage:
+    python benchmarks/embedding_throughput.py --texts 2000 --min-cosine 0.99
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "task-03-04-Rag")]
+
+from onnx_embeddings import DEFAULT_MODEL, OnnxMiniLMEmbeddings, check_parity
+
+TEMPLATES = [
+    "Net revenue for the quarter rose {pct}% to ₹{amt} crore, driven by {segment}.",
+    "The {fund} fund returned {pct}% against a benchmark return of {pct2}%.",
+    "Expense ratio for the direct plan is {pct}% per annum as per Section {sec} of the scheme document.",
+    "Risk factors include interest rate movements, credit events in {segment} and liquidity constraints.",
+    "The board approved a dividend of ₹{amt} per share for FY{year}.",
+]
+
+
+def synthetic_corpus(n, seed=7):
+    rng = random.Random(seed)
+    return [
+        rng.choice(TEMPLATES).format(
+            pct=round(rng.uniform(-5, 25), 2), pct2=round(rng.uniform(-5, 25), 2),
+            amt=rng.randint(10, 99999), segment=rng.choice(["retail lending", "IT services", "infrastructure"]),
+            fund=rng.choice(["Tech Innovators", "Bond Stabilizer", "Equity Growth"]),
+            sec=f"{rng.randint(1, 12)}.{rng.randint(1, 9)}", year=rng.randint(2019, 2025),
+        ) * rng.randint(1, 6)  # Vary lengths so bucketing by sequence length matters
+        for _ in range(n)
+    ]
+
+
+def throughput(embeddings, texts, queries):
+    start = time.perf_counter()
+    embeddings.embed_documents(texts)
+    docs_per_s = len(texts) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for query in queries:
+        embeddings.embed_query(query)
+    query_ms = (time.perf_counter() - start) / len(queries) * 1000
+    return docs_per_s, query_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    args = parser.parse_args()
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    texts = synthetic_corpus(args.texts)
+    queries = [text[:80] for text in texts[:args.queries]]
+    backends = {
+        "pytorch": HuggingFaceEmbeddings(model_name=DEFAULT_MODEL),
+        "onnx-int8": OnnxMiniLMEmbeddings(DEFAULT_MODEL),
+    }
+    for embeddings in backends.values():
+        embeddings.embed_documents(texts[:16])  # Warm up
+
+    results = {name: throughput(embeddings, texts, queries) for name, embeddings in backends.items()}
+    for name, (docs_per_s, query_ms) in results.items():
+        print(f"{name:>10}: {docs_per_s:8.1f} texts/s (ingestion)  {query_ms:6.2f} ms/query")
+    speedup = results["onnx-int8"][0] / results["pytorch"][0]
+    print(f"ingestion speedup: {speedup:.2f}x")
+
+    parity = check_parity(backends["onnx-int8"], backends["pytorch"], texts[:500], args.min_cosine)
+    print(f"cosine parity: min {parity['min']:.4f}, mean {parity['mean']:.4f} -> {'OK' if parity['passed'] else 'FAILED'}")
+    sys.exit(0 if parity["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Throughput of the offline CPU model: sequential vs batched decoding, prefix reuse, int8 vs fp32.
+
+Runs the local engine (finwise_common.local_llm) on RAG-style prompts that
+share a long instruction and context prefix and differ in the question:
+
+- sequential: one request at a time (batch size 1, prefix cache off), what a
+  plain ``pipeline("text-generation")`` call per question does;
+- batched: every request submitted at once, decoded together;
+- prefix reuse: the same prompts again with the KV cache of the shared
+  prefix kept, so only each question suffix is prefilled.
+
+With --compare-fp32 the sequential run is repeated with unquantized weights.
+Greedy decoding with EOS ignored, so every request produces --new-tokens.
+
+Usage:
+    python benchmarks/local_llm.py --requests 8 --new-tokens 64
+    python benchmarks/local_llm.py --model /path/to/model --compare-fp32
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT]
+
+from finwise_common.local_llm import DEFAULT_MODEL, LocalInferenceEngine, load_model
+
+CONTEXT = ("Use the following pieces of context to answer the question at the end. If you don't know the answer, "
+           "just say that you don't know.\n\n" + " ".join(
+               f"In FY{2015 + i % 10} the bank's net interest income rose {i % 17 + 3}% to ₹{1200 + 37 * i:,} crore, "
+               f"with gross NPAs at {1.1 + i % 9 / 10:.1f}% and a capital adequacy ratio of {14 + i % 5}.{i % 10}%."
+               for i in range(24)))
+QUESTIONS = ["What was the net interest income in FY2019?", "How did gross NPAs change over the period?",
+             "What is the latest capital adequacy ratio?", "Which year had the fastest income growth?",
+             "Summarize the asset quality trend.", "Was the bank adequately capitalized?",
+             "What drove the rise in interest income?", "Compare FY2016 and FY2023."]
+
+
+def run(engine, prompts, new_tokens, concurrent):
+    engine.eos_ids = set()  # Fixed-length outputs, so runs are comparable
+    start = time.perf_counter()
+    if concurrent:
+        results = [f.result() for f in [engine.submit(p, max_new_tokens=new_tokens) for p in prompts]]
+    else:
+        results = [engine.submit(p, max_new_tokens=new_tokens).result() for p in prompts]
+    elapsed = time.perf_counter() - start
+    tokens = sum(r["completion_tokens"] for r in results)
+    reused = sum(r["cached_prefix_tokens"] for r in results)
+    return elapsed, tokens / elapsed, reused
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--new-tokens", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--compare-fp32", action="store_true")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    tokenizer, model = load_model(args.model, quantize=True, num_threads=args.threads)
+    print(f"{args.model}: loaded with int8 weights in {time.perf_counter() - start:.1f} s")
+    prompts = [tokenizer(f"{CONTEXT}\n\nQuestion: {QUESTIONS[i % len(QUESTIONS)]}\nHelpful Answer:",
+                         add_special_tokens=False)["input_ids"] for i in range(args.requests)]
+    print(f"{args.requests} requests, {len(prompts[0])} prompt tokens each, {args.new_tokens} new tokens each")
+
+    sequential = LocalInferenceEngine(args.model, tokenizer=tokenizer, model=model, max_batch_size=1,
+                                      prefix_cache_tokens=0)
+    elapsed, rate, _ = run(sequential, prompts, args.new_tokens, concurrent=False)
+    print(f"sequential int8       {elapsed:7.2f} s  {rate:7.1f} tokens/s")
+
+    batched = LocalInferenceEngine(args.model, tokenizer=tokenizer, model=model, max_batch_size=args.requests,
+                                   prefix_cache_tokens=0)
+    elapsed, rate, _ = run(batched, prompts, args.new_tokens, concurrent=True)
+    print(f"batched int8          {elapsed:7.2f} s  {rate:7.1f} tokens/s  "
+          f"(mean batch {batched.stats()['mean_batch_size']:.1f})")
+
+    reuse = LocalInferenceEngine(args.model, tokenizer=tokenizer, model=model, max_batch_size=args.requests)
+    run(reuse, prompts[:1], 1, concurrent=False)  # Warms the shared prefix
+    elapsed, rate, reused = run(reuse, prompts, args.new_tokens, concurrent=True)
+    print(f"batched + prefix KV   {elapsed:7.2f} s  {rate:7.1f} tokens/s  "
+          f"({reused / (len(prompts[0]) * len(prompts)):.0%} of prompt tokens reused)")
+
+    if args.compare_fp32:
+        tokenizer, model = load_model(args.model, quantize=False, num_threads=args.threads)
+        fp32 = LocalInferenceEngine(args.model, tokenizer=tokenizer, model=model, max_batch_size=1,
+                                    prefix_cache_tokens=0)
+        elapsed, rate, _ = run(fp32, prompts, args.new_tokens, concurrent=False)
+        print(f"sequential fp32       {elapsed:7.2f} s  {rate:7.1f} tokens/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Load test of the SQL Q&A pipeline at several data scales.
+
+For each scale a synthetic DB is generated (see sql_synthetic_data.py) and a
+library of NL questions is fired concurrently through the app's pipeline:
+the analytics cache first, then the SQL agent with the schema catalog in its
+prompt and the digest query tool. A scripted stand-in LLM replaces Gemini.
+It maps each question to its SQL, then answers from the digest, with an
+optional fixed delay per call, so the figures measure the app and SQLite
+rather than a remote model.
+
+Reported per scale: throughput, end-to-end latency, SQL latency, agent
+steps and LLM calls per question, cache hits and errors. ``--no-agent``
+times the library's SQL through the digest tool alone (no LangChain needed).
+
+Usage:
+    python benchmarks/sql_load_test.py --scales 10000,100000,1000000 --concurrency 8 --rounds 3
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "task-05-sql-qa"), os.path.join(ROOT, "benchmarks")]
+
+from finwise_common.config import state_path
+from result_stream import digest_query
+from sql_synthetic_data import generate_database
+
+# (question, the SQL the stand-in LLM writes for it)
+QUESTIONS = [
+    ("List all high-risk clients with a portfolio above 10 lakh.",
+     "SELECT name, portfolio_value FROM clients WHERE risk_profile = 'High' AND portfolio_value > 1000000 "
+     "ORDER BY portfolio_value DESC LIMIT 10"),
+    ("What is the total amount invested in Tech Innovators?",
+     "SELECT SUM(amount_invested) FROM investments WHERE fund_name = 'Tech Innovators'"),
+    ("What is the average portfolio value by risk profile?",
+     "SELECT risk_profile, AVG(portfolio_value) FROM clients GROUP BY risk_profile"),
+    ("Which 10 clients have invested the most overall?",
+     "SELECT c.name, SUM(i.amount_invested) AS total FROM clients c JOIN investments i "
+     "ON c.client_id = i.client_id GROUP BY c.client_id ORDER BY total DESC LIMIT 10"),
+    ("How much was invested in each fund since 2024?",
+     "SELECT fund_name, SUM(amount_invested) FROM investments WHERE date >= '2024-01-01' GROUP BY fund_name"),
+    ("How many clients are older than 60?",
+     "SELECT COUNT(*) FROM clients WHERE age > 60"),
+    ("Show the investments of Client 42.",
+     "SELECT i.fund_name, i.amount_invested, i.date FROM investments i JOIN clients c "
+     "ON c.client_id = i.client_id WHERE c.name = 'Client 42'"),
+    ("Which clients above 1 crore hold Emerging Markets?",
+     "SELECT DISTINCT c.name, c.portfolio_value FROM clients c JOIN investments i ON c.client_id = i.client_id "
+     "WHERE c.portfolio_value > 10000000 AND i.fund_name = 'Emerging Markets' LIMIT 10"),
+    ("What is the largest single investment in Bond Stabilizer?",
+     "SELECT MAX(amount_invested) FROM investments WHERE fund_name = 'Bond Stabilizer'"),
+    ("Count investments by fund for low risk clients between 2020 and 2022.",
+     "SELECT i.fund_name, COUNT(*) FROM investments i JOIN clients c ON c.client_id = i.client_id "
+     "WHERE c.risk_profile = 'Low' AND i.date BETWEEN '2020-01-01' AND '2022-12-31' GROUP BY i.fund_name"),
+    ("What is the total invested per year?",
+     "SELECT substr(date, 1, 4) AS year, SUM(amount_invested) FROM investments GROUP BY year"),
+    ("Who are the youngest 5 clients with a High risk profile?",
+     "SELECT name, age FROM clients WHERE risk_profile = 'High' ORDER BY age LIMIT 5"),
+]
+SQL_FOR = dict(QUESTIONS)
+
+
+def make_stand_in_llm(latency_ms=0.0):
+    """ReAct-format LLM: one sql_db_query action per question, then a final answer from the digest."""
+    from langchain_core.language_models.llms import LLM
+
+    class ScriptedSQLLLM(LLM):
+        latency_ms: float = 0.0
+        calls: int = 0
+
+        @property
+        def _llm_type(self):
+            return "scripted-sql"
+
+        def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+            self.calls += 1  # Approximate under concurrency; only used for the per-question average
+            time.sleep(self.latency_ms / 1000)
+            question = re.findall(r"Question: (.+)", prompt)[-1].strip()
+            observations = re.findall(r"Observation: (.+)", prompt)
+            if observations:
+                return f"I now know the final answer.\nFinal Answer: {observations[-1].strip()}"
+            return f"I can query the database directly.\nAction: sql_db_query\nAction Input: {SQL_FOR[question]}"
+
+    return ScriptedSQLLLM(latency_ms=latency_ms)
+
+
+def build_agent(db_path, llm, on_query):
+    """The app's agent (catalog prompt, digest toolkit without introspection) around ``llm``."""
+    from langchain.agents import create_sql_agent
+    from langchain_community.utilities import SQLDatabase
+    from schema_catalog import AGENT_SUFFIX, agent_prefix, load_or_build
+    from sql_toolkit import DigestSQLToolkit
+
+    db = SQLDatabase.from_uri(f"sqlite:///{db_path}")
+    toolkit = DigestSQLToolkit(db=db, llm=llm, db_path=db_path, on_query=on_query, introspection=False)
+    return create_sql_agent(llm=llm, toolkit=toolkit, prefix=agent_prefix(load_or_build(db_path)),
+                            suffix=AGENT_SUFFIX, handle_parsing_errors=True,
+                            agent_executor_kwargs={"return_intermediate_steps": True})
+
+
+def _percentiles(values):
+    if not values:
+        return "-"
+    p50, p95 = np.percentile(values, [50, 95])
+    return f"p50 {p50:8.1f}  p95 {p95:8.1f}  max {max(values):8.1f}"
+
+
+def run_scale(db_path, args):
+    sql_ms, e2e_ms, steps, errors = [], [], [], []
+    cache_hits = 0
+    lock = threading.Lock()
+
+    def on_query(sql, elapsed_ms):
+        with lock:
+            sql_ms.append(elapsed_ms)
+
+    cache = agent = llm = None
+    if not args.no_agent:
+        from analytics_cache import AnalyticsCache
+        cache = None if args.no_analytics_cache else AnalyticsCache(db_path)
+        llm = make_stand_in_llm(args.llm_latency_ms)
+        agent = build_agent(db_path, llm, on_query)
+
+    def ask(question):
+        nonlocal cache_hits
+        start = time.perf_counter()
+        try:
+            if agent is None:
+                _, elapsed_ms = digest_query(db_path, SQL_FOR[question])
+                on_query(SQL_FOR[question], elapsed_ms)
+            elif cache is not None and cache.answer(question):
+                with lock:
+                    cache_hits += 1
+            else:
+                response = agent.invoke({"input": question})
+                with lock:
+                    steps.append(len(response.get("intermediate_steps", [])))
+        except Exception as e:
+            with lock:
+                errors.append(f"{question}: {e}")
+        with lock:
+            e2e_ms.append((time.perf_counter() - start) * 1000)
+
+    workload = [q for q, _ in QUESTIONS] * args.rounds
+    random.Random(1).shuffle(workload)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(ask, workload))
+    elapsed = time.perf_counter() - start
+    return {"questions": len(workload), "elapsed": elapsed, "sql_ms": sql_ms, "e2e_ms": e2e_ms, "steps": steps,
+            "llm_calls": llm.calls if llm else 0, "cache_hits": cache_hits, "errors": errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="10000,100000,1000000", help="Comma-separated client counts")
+    parser.add_argument("--investments-per-client", type=float, default=3.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3, help="Times each question is asked per scale")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated delay per LLM call")
+    parser.add_argument("--no-analytics-cache", action="store_true")
+    parser.add_argument("--no-agent", action="store_true", help="Run the SQL only, through the digest tool")
+    parser.add_argument("--regenerate", action="store_true", help="Rebuild DBs that already exist")
+    args = parser.parse_args()
+
+    for n_clients in (int(s) for s in args.scales.split(",")):
+        db_path = state_path("sql_qa", "loadtest", f"financial_{n_clients}_{args.investments_per_client:g}.db")
+        if args.regenerate or not os.path.exists(db_path):
+            start = time.perf_counter()
+            _, n_investments = generate_database(db_path, n_clients, args.investments_per_client)
+            print(f"Generated {n_clients:,} clients / {n_investments:,} investments "
+                  f"in {time.perf_counter() - start:.1f} s")
+        result = run_scale(db_path, args)
+        print(f"\n== {n_clients:,} clients: {result['questions']} questions, concurrency {args.concurrency} ==")
+        print(f"throughput  {result['questions'] / result['elapsed']:8.2f} questions/s")
+        print(f"end-to-end  {_percentiles(result['e2e_ms'])} ms")
+        print(f"SQL         {_percentiles(result['sql_ms'])} ms ({len(result['sql_ms'])} queries)")
+        if result["steps"]:
+            print(f"agent       {np.mean(result['steps']):.2f} tool steps, "
+                  f"{result['llm_calls'] / len(result['steps']):.2f} LLM calls per agent question")
+        print(f"cache hits  {result['cache_hits']}, errors {len(result['errors'])}")
+        for error in result["errors"][:3]:
+            print(f"  {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Synthetic financial_data.db at scale for the SQL Q&A app.
+
+Writes ``clients`` and ``investments`` with the bundled DB's schema and
+plausible distributions: ages around 40, risk appetite falling with age,
+log-normal portfolio values from a few lakh to tens of crore, fund choice
+weighted by risk profile, investment amounts mixing SIP-sized round numbers
+with lump sums, and dates skewed towards recent years. Rows are generated
+with NumPy in chunks and bulk-loaded with executemany, one transaction per
+chunk.
+
+Usage:
+    python benchmarks/sql_synthetic_data.py out.db --clients 1000000 --investments-per-client 3
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+SCHEMA = [
+    'CREATE TABLE "clients" (\n"client_id" INTEGER,\n  "name" TEXT,\n  "age" INTEGER,\n'
+    '  "risk_profile" TEXT,\n  "portfolio_value" REAL\n)',
+    'CREATE TABLE "investments" (\n"investment_id" INTEGER,\n  "client_id" INTEGER,\n  "fund_name" TEXT,\n'
+    '  "amount_invested" REAL,\n  "date" TEXT\n)',
+]
+RISK_PROFILES = np.array(["Low", "Medium", "High"])
+FUNDS = np.array(["Bond Stabilizer", "Global Diversified", "Real Estate Income",
+                  "Equity Growth", "Emerging Markets", "Tech Innovators"])
+# Fund choice probabilities per risk profile (rows follow RISK_PROFILES, columns FUNDS)
+FUND_WEIGHTS = np.array([
+    [0.40, 0.25, 0.20, 0.08, 0.02, 0.05],
+    [0.15, 0.25, 0.15, 0.25, 0.08, 0.12],
+    [0.04, 0.10, 0.06, 0.30, 0.22, 0.28],
+])
+FIRST_DATE = np.datetime64("2015-01-01")
+LAST_DATE = np.datetime64("2025-10-09")
+
+
+def _clients(rng, first_id, n):
+    ids = np.arange(first_id, first_id + n)
+    age = np.clip(np.rint(rng.normal(42, 12, n)), 21, 80).astype(np.int64)
+    # Younger clients lean High, older ones Low
+    p_high = np.clip(0.55 - (age - 21) * 0.009, 0.05, None)
+    p_low = np.clip(0.10 + (age - 21) * 0.011, None, 0.75)
+    u = rng.random(n)
+    risk = np.where(u < p_high, 2, np.where(u < p_high + p_low, 0, 1))
+    wealth = rng.lognormal(np.log(15e5), 1.1, n) * (0.6 + (age - 21) / 50)
+    value = np.round(np.clip(wealth, 25_000, 50e7), 2)
+    return ids, age, risk, value
+
+
+def _investments(rng, first_id, client_ids, risk, value, per_client):
+    counts = rng.poisson(per_client, len(client_ids))
+    owner = np.repeat(np.arange(len(client_ids)), counts)
+    n = len(owner)
+    cumulative = FUND_WEIGHTS.cumsum(axis=1)[risk[owner]]
+    fund = (rng.random((n, 1)) > cumulative).sum(axis=1)
+    sip = rng.random(n) < 0.35
+    sip_amount = rng.choice([5_000, 10_000, 25_000, 50_000, 1_00_000], n)
+    lump_sum = value[owner] * rng.uniform(0.02, 0.3, n)
+    amount = np.round(np.where(sip, sip_amount, np.maximum(lump_sum, 1_000)), 2)
+    span = (LAST_DATE - FIRST_DATE).astype(int)
+    days = (span * (1 - rng.beta(1.0, 2.5, n))).astype(int)  # Most recent years are busiest
+    dates = np.datetime_as_string(FIRST_DATE + days.astype("timedelta64[D]"), unit="D")
+    ids = np.arange(first_id, first_id + n)
+    return ids, client_ids[owner], fund, amount, dates
+
+
+def generate_database(db_path, n_clients, investments_per_client=3.0, seed=7, chunk_size=100_000):
+    """Write a fresh DB at ``db_path``; returns (clients, investments) row counts."""
+    rng = np.random.default_rng(seed)
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA journal_mode=OFF")  # Bulk load into a throwaway file; renamed only when complete
+    conn.execute("PRAGMA synchronous=OFF")
+    for ddl in SCHEMA:
+        conn.execute(ddl)
+    n_investments = 0
+    for first in range(1, n_clients + 1, chunk_size):
+        ids, age, risk, value = _clients(rng, first, min(chunk_size, n_clients - first + 1))
+        inv_ids, owners, fund, amount, dates = _investments(rng, n_investments + 1, ids, risk, value,
+                                                            investments_per_client)
+        with conn:
+            conn.executemany("INSERT INTO clients VALUES (?, ?, ?, ?, ?)",
+                             zip(ids.tolist(), (f"Client {i}" for i in ids.tolist()), age.tolist(),
+                                 RISK_PROFILES[risk].tolist(), value.tolist()))
+            conn.executemany("INSERT INTO investments VALUES (?, ?, ?, ?, ?)",
+                             zip(inv_ids.tolist(), owners.tolist(), FUNDS[fund].tolist(), amount.tolist(),
+                                 dates.tolist()))
+        n_investments += len(inv_ids)
+    conn.close()
+    os.replace(tmp_path, db_path)
+    return n_clients, n_investments
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db_path")
+    parser.add_argument("--clients", type=int, default=1_000_000)
+    parser.add_argument("--investments-per-client", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    clients, investments = generate_database(args.db_path, args.clients, args.investments_per_client, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"{clients:,} clients, {investments:,} investments in {elapsed:.1f} s "
+          f"({(clients + investments) / elapsed:,.0f} rows/s) -> {args.db_path}")
+
+
+if __name__ == "__main__":
+    main()
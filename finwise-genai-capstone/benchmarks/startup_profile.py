@@ -0,0 +1,126 @@
+"""Cold-start profile and budget check for the Finwise task apps.
+
+For each app, a fresh interpreter under ``python -X importtime`` runs the
+script once with Streamlit's AppTest, the way Streamlit serves the first
+page view: module-level imports, lazy imports reached on the first run,
+cached-resource factories (job queues, stores) and any other module-level
+work all count. Placeholder secrets are set so the apps get past their key
+checks, and FINWISE_STATE_DIR points at an empty directory, so every run is
+a true cold start. The report shows the wall time of that first run plus
+the slowest top-level packages imported during it, and the script exits
+non-zero if any app exceeds its cold-start budget or raises.
+
+Usage:
+    python benchmarks/startup_profile.py                 # all apps, default budget
+    python benchmarks/startup_profile.py --budget 1.0 --runs 5 --top 15
+    python benchmarks/startup_profile.py task-03-04-Rag/App_task3.py
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APPS = [
+    "finewise_Iq.py",
+    "task-01-chatbot-memory/App_task1.py",
+    "task-02-agent-tools-langgraph/App_task2.py",
+    "task-03-04-Rag/App_task3.py",
+    "task-05-sql-qa/App_task5.py",
+    "task-06-summarization/App_task06.py",
+]
+
+# Target cold-start time (first script run) per app, in seconds
+DEFAULT_BUDGET_S = float(os.environ.get("FINWISE_COLD_START_BUDGET_S", "2.0"))
+
+# Placeholder values for the secrets the apps read before their first widget
+SECRETS = ["GOOGLE_API_KEY", "HUGGINGFACE_API_KEY", "ALPHA_VANTAGE_KEY"]
+RUN_MARKER = "--- first script run ---"
+
+# Runs in the child interpreter; Streamlit's own import is outside the timed run
+_FIRST_RUN = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({app_path!r}, default_timeout={timeout})
+for name in {secrets!r}:
+    app.secrets[name] = "startup-profile"
+sys.stderr.write({marker!r} + "\\n")
+sys.stderr.flush()
+start = time.perf_counter()
+app.run()
+print(json.dumps({{"seconds": time.perf_counter() - start, "exceptions": [e.message for e in app.exception]}}))
+"""
+
+
+def profile_first_run(app_path, timeout=120):
+    """Run an app's script once, cold, in a fresh interpreter.
+
+    Returns (wall_seconds, {top_level_package: cumulative_seconds}) for the first
+    script run; raises RuntimeError if the child fails or the script raises.
+    """
+    app_dir = os.path.dirname(app_path)
+    with tempfile.TemporaryDirectory(prefix="finwise-cold-start-") as state_dir:
+        env = dict(os.environ, FINWISE_STATE_DIR=state_dir,
+                   PYTHONPATH=os.pathsep.join([app_dir, ROOT, os.environ.get("PYTHONPATH", "")]))
+        code = _FIRST_RUN.format(app_path=app_path, timeout=timeout, secrets=SECRETS, marker=RUN_MARKER)
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                              cwd=app_dir, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "first run failed")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    if result["exceptions"]:
+        raise RuntimeError(f"script raised: {result['exceptions'][0]}")
+
+    packages = {}
+    _, _, run_log = proc.stderr.partition(RUN_MARKER)
+    for line in run_log.splitlines():
+        # Format: "import time: <self us> | <cumulative us> | <indented module name>"
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        if name.startswith("  ") or not cumulative.strip().isdigit():
+            continue  # Nested import; already counted in its parent's cumulative time
+        top = name.strip().split(".")[0]
+        packages[top] = packages.get(top, 0.0) + int(cumulative) / 1e6
+    return result["seconds"], packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("apps", nargs="*", help="App scripts relative to finwise-genai-capstone/ (default: all)")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_S, help="Cold-start budget in seconds")
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts per app; the median is reported")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest packages to list")
+    args = parser.parse_args()
+
+    over_budget = []
+    for app in args.apps or APPS:
+        app_path = os.path.join(ROOT, app)
+        print(f"\n=== {app}")
+        try:
+            runs = [profile_first_run(app_path) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"  ERROR: {e}")
+            over_budget.append(app)
+            continue
+        wall = statistics.median(run[0] for run in runs)
+        packages = runs[-1][1]
+        status = "OK" if wall <= args.budget else "OVER BUDGET"
+        print(f"  cold first run: {wall:.3f}s (budget {args.budget:.2f}s) -> {status}")
+        for name, seconds in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"    {seconds:8.3f}s  {name}")
+        if wall > args.budget:
+            over_budget.append(app)
+
+    if over_budget:
+        print(f"\n{len(over_budget)} app(s) over the cold-start budget: {', '.join(over_budget)}")
+        sys.exit(1)
+    print("\nAll apps within the cold-start budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""Shared building blocks for the Finwise IQ task apps.
+
+The task apps live in sibling folders and are deployed one by one, so each
+app puts ``finwise-genai-capstone/`` on ``sys.path`` before importing from
+this package.
+"""
@@ -0,0 +1,66 @@
+"""In-memory inverted-index BM25 retriever.
+
+Tokens keep dotted and hyphenated forms together ("4.2", "NIFTY-50",
+"2024-25", "12.5") so exact section numbers, tickers and figures match as
+whole terms. Postings are NumPy arrays and scoring is vectorized per term.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9]+(?:[.\-/][A-Za-z0-9]+)*")
+
+
+def tokenize(text):
+    return [token.lower() for token in _TOKEN_RE.findall(text)]
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of texts; documents are referred to by position."""
+
+    def __init__(self, texts, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.num_docs = len(texts)
+        doc_ids = defaultdict(list)
+        term_freqs = defaultdict(list)
+        lengths = np.zeros(self.num_docs, dtype=np.float32)
+        for position, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[position] = sum(counts.values())
+            for term, count in counts.items():
+                doc_ids[term].append(position)
+                term_freqs[term].append(count)
+        self.postings = {
+            term: (np.asarray(ids, dtype=np.int32), np.asarray(term_freqs[term], dtype=np.float32))
+            for term, ids in doc_ids.items()
+        }
+        avg_length = float(lengths.mean()) if self.num_docs else 0.0
+        # Per-document length normalization, precomputed once
+        self._norm = k1 * (1 - b + b * lengths / avg_length) if avg_length else np.full(self.num_docs, k1, dtype=np.float32)
+
+    def idf(self, term):
+        df = len(self.postings[term][0]) if term in self.postings else 0
+        return math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+
+    def scores(self, query):
+        """BM25 score of every document for the query (zeros where no term matches)."""
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term, query_count in Counter(tokenize(query)).items():
+            if term not in self.postings:
+                continue
+            ids, tf = self.postings[term]
+            scores[ids] += query_count * self.idf(term) * tf * (self.k1 + 1) / (tf + self._norm[ids])
+        return scores
+
+    def search(self, query, k=10):
+        """Return up to k (position, score) pairs with a positive score, best first."""
+        scores = self.scores(query)
+        if not self.num_docs:
+            return []
+        k = min(k, self.num_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
@@ -0,0 +1,40 @@
+"""LangChain chat-history adapter over a ConversationStore.
+
+Kept apart from conversation_store so the apps only import langchain_core
+when a conversation chain is actually built.
+"""
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+_MESSAGE_TYPES = {"user": HumanMessage, "assistant": AIMessage, "summary": SystemMessage}
+_ROLES = {"human": "user", "ai": "assistant", "system": "summary"}
+
+
+class StoreChatMessageHistory(BaseChatMessageHistory):
+    """Chat history backed by a ConversationStore.
+
+    Only the latest ``window`` turns are read back, so memory classes built
+    on top of it (e.g. ConversationBufferMemory) stay bounded. The session's
+    summary turn (from compaction) always comes first, even when it is older
+    than the window.
+    """
+
+    def __init__(self, store, session_id, window=20):
+        self.store = store
+        self.session_id = session_id
+        self.window = window
+
+    @property
+    def messages(self):
+        turns = self.store.recent(self.session_id, limit=self.window)
+        if not any(turn["role"] == "summary" for turn in turns):
+            summary = self.store.latest_summary(self.session_id)
+            if summary is not None:
+                turns.insert(0, summary)
+        return [_MESSAGE_TYPES.get(turn["role"], HumanMessage)(content=turn["content"]) for turn in turns]
+
+    def add_message(self, message):
+        self.store.append(self.session_id, _ROLES.get(message.type, message.type), message.content)
+
+    def clear(self):
+        self.store.delete_session(self.session_id)
@@ -0,0 +1,16 @@
+import os
+
+# Directory for local state shared by the apps (job queue, caches, stores).
+# Override with FINWISE_STATE_DIR, e.g. to point at a mounted volume.
+STATE_DIR = os.environ.get("FINWISE_STATE_DIR", os.path.join(os.path.expanduser("~"), ".finwise"))
+
+# Chat model backend for every app: "gemini", or "local" for the offline CPU model (local_llm.py),
+# in which case no Google API key is needed.
+LLM_BACKEND = os.environ.get("FINWISE_LLM_BACKEND", "gemini")
+
+
+def state_path(*parts):
+    """Return a path inside the state directory, creating parent folders."""
+    path = os.path.join(STATE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
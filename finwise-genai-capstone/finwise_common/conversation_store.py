@@ -0,0 +1,253 @@
+"""Durable conversation store shared by the chat apps.
+
+Turns are written append-only and read back in pages of recent turns, so a
+replica never has to hold a whole transcript in memory. Sessions expire after
+a TTL of inactivity, and long sessions can be compacted into a summary turn.
+
+SQLiteConversationStore is the default (point FINWISE_STATE_DIR at a shared
+volume to serve one store from several replicas). InMemoryConversationStore
+follows the Redis list + EXPIRE model and stands in for a Redis-backed store.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from finwise_common.config import state_path
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+EVICTION_INTERVAL_SECONDS = 600
+
+
+class ConversationStore(ABC):
+    """Interface of a conversation store.
+
+    A turn is a dict: {"id", "role", "content", "metadata", "created_at"}.
+    Turn IDs increase within a session; ``recent`` returns turns oldest first.
+    """
+
+    @abstractmethod
+    def append(self, session_id, role, content, metadata=None):
+        """Append one turn and refresh the session TTL; returns the turn ID."""
+
+    @abstractmethod
+    def recent(self, session_id, limit=50, before=None):
+        """Return up to ``limit`` latest turns with ID < ``before`` (a page), oldest first."""
+
+    @abstractmethod
+    def count(self, session_id):
+        """Number of turns in the session."""
+
+    @abstractmethod
+    def latest_summary(self, session_id):
+        """The latest summary turn of the session (left by ``compact``), or None."""
+
+    @abstractmethod
+    def evict_expired(self):
+        """Delete sessions idle for longer than the TTL; returns how many were removed."""
+
+    @abstractmethod
+    def delete_session(self, session_id):
+        """Delete the session and all its turns."""
+
+    @abstractmethod
+    def _replace_prefix(self, session_id, upto_id, summary_turn):
+        """Delete turns with ID <= ``upto_id`` and insert ``summary_turn`` in their place."""
+
+    def compact(self, session_id, keep_last=50, summarize=None):
+        """Fold all but the latest ``keep_last`` turns into a single summary turn.
+
+        ``summarize`` takes the list of folded turns and returns summary text;
+        without it the folded turns are simply dropped. Returns the number of
+        turns folded.
+        """
+        if self.count(session_id) <= keep_last:
+            return 0
+        kept = self.recent(session_id, limit=keep_last)
+        older = self.recent(session_id, limit=self.count(session_id), before=kept[0]["id"])
+        summary_turn = None
+        if summarize is not None:
+            summary_turn = {"role": "summary", "content": summarize(older), "metadata": {"folded_turns": len(older)}}
+        self._replace_prefix(session_id, older[-1]["id"], summary_turn)
+        return len(older)
+
+
+class SQLiteConversationStore(ConversationStore):
+    """SQLite (WAL) conversation store; safe to share between processes."""
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        last_active REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS turns (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        metadata TEXT,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_turns_session ON turns (session_id, id);
+    """
+
+    def __init__(self, db_path=None, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.db_path = db_path or state_path("conversations.db")
+        self.ttl_seconds = ttl_seconds
+        self._last_eviction = 0.0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self._SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    @staticmethod
+    def _turn(row):
+        turn_id, role, content, metadata, created_at = row
+        return {"id": turn_id, "role": role, "content": content,
+                "metadata": json.loads(metadata) if metadata else {}, "created_at": created_at}
+
+    def append(self, session_id, role, content, metadata=None):
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO turns (session_id, role, content, metadata, created_at) VALUES (?, ?, ?, ?, ?)",
+                (session_id, role, content, json.dumps(metadata) if metadata else None, now),
+            )
+            conn.execute(
+                "INSERT INTO sessions (session_id, last_active) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET last_active = excluded.last_active",
+                (session_id, now),
+            )
+        # Opportunistic TTL eviction, at most once per interval per process
+        if now - self._last_eviction > EVICTION_INTERVAL_SECONDS:
+            self._last_eviction = now
+            self.evict_expired()
+        return cursor.lastrowid
+
+    def recent(self, session_id, limit=50, before=None):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, role, content, metadata, created_at FROM turns "
+                "WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (session_id, before if before is not None else 2 ** 63 - 1, limit),
+            ).fetchall()
+        return [self._turn(row) for row in reversed(rows)]
+
+    def count(self, session_id):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM turns WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+    def latest_summary(self, session_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, role, content, metadata, created_at FROM turns "
+                "WHERE session_id = ? AND role = 'summary' ORDER BY id DESC LIMIT 1",
+                (session_id,),
+            ).fetchone()
+        return self._turn(row) if row else None
+
+    def evict_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM turns WHERE session_id IN (SELECT session_id FROM sessions WHERE last_active < ?)",
+                (cutoff,),
+            )
+            return conn.execute("DELETE FROM sessions WHERE last_active < ?", (cutoff,)).rowcount
+
+    def delete_session(self, session_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def _replace_prefix(self, session_id, upto_id, summary_turn):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM turns WHERE session_id = ? AND id <= ?", (session_id, upto_id))
+            if summary_turn is not None:
+                # Reuse the last folded ID so the summary sorts before the kept turns
+                conn.execute(
+                    "INSERT INTO turns (id, session_id, role, content, metadata, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (upto_id, session_id, summary_turn["role"], summary_turn["content"],
+                     json.dumps(summary_turn["metadata"]), time.time()),
+                )
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Process-local store using the Redis data model: one list per session plus EXPIRE.
+
+    append ~ RPUSH + EXPIRE, recent ~ LRANGE, count ~ LLEN. A Redis-backed
+    store implements the same interface on top of those commands.
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lists = {}
+        self._expires_at = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def _expire_if_needed(self, session_id):
+        if self._expires_at.get(session_id, float("inf")) < time.time():
+            self._lists.pop(session_id, None)
+            self._expires_at.pop(session_id, None)
+
+    def append(self, session_id, role, content, metadata=None):
+        with self._lock:
+            self._expire_if_needed(session_id)
+            turn = {"id": self._next_id, "role": role, "content": content,
+                    "metadata": dict(metadata or {}), "created_at": time.time()}
+            self._next_id += 1
+            self._lists.setdefault(session_id, []).append(turn)
+            self._expires_at[session_id] = time.time() + self.ttl_seconds
+            return turn["id"]
+
+    def recent(self, session_id, limit=50, before=None):
+        with self._lock:
+            self._expire_if_needed(session_id)
+            turns = self._lists.get(session_id, [])
+            if before is not None:
+                turns = [turn for turn in turns if turn["id"] < before]
+            return [dict(turn) for turn in turns[-limit:]] if limit > 0 else []
+
+    def count(self, session_id):
+        with self._lock:
+            self._expire_if_needed(session_id)
+            return len(self._lists.get(session_id, []))
+
+    def latest_summary(self, session_id):
+        with self._lock:
+            self._expire_if_needed(session_id)
+            summaries = [turn for turn in self._lists.get(session_id, []) if turn["role"] == "summary"]
+            return dict(summaries[-1]) if summaries else None
+
+    def evict_expired(self):
+        with self._lock:
+            expired = [sid for sid, expires_at in self._expires_at.items() if expires_at < time.time()]
+            for session_id in expired:
+                self._expire_if_needed(session_id)
+            return len(expired)
+
+    def delete_session(self, session_id):
+        with self._lock:
+            self._lists.pop(session_id, None)
+            self._expires_at.pop(session_id, None)
+
+    def _replace_prefix(self, session_id, upto_id, summary_turn):
+        with self._lock:
+            kept = [turn for turn in self._lists.get(session_id, []) if turn["id"] > upto_id]
+            if summary_turn is not None:
+                kept.insert(0, {"id": upto_id, "created_at": time.time(), **summary_turn})
+            self._lists[session_id] = kept
+
+
+def get_conversation_store():
+    """Build the store selected by FINWISE_CONVERSATION_STORE ("sqlite" or "memory")."""
+    backend = os.environ.get("FINWISE_CONVERSATION_STORE", "sqlite")
+    ttl_seconds = float(os.environ.get("FINWISE_CONVERSATION_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+    if backend == "memory":
+        return InMemoryConversationStore(ttl_seconds=ttl_seconds)
+    return SQLiteConversationStore(ttl_seconds=ttl_seconds)
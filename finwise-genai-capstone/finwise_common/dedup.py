@@ -0,0 +1,107 @@
+"""Near-duplicate chunk detection with MinHash and LSH banding.
+
+Annual reports and compliance packs repeat whole blocks (disclaimers, fund
+descriptions, page furniture), so the same text would be embedded or
+summarized many times. Each chunk gets a MinHash signature over word
+shingles; chunks whose signatures collide in any LSH band are compared and,
+if their estimated Jaccard similarity reaches the threshold, mapped to the
+earliest such chunk (the canonical one). The canonical chunk's metadata
+collects the page numbers of all its copies, so citations still list every
+page the text appears on.
+"""
+import zlib
+
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.85
+NUM_PERM = 128
+SHINGLE_SIZE = 5  # Words per shingle
+
+_MAX = np.uint64(0xFFFFFFFF)
+
+
+def _shingle_hashes(text, size=SHINGLE_SIZE):
+    words = text.lower().split()
+    if len(words) <= size:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.fromiter({zlib.crc32(g.encode()) for g in grams}, dtype=np.uint64)
+
+
+def minhash_signatures(texts, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE, seed=1):
+    """(len(texts), num_perm) uint32 signatures using multiply-shift hashing."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1)  # Odd multipliers
+    b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint32)
+    with np.errstate(over="ignore"):  # Multiply-shift relies on wrap-around modulo 2**64
+        for i, text in enumerate(texts):
+            hashes = (a[:, None] * _shingle_hashes(text, shingle_size)[None, :] + b[:, None]) >> np.uint64(32)
+            signatures[i] = (hashes & _MAX).min(axis=1)
+    return signatures
+
+
+def _lsh_params(threshold, num_perm):
+    # (bands, rows) with rows * bands == num_perm whose S-curve midpoint (1/b)^(1/r) is nearest the threshold
+    options = [(num_perm // r, r) for r in range(1, num_perm + 1) if num_perm % r == 0]
+    return min(options, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+
+def find_duplicates(texts, threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM):
+    """Return ``canonical`` with canonical[i] = index of the chunk that i duplicates (i itself if unique)."""
+    n = len(texts)
+    canonical = list(range(n))
+    if n < 2:
+        return canonical
+    signatures = minhash_signatures(texts, num_perm)
+    bands, rows = _lsh_params(threshold, num_perm)
+    candidates = [set() for _ in range(n)]
+    for band in range(bands):
+        buckets = {}
+        block = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        for i, key in enumerate(block.view(f"V{block.itemsize * rows}").ravel()):
+            members = buckets.setdefault(key.tobytes(), [])
+            candidates[i].update(members)
+            members.append(i)
+    for i in range(n):
+        for j in sorted(candidates[i]):
+            # Compare against canonical chunks only, so clusters cannot drift through chains of near matches
+            if canonical[j] == j and np.mean(signatures[i] == signatures[j]) >= threshold:
+                canonical[i] = j
+                break
+    return canonical
+
+
+def dedup_chunks(texts, metadatas, threshold=DEFAULT_THRESHOLD):
+    """Drop near-duplicate chunks, keeping the first copy of each.
+
+    Returns (kept_indices, kept_metadatas, report). Each kept metadata is a copy
+    with "pages" (every page the text appears on) and "duplicates" added. The
+    report has overall counts and per-document ones keyed by file name or source.
+    """
+    canonical = find_duplicates(texts, threshold)
+    kept = [i for i, c in enumerate(canonical) if c == i]
+    pages = {i: set() for i in kept}
+    copies = {i: 0 for i in kept}
+    by_document = {}
+    for i, c in enumerate(canonical):
+        metadata = metadatas[i]
+        if metadata.get("page") is not None:
+            pages[c].add(metadata["page"])
+        document = by_document.setdefault(str(metadata.get("file_name") or metadata.get("source", "document")),
+                                          {"chunks": 0, "duplicates": 0})
+        document["chunks"] += 1
+        if c != i:
+            copies[c] += 1
+            document["duplicates"] += 1
+    kept_metadatas = [{**metadatas[i], "pages": sorted(pages[i]), "duplicates": copies[i]} for i in kept]
+    report = {"chunks": len(texts), "unique": len(kept), "duplicates": len(texts) - len(kept),
+              "threshold": threshold, "by_document": by_document}
+    return kept, kept_metadatas, report
+
+
+def format_pages(metadata):
+    """Page label for a chunk's citation, e.g. "7" or "3, 7, 12" for a deduplicated chunk."""
+    pages = metadata.get("pages") or ([metadata["page"]] if metadata.get("page") is not None else [])
+    return ", ".join(str(p) for p in pages) if pages else "N/A"
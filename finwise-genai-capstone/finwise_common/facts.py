@@ -0,0 +1,408 @@
+"""Key figures and table rows extracted locally from financial documents.
+
+PyPDFLoader flattens tables into lines such as
+"Revenue from operations 1,23,456.78 1,10,234.00". Per page, runs of such
+lines are detected as tables; the header line above them supplies the
+periods of the columns ("FY2024 FY2023") and a unit note ("₹ in crore")
+the scale of bare numbers. Outside tables, sentences with an amount
+("net profit rose to ₹1,234 crore", "NPA of 2.1%") give one figure each,
+labelled with the words before it.
+
+All values of a document are parsed by one compiled regex and normalized
+together with NumPy (Indian digit grouping, accounting negatives,
+crore / lakh / million scales) into base units: rupees, dollars, percent.
+The facts go into a SQLite table keyed by document, so figure lookups
+("what was net revenue in FY2024?") are answered without an LLM call and
+summaries get a compact facts sheet instead of raw table text.
+"""
+import re
+import sqlite3
+import threading
+
+import numpy as np
+
+_NUM = r"\(?[-−]?\d{1,3}(?:,\d{2,3})+(?:\.\d+)?\)?|\(?[-−]?\d+(?:\.\d+)?\)?"
+_VALUE_RE = re.compile(
+    r"(?<![\w.])(?P<cur>₹|Rs\.?|INR|US\$|USD|\$|€|EUR|£|GBP)?\s?"
+    rf"(?P<num>{_NUM})(?![\w/])"
+    r"(?:\s?(?P<scale>crores?|cr\b\.?|lakhs?|lacs?\b|millions?|mn\b|billions?|bn\b|thousands?))?"
+    r"(?:\s?(?P<pct>%|per\s?cent\b|bps\b|basis points))?", re.I)
+# "(₹ in crore)", "Amount in Rs. lakhs", "USD in millions"
+_TABLE_UNIT_RE = re.compile(
+    r"(?P<cur>₹|Rs\.?|INR|US\$|USD|\$)?\s*(?:in|amounts? in|figures in)\s+(?P<cur2>₹|Rs\.?|INR|US\$|USD|\$)?\s*"
+    r"(?P<scale>crores?|cr\b|lakhs?|lacs\b|millions?|mn\b|billions?|bn\b|thousands?)", re.I)
+_PERIOD_RE = re.compile(
+    r"\b(?:(?:Q[1-4]|H[12])\s?)?FY\s?'?\d{2}(?:\d{2})?(?:\s?[-–/]\s?\d{2,4})?\b|\b(?:19|20)\d{2}(?:\s?[-–/]\s?\d{2,4})?\b"
+    r"|\b(?:current|previous|prior)\s+(?:year|period|quarter)\b", re.I)
+_SENTENCE_SPLIT_RE = re.compile(r"(?<!\bRs\.)(?<!\bNo\.)(?<=[.!?])\s+|\n+")
+_WORD_RE = re.compile(r"[a-z][a-z&']*")
+_ROW_PREFIX_RE = re.compile(r"^\s*(\(?[a-z0-9]{1,3}[.)]\s+|[-•*]\s+)", re.I)
+
+_CURRENCIES = {"₹": "INR", "rs": "INR", "rs.": "INR", "inr": "INR", "us$": "USD", "usd": "USD", "$": "USD",
+               "€": "EUR", "eur": "EUR", "£": "GBP", "gbp": "GBP"}
+_SCALES = {"crore": 1e7, "cr": 1e7, "lakh": 1e5, "lac": 1e5, "million": 1e6, "mn": 1e6,
+           "billion": 1e9, "bn": 1e9, "thousand": 1e3}
+_SYMBOLS = {"INR": "₹", "USD": "$", "EUR": "€", "GBP": "£"}
+# Words that end a label ("profit rose to ₹12 crore") rather than name the figure
+_FILLER = frozenset("""a an the of at to by from in on for was were is are be been stood stands rose fell grew increased
+decreased declined improved reached amounted totalled totaled up down about around approximately nearly over under
+and or with as compared against vs which that its their our""".split())
+_STOPWORDS = frozenset("""a an the of in on for to from with by at and or is was were are be been what whats how much many did
+does do tell me show give value figure amount number reported report during year period company company's our their
+its as per please""".split())
+# Same figure, different wording
+_ALIASES = {"sales": "revenue", "turnover": "revenue", "revenues": "revenue", "topline": "revenue", "pat": "profit",
+            "earnings": "profit", "profits": "profit", "expenditure": "expense", "expenses": "expense",
+            "costs": "cost", "borrowings": "borrowing", "debt": "borrowing", "npas": "npa", "margins": "margin"}
+
+MIN_TABLE_ROWS = 2          # Consecutive numeric rows that make a table
+TABLE_CHUNK_SHARE = 0.6     # A chunk whose lines are mostly table rows is replaced by the facts sheet
+MATCH_THRESHOLD = 0.6       # Lookup score needed to answer without the LLM
+# Label words that narrow a figure to part of the business or a different basis; a lookup only
+# answers from such a label when the question names the qualifier too
+_QUALIFIERS = frozenset("""segment segment's consolidated standalone subsidiary division group banking insurance retail
+corporate treasury wholesale domestic international overseas india adjusted exceptional other share""".split())
+
+
+def _key_tokens(text):
+    tokens = []
+    for token in _WORD_RE.findall(text.lower()):
+        token = _ALIASES.get(token, token)
+        if token.endswith("s") and len(token) > 3 and not token.endswith("ss"):
+            token = token[:-1]
+        if token not in _STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+def label_key(label):
+    return " ".join(_key_tokens(label))
+
+
+def period_key(period):
+    """"FY2023-24", "FY24", "2024" -> "2024"; "Q3 FY25" -> "q3 2025"; "current year" -> "current"."""
+    if not period:
+        return ""
+    text = period.lower()
+    if "current" in text:
+        return "current"
+    if "previous" in text or "prior" in text:
+        return "previous"
+    prefix = re.match(r"\s*([qh][1-4])", text)
+    years = re.findall(r"\d{2,4}", text)
+    if not years:
+        return ""
+    year = years[-1]
+    if len(year) == 2:
+        year = (years[0][:2] if len(years[0]) == 4 else "20") + year
+    return f"{prefix.group(1)} {year}" if prefix else year
+
+
+def _is_year(match):
+    return not (match["cur"] or match["scale"] or match["pct"]) and re.fullmatch(r"(19|20)\d{2}", match["num"])
+
+
+def _normalize(matches, default_currency, default_scale):
+    """Values in base units and their unit codes, for regex matches parsed together."""
+    if not matches:
+        return np.empty(0), []
+    nums = [m["num"] for m in matches]
+    values = np.array([re.sub(r"[(),\s]", "", n).replace("−", "-") for n in nums]).astype(np.float64)
+    negative = np.array([n.startswith("(") and n.endswith(")") for n in nums])
+    scales = np.array([_SCALES[re.sub(r"(e?s|\.)$", "", m["scale"].lower())] if m["scale"] else
+                       1.0 if m["pct"] else default_scale[i] for i, m in enumerate(matches)])
+    values = np.where(negative, -np.abs(values), values) * scales
+    units = []
+    for i, m in enumerate(matches):
+        if m["pct"]:
+            units.append("bps" if "b" in m["pct"].lower() else "%")
+        elif m["cur"]:
+            units.append(_CURRENCIES[m["cur"].lower()])
+        elif default_currency[i]:
+            units.append(default_currency[i])
+        elif m["scale"] and m["scale"].lower()[:2] in ("cr", "la"):
+            units.append("INR")  # Crore and lakh amounts are rupees
+        else:
+            units.append("")
+    return values, units
+
+
+def format_value(value, unit):
+    """Display form: "₹1,234.56 crore", "$12.3 million", "12.5%"."""
+    if unit in ("%", "bps"):
+        return f"{value:,.2f}".rstrip("0").rstrip(".") + ("%" if unit == "%" else " bps")
+    symbol = _SYMBOLS.get(unit, "")
+    sign, value = ("-" if value < 0 else ""), abs(value)
+    if unit == "INR" and value >= 1e7:
+        return f"{sign}{symbol}{value / 1e7:,.2f} crore"
+    if unit == "INR" and value >= 1e5:
+        return f"{sign}{symbol}{value / 1e5:,.2f} lakh"
+    if value >= 1e9:
+        return f"{sign}{symbol}{value / 1e9:,.2f} billion"
+    if value >= 1e6:
+        return f"{sign}{symbol}{value / 1e6:,.2f} million"
+    return f"{sign}{symbol}{value:,.2f}".rstrip("0").rstrip(".")
+
+
+def _parse_row(line):
+    """(label, value matches) for a table row "Label  1,234  (56)  7.8%", else None."""
+    matches = list(_VALUE_RE.finditer(line))
+    if not matches:
+        return None
+    first = matches[0].start()
+    label = _ROW_PREFIX_RE.sub("", line[:first]).strip(" :-–—.")
+    rest = _VALUE_RE.sub(" ", line[first:])
+    words = label.split()
+    if (not re.search(r"[A-Za-z]", label) or re.sub(r"[\s\-–—]", "", rest) or len(words) > 10
+            or words[-1].lower() in _FILLER):
+        return None
+    values = [m for m in matches if not _is_year(m)]
+    return (label, values) if values else None
+
+
+def _table_rows(lines):
+    """{line index: (label, value matches)} for the lines in runs of numeric rows."""
+    parsed = [_parse_row(line) for line in lines]
+    rows, run = {}, []
+    for i, row in enumerate(parsed + [None]):
+        if row is not None:
+            run.append(i)
+            continue
+        if len(run) >= MIN_TABLE_ROWS:
+            rows.update((j, parsed[j]) for j in run)
+        run = []
+    return rows
+
+
+def table_lines(text):
+    """Indexes of the lines of ``text`` that belong to tables (runs of numeric rows)."""
+    return set(_table_rows(text.splitlines()))
+
+
+def table_share(text):
+    """Fraction of the non-empty lines of ``text`` that are table rows."""
+    lines = [line for line in text.splitlines() if line.strip()]
+    return len(table_lines("\n".join(lines))) / len(lines) if lines else 0.0
+
+
+def _page_figures(text, page):
+    """Raw figures of one page: (match, label, period, column, kind, context, currency, scale) tuples."""
+    lines = text.splitlines()
+    in_table = _table_rows(lines)
+    figures = []
+    periods, note_column, currency, scale = [], False, "", 1.0
+    for i, line in enumerate(lines):
+        unit = _TABLE_UNIT_RE.search(line)
+        if unit:
+            cur = unit["cur"] or unit["cur2"]
+            currency = _CURRENCIES[cur.lower()] if cur else ("INR" if unit["scale"].lower()[:2] in ("cr", "la") else "")
+            scale = _SCALES[re.sub(r"(e?s|\.)$", "", unit["scale"].lower())]
+        if i not in in_table:
+            header_periods = _PERIOD_RE.findall(line)
+            if len(header_periods) >= 2:
+                periods = header_periods  # Column headers of the next table
+                note_column = bool(re.search(r"\bnotes?\b", line, re.I))
+            continue
+        label, values = in_table[i]
+        if note_column and len(values) == len(periods) + 1 and re.fullmatch(r"\d{1,3}[A-Za-z]?", values[0].group(0)):
+            values = values[1:]  # "Borrowings 14 1,234 1,100": the note reference
+        for column, match in enumerate(values):
+            period = periods[column] if column < len(periods) else ""
+            figures.append((match, label, period, column, "table", line.strip(), currency, scale))
+
+    prose = "\n".join(line for i, line in enumerate(lines) if i not in in_table)
+    for sentence in _SENTENCE_SPLIT_RE.split(prose):
+        sentence_periods = _PERIOD_RE.findall(sentence)
+        previous_end = None
+        for match in _VALUE_RE.finditer(sentence):
+            if not (match["cur"] or match["scale"] or match["pct"]):
+                continue  # Bare numbers in prose are counts, note numbers, dates
+            label = _prose_label(sentence, match, previous_end)
+            previous_end = match.end()
+            if label:
+                figures.append((match, label, sentence_periods[0] if sentence_periods else "", 0, "text",
+                                sentence.strip()[:300], "", 1.0))
+    return figures
+
+
+def _prose_label(sentence, match, previous_end=None):
+    # The words naming the figure: before it ("net profit of ₹12 crore"), else after it ("₹12 crore in revenue")
+    before = re.split(r"[,;:()]|\band\b|\bwhile\b", sentence[previous_end or 0:match.start()])[-1].split()
+    while before and before[-1].lower().strip(".") in _FILLER:
+        before.pop()
+    while before and before[0].lower() in ("the", "a", "an", "our", "its", "their"):
+        before.pop(0)
+    if before:
+        return " ".join(before[-6:]).strip(" -–—")
+    if previous_end is not None:
+        return ""  # "rose to 2.1% from 2.6%": the comparison value of the previous figure
+    after = re.split(r"[,;:.()]", sentence[match.end():])[0].split()
+    while after and after[0].lower() in _FILLER:
+        after.pop(0)
+    return " ".join(after[:4])
+
+
+def extract_facts(pages):
+    """Facts of a document given as [(page_text, page_number)].
+
+    Returns [{"label", "label_key", "period", "period_key", "column", "value", "unit", "raw", "page",
+    "kind": "table" | "text", "context"}], one per distinct (label, period, value, unit).
+    """
+    figures = []
+    for text, page in pages:
+        figures.extend(figure + (page,) for figure in _page_figures(text, page))
+    values, units = _normalize([f[0] for f in figures], [f[6] for f in figures], [f[7] for f in figures])
+    facts, seen = [], set()
+    for (match, label, period, column, kind, context, _, _, page), value, unit in zip(figures, values, units):
+        key = label_key(label)
+        if not key:
+            continue
+        identity = (key, period_key(period), round(float(value), 4), unit)
+        if identity in seen:
+            continue  # Repeated on another page or in an overlapping chunk
+        seen.add(identity)
+        facts.append({"label": label, "label_key": key, "period": period, "period_key": period_key(period),
+                      "column": column, "value": float(value), "unit": unit, "raw": match.group(0).strip(),
+                      "page": page, "kind": kind, "context": context})
+    return facts
+
+
+def _display_scale(unit, magnitude):
+    if unit == "INR":
+        return ("crore", 1e7) if magnitude >= 1e7 else ("lakh", 1e5) if magnitude >= 1e5 else ("", 1.0)
+    return ("billion", 1e9) if magnitude >= 1e9 else ("million", 1e6) if magnitude >= 1e6 else ("", 1.0)
+
+
+def facts_sheet(facts, max_lines=200):
+    """Compact text of the facts for a summarization prompt: one line per table row, values by column."""
+    tables, prose = {}, []
+    for fact in facts:
+        if fact["kind"] == "table":
+            tables.setdefault(fact["page"], {}).setdefault(fact["label"], []).append(fact)
+        else:
+            prose.append(fact)
+    lines = []
+    for page, rows in tables.items():
+        cells = [fact for row in rows.values() for fact in row]
+        periods = {fact["column"]: fact["period"] for fact in cells if fact["period"]}
+        amounts = [fact for fact in cells if fact["unit"] not in ("%", "bps")]
+        unit = max({f["unit"] for f in amounts}, key=[f["unit"] for f in amounts].count) if amounts else ""
+        scale_name, divisor = _display_scale(unit, float(np.median([abs(f["value"]) for f in amounts])) if amounts else 0)
+        columns = max(fact["column"] for fact in cells) + 1
+        in_units = " ".join(part for part in (_SYMBOLS.get(unit, unit), scale_name) if part)
+        header = f"Table, page {page}" + (f" ({in_units})" if in_units else "")
+        if periods:
+            header += ": " + " | ".join(periods.get(c, "") for c in range(columns))
+        lines.append(header)
+        for label, row in rows.items():
+            values = ["–"] * columns
+            for fact in row:
+                values[fact["column"]] = (f"{fact['value'] / divisor:,.2f}" if fact["unit"] == unit
+                                          else format_value(fact["value"], fact["unit"]))
+            lines.append(f"- {label}: {' | '.join(values)}")
+    if prose:
+        lines.append("In the text:")
+        for fact in prose:
+            period = f" ({fact['period']})" if fact["period"] else ""
+            lines.append(f"- {fact['label']}{period}: {format_value(fact['value'], fact['unit'])}, page {fact['page']}")
+    if len(lines) > max_lines:
+        lines = lines[:max_lines] + [f"(+{len(lines) - max_lines} more)"]
+    return "KEY FIGURES (extracted from the document's tables and text):\n" + "\n".join(lines) if lines else ""
+
+
+def match_facts(question, facts, k=5):
+    """Facts whose label best matches the question, as (score, fact) pairs, best first."""
+    query = set(_key_tokens(_PERIOD_RE.sub(" ", question)))
+    if not query:
+        return []
+    wanted = {period_key(p) for p in _PERIOD_RE.findall(question)}
+    scored = []
+    for fact in facts:
+        label = set(fact["label_key"].split())
+        overlap = len(query & label)
+        if not overlap:
+            continue
+        score = 2 * overlap / (len(query) + len(label))  # Dice
+        if wanted:
+            score *= 1.1 if fact["period_key"] in wanted else 0.5
+        # Ties: tables over prose, the first (current) column over older ones
+        scored.append((score, fact["kind"] == "table", -fact["column"], fact))
+    scored.sort(key=lambda s: s[:3], reverse=True)
+    return [(score, fact) for score, _, _, fact in scored[:k]]
+
+
+_FIGURE_QUESTION_RE = re.compile(r"^\s*(what\s*(is|was|were|are|'s)|how much|how many|give me|show me|tell me)\b", re.I)
+_NOT_LOOKUP_RE = re.compile(r"\b(why|explain|compare|comparison|trend|reason|impact|drive|drove|outlook|risk)", re.I)
+
+
+def answer_figure(question, facts):
+    """Direct answer to a figure lookup from extracted facts, or None when the LLM should answer.
+
+    Only an exact label match answers: a label missing a word of the question, or
+    qualified beyond it ("... of the banking segment", "Consolidated ..."), does not.
+    Returns {"answer", "facts"} with the facts the answer cites.
+    """
+    if not _FIGURE_QUESTION_RE.match(question) or _NOT_LOOKUP_RE.search(question):
+        return None
+    matches = match_facts(question, facts, k=10)
+    if not matches or matches[0][0] < MATCH_THRESHOLD:
+        return None
+    best_score, best = matches[0]
+    # Every word of the question must be in the label, and the label must not narrow it further
+    query = set(_key_tokens(_PERIOD_RE.sub(" ", question)))
+    label = set(best["label_key"].split())
+    if not query <= label or (label - query) & _QUALIFIERS:
+        return None
+    # Ambiguous: another label scores about as well
+    if any(fact["label_key"] != best["label_key"] and score > best_score - 0.1 for score, fact in matches[1:]):
+        return None
+    same = [fact for score, fact in matches if fact["label_key"] == best["label_key"] and score >= best_score - 1e-9]
+    if len({(f["period_key"], f["value"]) for f in same}) > 1 and len({f["period_key"] for f in same}) == 1:
+        return None  # Same label and period, different values: let the LLM read the context
+    cited = same[:3]
+    values = ", ".join(format_value(f["value"], f["unit"]) + (f" ({f['period']})" if f["period"] else "") for f in cited)
+    pages = sorted({f["page"] for f in cited if f["page"] is not None})
+    source = f" (page{'s' if len(pages) > 1 else ''} {', '.join(str(p) for p in pages)})" if pages else ""
+    return {"answer": f"**{best['label']}**: {values}{source}.", "facts": cited}
+
+
+class FactStore:
+    """Extracted facts per document in SQLite (WAL); shared by the apps and their job workers."""
+
+    _COLUMNS = ("label", "label_key", "period", "period_key", "column", "value", "unit", "raw", "page", "kind", "context")
+    _SQL_COLUMNS = ", ".join(f'"{c}"' for c in _COLUMNS)  # "column" is a keyword
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS facts (
+                    doc_id TEXT NOT NULL, label TEXT NOT NULL, label_key TEXT NOT NULL, period TEXT,
+                    period_key TEXT, "column" INTEGER, value REAL NOT NULL, unit TEXT, raw TEXT, page INTEGER,
+                    kind TEXT, context TEXT);
+                CREATE INDEX IF NOT EXISTS facts_doc ON facts (doc_id);
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def replace(self, doc_id, facts):
+        """Store ``facts`` as the facts of ``doc_id``, replacing earlier ones."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM facts WHERE doc_id = ?", (doc_id,))
+            conn.executemany(
+                f"INSERT INTO facts (doc_id, {self._SQL_COLUMNS}) "
+                f"VALUES (?{', ?' * len(self._COLUMNS)})",
+                [(doc_id, *(fact[c] for c in self._COLUMNS)) for fact in facts])
+
+    def facts(self, doc_id):
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT {self._SQL_COLUMNS} "
+                                "FROM facts WHERE doc_id = ? ORDER BY rowid", (doc_id,)).fetchall()
+        return [dict(zip(self._COLUMNS, row)) for row in rows]
+
+    def count(self, doc_id):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM facts WHERE doc_id = ?", (doc_id,)).fetchone()[0]
@@ -0,0 +1,175 @@
+"""NumPy financial math used by the agent tools.
+
+Every function broadcasts over array arguments, so the same call prices one
+loan or ten thousand scenarios. Rates are decimals (0.09 for 9%) and amounts
+are positive: money invested or borrowed in, value or payment out.
+"""
+import datetime
+
+import numpy as np
+
+
+def emi(principal, annual_rate, months):
+    """Equated monthly instalment of a loan."""
+    principal, annual_rate, months = np.broadcast_arrays(
+        np.asarray(principal, dtype=float), np.asarray(annual_rate, dtype=float), np.asarray(months, dtype=float))
+    r = annual_rate / 12
+    growth = np.power(1 + r, months)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        payment = principal * r * growth / (growth - 1)
+    # Zero-interest loans are plain division
+    return np.where(r == 0, principal / months, payment)
+
+
+def amortization_schedule(principal, annual_rate, months):
+    """Month-by-month schedule of a loan as a dict of arrays.
+
+    Keys: month, payment, interest, principal, balance (balance after the payment).
+    """
+    months = int(months)
+    r = annual_rate / 12
+    payment = float(emi(principal, annual_rate, months))
+    k = np.arange(1, months + 1)
+    if r == 0:
+        balance = principal - payment * k
+    else:
+        growth = np.power(1 + r, k)
+        balance = principal * growth - payment * (growth - 1) / r
+    balance = np.maximum(balance, 0.0)
+    opening = np.concatenate(([principal], balance[:-1]))
+    interest = opening * r
+    return {
+        "month": k,
+        "payment": np.full(months, payment),
+        "interest": interest,
+        "principal": payment - interest,
+        "balance": balance,
+    }
+
+
+def future_value(rate, periods, payment=0.0, present_value=0.0, due=False):
+    """Value after ``periods`` of a lump sum plus a regular payment per period.
+
+    ``due=True`` for payments at the start of each period (annuity due).
+    """
+    rate = np.asarray(rate, dtype=float)
+    growth = np.power(1 + rate, periods)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        annuity = np.where(rate == 0, periods, (growth - 1) / rate)
+    annuity = annuity * np.where(due, 1 + rate, 1.0)
+    return present_value * growth + payment * annuity
+
+
+def present_value(rate, periods, payment=0.0, future_value=0.0, due=False):
+    """Today's value of a future lump sum plus a regular payment per period."""
+    rate = np.asarray(rate, dtype=float)
+    discount = np.power(1 + rate, -np.asarray(periods, dtype=float))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        annuity = np.where(rate == 0, periods, (1 - discount) / rate)
+    annuity = annuity * np.where(due, 1 + rate, 1.0)
+    return future_value * discount + payment * annuity
+
+
+def npv(rate, cashflows):
+    """Net present value of cash flows at periods 0, 1, 2, ...
+
+    ``cashflows`` may be 2-D (scenarios x periods); ``rate`` a scalar or one
+    rate per scenario. Returns one NPV per scenario.
+    """
+    cashflows = np.asarray(cashflows, dtype=float)
+    rate = np.asarray(rate, dtype=float)[..., None]
+    discount = np.power(1 + rate, -np.arange(cashflows.shape[-1]))
+    return np.sum(cashflows * discount, axis=-1)
+
+
+def _solve_rate(value, derivative, guess=0.1, low=-0.9999, high=10.0, tol=1e-10, max_iter=100):
+    # Newton from ``guess``, falling back to bisection when Newton leaves the bracket or stalls
+    rate = guess
+    for _ in range(max_iter):
+        f, df = value(rate), derivative(rate)
+        if abs(f) < tol:
+            return rate
+        step = f / df if df else 0.0
+        if not df or not (low < rate - step < high):
+            break
+        rate -= step
+        if abs(step) < tol:
+            return rate
+    f_low, f_high = value(low), value(high)
+    if np.sign(f_low) == np.sign(f_high):
+        return float("nan")
+    for _ in range(200):
+        mid = (low + high) / 2
+        f_mid = value(mid)
+        if abs(f_mid) < tol or high - low < tol:
+            return mid
+        if np.sign(f_mid) == np.sign(f_low):
+            low, f_low = mid, f_mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def irr(cashflows):
+    """Internal rate of return per period; NaN when the flows never change sign."""
+    cashflows = np.asarray(cashflows, dtype=float)
+    t = np.arange(len(cashflows))
+    return _solve_rate(
+        lambda r: float(np.sum(cashflows * np.power(1 + r, -t))),
+        lambda r: float(np.sum(-t * cashflows * np.power(1 + r, -t - 1))),
+    )
+
+
+def xirr(cashflows, dates):
+    """Annualized IRR of irregularly dated cash flows (actual/365)."""
+    cashflows = np.asarray(cashflows, dtype=float)
+    dates = [d if isinstance(d, datetime.date) else datetime.date.fromisoformat(str(d)) for d in dates]
+    years = np.array([(d - dates[0]).days / 365.0 for d in dates])
+    return _solve_rate(
+        lambda r: float(np.sum(cashflows * np.power(1 + r, -years))),
+        lambda r: float(np.sum(-years * cashflows * np.power(1 + r, -years - 1))),
+    )
+
+
+def sip_projection(monthly_investment, annual_return, years, annual_step_up=0.0):
+    """Year-by-year projection of a monthly SIP (investments at the start of each month).
+
+    With ``annual_step_up`` the instalment grows by that fraction every year.
+    Returns a dict of arrays: year, invested (cumulative), value (at year end).
+    """
+    years = int(years)
+    r = annual_return / 12
+    instalments = monthly_investment * np.power(1 + annual_step_up, np.arange(years))
+    # Each year's 12 instalments, valued at that year end, then compounded to later year ends
+    year_block = instalments * float(future_value(r, 12, payment=1.0, due=True))
+    year_growth = (1 + r) ** 12
+    exponents = np.arange(years)[:, None] - np.arange(years)[None, :]
+    weights = np.where(exponents >= 0, np.power(year_growth, np.maximum(exponents, 0)), 0.0)
+    return {
+        "year": np.arange(1, years + 1),
+        "invested": np.cumsum(instalments * 12),
+        "value": weights @ year_block,
+    }
+
+
+def cagr(begin_value, end_value, years):
+    """Compound annual growth rate."""
+    return np.power(np.asarray(end_value, dtype=float) / begin_value, 1.0 / np.asarray(years, dtype=float)) - 1
+
+
+def evaluate_cashflows(cashflows, rates):
+    """Vectorized NPV of a portfolio's cash flows under many discount-rate scenarios.
+
+    ``cashflows``: (periods,) shared by all scenarios, or (scenarios, periods).
+    ``rates``: (scenarios,) flat rates or (scenarios, periods) per-period rate
+    paths, where the flow at period t is discounted by the product of the first
+    t rates. Returns the NPV per scenario.
+    """
+    cashflows = np.asarray(cashflows, dtype=float)
+    rates = np.asarray(rates, dtype=float)
+    if rates.ndim == 1:
+        return npv(rates, cashflows)
+    periods = cashflows.shape[-1]
+    growth = np.cumprod(1 + rates[:, :periods - 1], axis=1)
+    discount = np.concatenate((np.ones((rates.shape[0], 1)), 1 / growth), axis=1)
+    return np.sum(cashflows * discount, axis=1)
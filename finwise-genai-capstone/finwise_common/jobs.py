@@ -0,0 +1,232 @@
+"""SQLite-backed background job queue with a thread worker pool.
+
+Long summarization and ingestion runs are submitted here instead of running
+on the Streamlit script thread. Every finished chunk is checkpointed, so a
+job that was interrupted by a crash or restart picks up from the first
+unfinished chunk once its handler is registered again.
+
+Running jobs are kept alive by a heartbeat on ``updated_at``, so a job is
+only taken over when its worker stopped beating, whichever replica (sharing
+FINWISE_STATE_DIR) that worker was on.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_chunks (
+    job_id TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    output TEXT NOT NULL,
+    PRIMARY KEY (job_id, chunk_index)
+);
+"""
+
+
+class JobContext:
+    """Handle passed to a job handler for reporting progress and checkpoints."""
+
+    def __init__(self, queue, job_id, payload):
+        self.queue = queue
+        self.job_id = job_id
+        self.payload = payload
+
+    def set_total(self, total):
+        self.queue._update(self.job_id, total=total)
+
+    def set_message(self, message):
+        self.queue._update(self.job_id, message=message)
+
+    def completed_chunks(self):
+        """Return {chunk_index: output} for every chunk already checkpointed."""
+        return self.queue.chunk_outputs(self.job_id)
+
+    def checkpoint(self, chunk_index, output):
+        """Persist the output of one finished chunk (a partial result)."""
+        with self.queue._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO job_chunks (job_id, chunk_index, output) VALUES (?, ?, ?)",
+                (self.job_id, chunk_index, json.dumps(output)),
+            )
+            conn.execute(
+                "UPDATE jobs SET completed = (SELECT COUNT(*) FROM job_chunks WHERE job_id = ?), "
+                "updated_at = ? WHERE job_id = ?",
+                (self.job_id, time.time(), self.job_id),
+            )
+
+    def artifact_dir(self):
+        """Directory where the job may write downloadable artifacts."""
+        return self.queue.artifact_dir(self.job_id)
+
+
+class JobQueue:
+    """Persistent job queue; one instance per process (cache it with st.cache_resource)."""
+
+    def __init__(self, db_path, artifacts_root=None, max_workers=2, stale_after=300):
+        self.db_path = db_path
+        self.artifacts_root = artifacts_root or os.path.join(os.path.dirname(db_path), "artifacts")
+        self.stale_after = stale_after
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._handlers = {}
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="finwise-job")
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        threading.Thread(target=self._heartbeat, name="finwise-job-heartbeat", daemon=True).start()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*fields.values(), job_id))
+
+    # --- Public API ---
+    def register(self, kind, handler):
+        """Register the handler for a job kind and resume any orphaned jobs of that kind.
+
+        Handlers take a JobContext and return a JSON-serializable result.
+        """
+        self._handlers[kind] = handler
+        cutoff = time.time() - self.stale_after
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT job_id, status, worker, updated_at FROM jobs WHERE kind = ? AND status IN (?, ?)",
+                (kind, QUEUED, RUNNING),
+            ).fetchall()
+        for job_id, status, worker, updated_at in rows:
+            # A running job is orphaned once its worker's heartbeat stopped, on this host or another
+            if status == QUEUED or updated_at < cutoff:
+                self._dispatch(job_id)
+
+    def submit(self, kind, payload, job_id=None):
+        """Queue a job and return its ID.
+
+        Passing a deterministic ``job_id`` (e.g. a content hash) makes the call
+        idempotent: an existing job is reused, and a failed one is retried.
+        """
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO jobs (job_id, kind, status, payload, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, QUEUED, json.dumps(payload), now, now),
+                )
+            elif row[0] == FAILED:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = NULL, updated_at = ? WHERE job_id = ?",
+                    (QUEUED, now, job_id),
+                )
+            else:
+                return job_id
+        self._dispatch(job_id)
+        return job_id
+
+    def get(self, job_id):
+        """Return the job record as a dict, or None if unknown."""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def chunk_outputs(self, job_id):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT chunk_index, output FROM job_chunks WHERE job_id = ? ORDER BY chunk_index",
+                (job_id,),
+            ).fetchall()
+        return {index: json.loads(output) for index, output in rows}
+
+    def artifact_dir(self, job_id):
+        path = os.path.join(self.artifacts_root, job_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def delete(self, job_id):
+        """Forget a job, its checkpoints and its artifacts."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM job_chunks WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+        shutil.rmtree(os.path.join(self.artifacts_root, job_id), ignore_errors=True)
+
+    # --- Workers ---
+    def _heartbeat(self):
+        # Keeps this worker's running jobs fresh even while one chunk takes longer than stale_after
+        while True:
+            time.sleep(self.stale_after / 3)
+            try:
+                with self._connect() as conn:
+                    conn.execute("UPDATE jobs SET updated_at = ? WHERE status = ? AND worker = ?",
+                                 (time.time(), RUNNING, self.worker_id))
+            except sqlite3.Error:
+                traceback.print_exc()
+
+    def _dispatch(self, job_id):
+        with self._lock:
+            if job_id in self._inflight:
+                return
+            self._inflight.add(job_id)
+        self._executor.submit(self._run, job_id)
+
+    def _claim(self, job_id):
+        # Atomic across processes and hosts: only one worker moves a queued (or stale running) job to running
+        now = time.time()
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, updated_at = ? WHERE job_id = ? "
+                "AND (status = ? OR (status = ? AND updated_at < ?))",
+                (RUNNING, self.worker_id, now, job_id, QUEUED, RUNNING, now - self.stale_after),
+            ).rowcount == 1
+
+    def _run(self, job_id):
+        try:
+            job = self.get(job_id)
+            handler = self._handlers.get(job["kind"]) if job else None
+            if handler is None or not self._claim(job_id):
+                return
+            try:
+                result = handler(JobContext(self, job_id, job["payload"]))
+                self._update(job_id, status=DONE, result=json.dumps(result), message="Completed")
+            except Exception as e:
+                traceback.print_exc()
+                self._update(job_id, status=FAILED, error=str(e))
+        finally:
+            with self._lock:
+                self._inflight.discard(job_id)
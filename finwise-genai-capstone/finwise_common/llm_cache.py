@@ -0,0 +1,178 @@
+"""Persistent exact-match LLM completion cache shared by the task apps.
+
+A LangChain ``BaseCache`` over SQLite (WAL), so every app process and job
+worker on the host (or on a shared FINWISE_STATE_DIR volume) reads and
+writes the same entries. The key is a hash of LangChain's llm_string (model
+name and every call parameter: temperature, stop words, bound tools) and
+the prompt with whitespace normalized; an identical call made by another
+app is a hit too. Entries expire after a TTL, and once the cache grows past
+its size budget the least recently used entries are evicted. Hit / miss
+counters are kept per app in the same database.
+
+Only deterministic calls use it: ``llm_cache(app, temperature)`` returns
+the cache for temperature 0 and ``False`` (LangChain's "do not cache") for
+any sampled call, so a chat reply or a summary at 0.3 is never replayed.
+Other settings: FINWISE_LLM_CACHE (0 disables), FINWISE_LLM_CACHE_TTL_SECONDS,
+FINWISE_LLM_CACHE_MAX_MB.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import warnings
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+from finwise_common.config import state_path
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_MB = 256
+EVICT_EVERY = 100  # Updates between size checks
+
+
+def cache_key(prompt, llm_string):
+    normalized = " ".join(prompt.split())
+    return hashlib.sha256(f"{llm_string}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+class SQLiteLLMCache(BaseCache):
+    """Completion cache in SQLite; ``app`` only attributes the hit statistics."""
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS completions (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        last_access REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS completions_lru ON completions (last_access);
+    CREATE TABLE IF NOT EXISTS cache_stats (
+        app TEXT PRIMARY KEY,
+        hits INTEGER NOT NULL DEFAULT 0,
+        misses INTEGER NOT NULL DEFAULT 0
+    );
+    """
+
+    def __init__(self, db_path=None, app="default", ttl_seconds=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.db_path = db_path or state_path("llm_cache.db")
+        self.app = app
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._updates = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self._SCHEMA)
+        self.evict()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _count(self, conn, column):
+        conn.execute(f"INSERT INTO cache_stats (app, {column}) VALUES (?, 1) "
+                     f"ON CONFLICT(app) DO UPDATE SET {column} = {column} + 1", (self.app,))
+
+    def lookup(self, prompt, llm_string):
+        key = cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT value FROM completions WHERE key = ? AND created_at >= ?",
+                               (key, now - self.ttl_seconds)).fetchone()
+            if row is None:
+                self._count(conn, "misses")
+                return None
+            conn.execute("UPDATE completions SET last_access = ? WHERE key = ?", (now, key))
+            self._count(conn, "hits")
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")  # loads() is marked beta
+                generations = loads(row[0])
+        except Exception:
+            generations = [Generation(text=row[0])]  # Written by an incompatible LangChain version
+        for generation in generations:
+            # Lets the route accounting tell hits from billed calls
+            generation.generation_info = {**(generation.generation_info or {}), "cached": True}
+        return generations
+
+    def update(self, prompt, llm_string, return_val):
+        value = dumps(list(return_val))
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO completions (key, value, size, created_at, last_access) "
+                         "VALUES (?, ?, ?, ?, ?)", (cache_key(prompt, llm_string), value, len(value), now, now))
+            self._updates += 1
+            evict = self._updates % EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones beyond the size budget; returns the count."""
+        with self._lock, self._connect() as conn:
+            expired = conn.execute("DELETE FROM completions WHERE created_at < ?",
+                                   (time.time() - self.ttl_seconds,)).rowcount
+            over = conn.execute("""
+                DELETE FROM completions WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(size) OVER (ORDER BY last_access DESC, key) AS kept FROM completions
+                    ) WHERE kept > ?
+                )""", (self.max_bytes,)).rowcount
+        return expired + over
+
+    def clear(self, **kwargs):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM completions")
+            conn.execute("DELETE FROM cache_stats")
+
+    def stats(self):
+        """Hit counters for this app and for all apps, plus the cache size."""
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+            rows = {app: (hits, misses) for app, hits, misses in
+                    conn.execute("SELECT app, hits, misses FROM cache_stats")}
+        hits, misses = rows.get(self.app, (0, 0))
+        all_hits = sum(h for h, _ in rows.values())
+        all_lookups = all_hits + sum(m for _, m in rows.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "all_apps_hit_rate": all_hits / all_lookups if all_lookups else 0.0,
+            "entries": entries,
+            "mb": size / 1024 / 1024,
+            "budget_mb": self.max_bytes / 1024 / 1024,
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_llm_cache(app):
+    """The process-wide cache instance for ``app``."""
+    with _caches_lock:
+        if app not in _caches:
+            _caches[app] = SQLiteLLMCache(
+                app=app,
+                ttl_seconds=float(os.environ.get("FINWISE_LLM_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+                max_bytes=int(float(os.environ.get("FINWISE_LLM_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024),
+            )
+        return _caches[app]
+
+
+def llm_cache(app, temperature):
+    """The ``cache`` argument for a LangChain model: the shared cache at temperature 0, else False."""
+    if os.environ.get("FINWISE_LLM_CACHE", "1") == "0" or temperature != 0:
+        return False
+    return get_llm_cache(app)
+
+
+def stats_caption(app):
+    """One-line hit-rate summary for an app's sidebar."""
+    stats = get_llm_cache(app).stats()
+    return (f"🗄️ LLM cache: {stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.0%}) here, "
+            f"{stats['all_apps_hit_rate']:.0%} across apps · {stats['entries']} entries, "
+            f"{stats['mb']:.1f} / {stats['budget_mb']:.0f} MB")
@@ -0,0 +1,454 @@
+"""Offline CPU chat model: int8 weights, batched decoding, prefix KV reuse, streaming.
+
+A small instruction-tuned causal LM (FINWISE_LOCAL_LLM, a Hugging Face model
+name or a local directory; Qwen2.5-0.5B-Instruct by default) runs on the CPU
+with its Linear layers dynamically quantized to int8.
+
+One ``LocalInferenceEngine`` per model and process serves every caller from a
+scheduler thread:
+
+- concurrent requests are decoded together, one forward pass per token for
+  the whole batch; a request that arrives mid-generation joins the batch at
+  the next step (its KV cache is left-padded to the batch length) instead of
+  waiting for the batch to finish;
+- prompt KV caches are kept in an LRU keyed by token IDs, so a prompt that
+  starts like an earlier one (same system prompt, a chat that grew by one
+  turn, the same RAG instructions) only prefills the new suffix;
+- generated text is pushed to a callback as it is decoded, which
+  ``LocalChatModel._stream`` turns into LangChain chunks.
+
+``LocalChatModel`` is a LangChain chat model, so it works wherever the
+Gemini one does (chains, the SQL agent, ``bind_tools`` for the ReAct agent
+using the model's chat-template tool calls, the shared completion cache).
+Set FINWISE_LLM_BACKEND=local to route every app to it (see model_router).
+"""
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+import warnings
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+DEFAULT_MODEL = os.environ.get("FINWISE_LOCAL_LLM", "Qwen/Qwen2.5-0.5B-Instruct")
+MAX_BATCH_SIZE = int(os.environ.get("FINWISE_LOCAL_LLM_BATCH", "8"))
+BATCH_WINDOW_MS = 10              # How long an idle engine waits for more requests to batch with the first
+# Prompt tokens of KV kept for prefix reuse; fp32 KV is ~25 KB per token for the 0.5B model (8192 ~ 200 MB)
+PREFIX_CACHE_TOKENS = int(os.environ.get("FINWISE_LOCAL_LLM_PREFIX_TOKENS", "8192"))
+_TOOL_CALL_RE = re.compile(r"<tool_call>\s*(\{.*?\})\s*</tool_call>", re.S)
+
+
+def load_model(model_name=DEFAULT_MODEL, quantize=True, num_threads=None):
+    """Tokenizer and eval-mode causal LM, with Linear weights quantized to int8 unless ``quantize`` is False."""
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForCausalLM.from_pretrained(model_name, dtype=torch.float32).eval()
+    if quantize:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # torch.ao eager quantization is deprecated in favour of torchao
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return tokenizer, model
+
+
+def _kv_layers(cache):
+    """[(keys, values)] per layer, from any transformers cache object or legacy tuples."""
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    if hasattr(cache, "key_cache"):
+        return list(zip(cache.key_cache, cache.value_cache))
+    return [tuple(layer[:2]) for layer in cache]
+
+
+def _make_cache(layers):
+    from transformers import DynamicCache
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(tuple(layers))
+    return DynamicCache(layers)
+
+
+class PrefixCache:
+    """LRU of prompt KV caches by token IDs, bounded by the total number of cached tokens."""
+
+    def __init__(self, max_tokens=PREFIX_CACHE_TOKENS):
+        self.max_tokens = max_tokens
+        self.hits = 0
+        self.misses = 0
+        self.tokens_reused = 0
+        self._entries = OrderedDict()  # tuple(token IDs) -> [(keys, values)]
+        self._tokens = 0
+
+    def lookup(self, ids):
+        """(n, layers): the longest cached common prefix of ``ids``, cropped to n < len(ids) tokens."""
+        best, best_key = 0, None
+        for key in self._entries:
+            n = 0
+            limit = min(len(key), len(ids) - 1)  # Leave at least one token to prefill for the next-token logits
+            while n < limit and key[n] == ids[n]:
+                n += 1
+            if n > best:
+                best, best_key = n, key
+        if best_key is None:
+            self.misses += 1
+            return 0, None
+        self._entries.move_to_end(best_key)
+        self.hits += 1
+        self.tokens_reused += best
+        return best, [(k[:, :, :best], v[:, :, :best]) for k, v in self._entries[best_key]]
+
+    def store(self, ids, layers):
+        key = tuple(ids)
+        if len(key) > self.max_tokens or key in self._entries:
+            return
+        # A prompt that extends a cached one (a chat one turn longer) replaces it
+        for old in [old for old in self._entries if len(old) < len(key) and key[:len(old)] == old]:
+            self._tokens -= len(old)
+            del self._entries[old]
+        self._entries[key] = layers
+        self._tokens += len(key)
+        while self._tokens > self.max_tokens:
+            old, _ = self._entries.popitem(last=False)
+            self._tokens -= len(old)
+
+
+class _Request:
+    def __init__(self, prompt_ids, max_new_tokens, temperature, stop, on_text):
+        self.prompt_ids = list(prompt_ids)
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.stop = [s for s in (stop or []) if s]
+        self.on_text = on_text
+        self.generated = []
+        self.text = ""
+        self.cached_prefix_tokens = 0
+        self.finish_reason = None
+        self.future = Future()
+
+
+class LocalInferenceEngine:
+    """Continuous-batching decoder over one model; ``submit`` is thread-safe and returns a Future."""
+
+    def __init__(self, model_name=DEFAULT_MODEL, quantize=True, max_batch_size=MAX_BATCH_SIZE,
+                 batch_window_ms=BATCH_WINDOW_MS, prefix_cache_tokens=PREFIX_CACHE_TOKENS, num_threads=None,
+                 tokenizer=None, model=None):
+        if model is None:
+            tokenizer, model = load_model(model_name, quantize=quantize, num_threads=num_threads)
+        self.model_name = model_name
+        self.tokenizer = tokenizer
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.batch_window_ms = batch_window_ms
+        self.prefixes = PrefixCache(prefix_cache_tokens)
+        eos = getattr(model.generation_config, "eos_token_id", None) or tokenizer.eos_token_id
+        self.eos_ids = set(eos if isinstance(eos, (list, tuple)) else [eos]) - {None}
+        self._requests = queue.Queue()
+        self._counters = {"requests": 0, "steps": 0, "rows_decoded": 0, "prompt_tokens": 0,
+                          "prefill_tokens": 0, "completion_tokens": 0, "busy_s": 0.0}
+        self._worker = threading.Thread(target=self._run, name=f"local-llm-{model_name}", daemon=True)
+        self._worker.start()
+
+    def submit(self, prompt_ids, max_new_tokens=512, temperature=0.0, stop=None, on_text=None):
+        """Queue a generation; the Future resolves to {"text", "prompt_tokens", "completion_tokens", ...}.
+
+        ``on_text(delta)`` is called from the engine thread as text is decoded.
+        """
+        request = _Request(prompt_ids, max_new_tokens, temperature, stop, on_text)
+        self._requests.put(request)
+        return request.future
+
+    def stats(self):
+        counters = dict(self._counters)
+        return {**counters,
+                "mean_batch_size": counters["rows_decoded"] / counters["steps"] if counters["steps"] else 0.0,
+                "tokens_per_s": counters["completion_tokens"] / counters["busy_s"] if counters["busy_s"] else 0.0,
+                "prefix_hits": self.prefixes.hits, "prefix_misses": self.prefixes.misses,
+                "prefix_tokens_reused": self.prefixes.tokens_reused}
+
+    # --- Scheduler thread ---
+
+    def _run(self):
+        import torch
+
+        with torch.inference_mode():
+            batch = None  # {"requests", "layers" or "cache", "mask", "positions", "next"}
+            waiting = []
+            while True:
+                if batch is None and not waiting:
+                    waiting.append(self._requests.get())
+                    time.sleep(self.batch_window_ms / 1000)  # Let concurrent requests arrive
+                while True:
+                    try:
+                        waiting.append(self._requests.get_nowait())
+                    except queue.Empty:
+                        break
+                started = time.perf_counter()
+                room = self.max_batch_size - (len(batch["requests"]) if batch else 0)
+                admitted, waiting = waiting[:room], waiting[room:]
+                for request in admitted:
+                    try:
+                        batch = self._admit(batch, request)
+                    except Exception as e:
+                        # A bad request (e.g. a prompt longer than the model's context) fails alone
+                        request.future.set_exception(e)
+                try:
+                    batch = self._drop_finished(batch)
+                    if batch is not None:
+                        batch = self._step(batch)
+                        batch = self._drop_finished(batch)
+                except Exception as e:
+                    for request in batch["requests"] if batch else []:
+                        if not request.future.done():
+                            request.future.set_exception(e)
+                    batch = None
+                self._counters["busy_s"] += time.perf_counter() - started
+
+    def _prefill(self, request):
+        import torch
+
+        ids = request.prompt_ids
+        n, layers = self.prefixes.lookup(ids)
+        request.cached_prefix_tokens = n
+        out = self.model(input_ids=torch.tensor([ids[n:]]), past_key_values=_make_cache(layers) if layers else None,
+                         position_ids=torch.arange(n, len(ids))[None], use_cache=True)
+        layers = _kv_layers(out.past_key_values)
+        self.prefixes.store(ids, layers)
+        self._counters["requests"] += 1
+        self._counters["prompt_tokens"] += len(ids)
+        self._counters["prefill_tokens"] += len(ids) - n
+        return layers, out.logits[0, -1]
+
+    def _admit(self, batch, request):
+        import torch
+        import torch.nn.functional as F
+
+        layers, logits = self._prefill(request)
+        token = self._sample(logits, request.temperature)
+        self._emit(request, token)
+        length = len(request.prompt_ids)
+        if batch is None:
+            return {"requests": [request], "cache": _make_cache(layers), "mask": torch.ones(1, length, dtype=torch.long),
+                    "positions": torch.tensor([length]), "next": torch.tensor([token])}
+        # Left-pad the shorter side so the new row lines up with the batch on the sequence axis
+        batch_layers = _kv_layers(batch["cache"])
+        width = max(batch["mask"].shape[1], length)
+        pad_batch, pad_row = width - batch["mask"].shape[1], width - length
+        merged = [(torch.cat([F.pad(bk, (0, 0, pad_batch, 0)), F.pad(k, (0, 0, pad_row, 0))]),
+                   torch.cat([F.pad(bv, (0, 0, pad_batch, 0)), F.pad(v, (0, 0, pad_row, 0))]))
+                  for (bk, bv), (k, v) in zip(batch_layers, layers)]
+        mask = torch.cat([F.pad(batch["mask"], (pad_batch, 0)),
+                          F.pad(torch.ones(1, length, dtype=torch.long), (pad_row, 0))])
+        return {"requests": batch["requests"] + [request], "cache": _make_cache(merged), "mask": mask,
+                "positions": torch.cat([batch["positions"], torch.tensor([length])]),
+                "next": torch.cat([batch["next"], torch.tensor([token])])}
+
+    def _step(self, batch):
+        import torch
+
+        mask = torch.cat([batch["mask"], torch.ones(len(batch["requests"]), 1, dtype=torch.long)], dim=1)
+        out = self.model(input_ids=batch["next"][:, None], attention_mask=mask, past_key_values=batch["cache"],
+                         position_ids=batch["positions"][:, None], use_cache=True)
+        tokens = [self._sample(out.logits[row, -1], request.temperature)
+                  for row, request in enumerate(batch["requests"])]
+        for request, token in zip(batch["requests"], tokens):
+            self._emit(request, token)
+        self._counters["steps"] += 1
+        self._counters["rows_decoded"] += len(tokens)
+        return {"requests": batch["requests"], "cache": out.past_key_values, "mask": mask,
+                "positions": batch["positions"] + 1, "next": torch.tensor(tokens)}
+
+    def _drop_finished(self, batch):
+        if batch is None:
+            return None
+        keep = [row for row, request in enumerate(batch["requests"]) if request.finish_reason is None]
+        for request in batch["requests"]:
+            if request.finish_reason is not None and not request.future.done():
+                request.future.set_result({
+                    "text": request.text, "finish_reason": request.finish_reason,
+                    "prompt_tokens": len(request.prompt_ids), "completion_tokens": len(request.generated),
+                    "cached_prefix_tokens": request.cached_prefix_tokens,
+                })
+        if not keep:
+            return None
+        if len(keep) == len(batch["requests"]):
+            return batch
+        import torch
+
+        index = torch.tensor(keep)
+        mask = batch["mask"][index]
+        start = int((mask.sum(dim=0) > 0).nonzero()[0])  # Columns that are padding for every remaining row
+        layers = [(k[index][:, :, start:], v[index][:, :, start:]) for k, v in _kv_layers(batch["cache"])]
+        return {"requests": [batch["requests"][row] for row in keep], "cache": _make_cache(layers),
+                "mask": mask[:, start:], "positions": batch["positions"][index], "next": batch["next"][index]}
+
+    @staticmethod
+    def _sample(logits, temperature):
+        import torch
+
+        if temperature <= 1e-5:
+            return int(torch.argmax(logits))
+        return int(torch.multinomial(torch.softmax(logits.float() / temperature, dim=-1), 1))
+
+    def _emit(self, request, token):
+        self._counters["completion_tokens"] += 1
+        if token in self.eos_ids:
+            request.finish_reason = "stop"
+            return
+        request.generated.append(token)
+        text = self.tokenizer.decode(request.generated, skip_special_tokens=True)
+        for stop in request.stop:
+            cut = text.find(stop)
+            if cut >= 0:
+                text, request.finish_reason = text[:cut], "stop"
+        if len(request.generated) >= request.max_new_tokens and request.finish_reason is None:
+            request.finish_reason = "length"
+        # Hold back a partial multi-byte character until it is complete
+        if not text.endswith("�") or request.finish_reason:
+            delta, request.text = text[len(request.text):], text
+            if delta and request.on_text:
+                try:
+                    request.on_text(delta)
+                except Exception as e:
+                    # A failing stream consumer ends its own request, not the batch
+                    request.finish_reason = "error"
+                    request.future.set_exception(e)
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_local_engine(model_name=DEFAULT_MODEL):
+    """The process-wide engine for ``model_name`` (loaded on first use)."""
+    with _engines_lock:
+        if model_name not in _engines:
+            _engines[model_name] = LocalInferenceEngine(model_name)
+        return _engines[model_name]
+
+
+def _content_text(content):
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+
+def _chat_messages(messages):
+    """LangChain messages as chat-template dicts (roles system / user / assistant / tool)."""
+    converted = []
+    for message in messages:
+        if isinstance(message, SystemMessage):
+            converted.append({"role": "system", "content": _content_text(message.content)})
+        elif isinstance(message, HumanMessage):
+            converted.append({"role": "user", "content": _content_text(message.content)})
+        elif isinstance(message, ToolMessage):
+            converted.append({"role": "tool", "name": message.name, "content": _content_text(message.content)})
+        elif isinstance(message, AIMessage):
+            entry = {"role": "assistant", "content": _content_text(message.content)}
+            if message.tool_calls:
+                entry["tool_calls"] = [{"type": "function", "function": {"name": call["name"], "arguments": call["args"]}}
+                                       for call in message.tool_calls]
+            converted.append(entry)
+        else:
+            converted.append({"role": "user", "content": _content_text(message.content)})
+    return converted
+
+
+def _parse_tool_calls(text):
+    """(content, tool_calls) from ``<tool_call>{"name", "arguments"}</tool_call>`` blocks in the output."""
+    calls = []
+    for match in _TOOL_CALL_RE.finditer(text):
+        try:
+            call = json.loads(match.group(1))
+        except json.JSONDecodeError:
+            continue
+        if isinstance(call, dict) and call.get("name"):
+            arguments = call.get("arguments") or {}
+            if isinstance(arguments, str):
+                try:
+                    arguments = json.loads(arguments)
+                except json.JSONDecodeError:
+                    arguments = {"input": arguments}
+            calls.append({"name": call["name"], "args": arguments, "id": f"call_{uuid.uuid4().hex[:12]}"})
+    return (_TOOL_CALL_RE.sub("", text).strip() if calls else text), calls
+
+
+class LocalChatModel(BaseChatModel):
+    """LangChain chat model served by the shared ``LocalInferenceEngine`` for ``model_name``."""
+
+    model_name: str = DEFAULT_MODEL
+    temperature: float = 0.2
+    max_new_tokens: int = 512
+    engine: Optional[Any] = None  # Defaults to the process-wide engine for model_name
+
+    @property
+    def _llm_type(self):
+        return "finwise-local"
+
+    @property
+    def _identifying_params(self):
+        return {"model_name": self.model_name, "temperature": self.temperature, "max_new_tokens": self.max_new_tokens}
+
+    def _engine(self):
+        return self.engine or get_local_engine(self.model_name)
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _prompt_ids(self, engine, messages, tools=None):
+        tokenizer = engine.tokenizer
+        conversation = _chat_messages(messages)
+        if tokenizer.chat_template:
+            prompt = tokenizer.apply_chat_template(conversation, tools=tools, add_generation_prompt=True, tokenize=False)
+        else:
+            # Base models without a chat template: plain role-prefixed transcript
+            prompt = "\n".join(f"{m['role'].title()}: {m['content']}" for m in conversation) + "\nAssistant:"
+        return tokenizer(prompt, add_special_tokens=False)["input_ids"]
+
+    def _submit(self, messages, stop, tools, on_text=None, **kwargs):
+        engine = self._engine()
+        return engine.submit(self._prompt_ids(engine, messages, tools),
+                             max_new_tokens=kwargs.get("max_new_tokens", self.max_new_tokens),
+                             temperature=kwargs.get("temperature", self.temperature), stop=stop, on_text=on_text)
+
+    def _message(self, result, tools):
+        content, tool_calls = _parse_tool_calls(result["text"]) if tools else (result["text"], [])
+        usage = {"input_tokens": result["prompt_tokens"], "output_tokens": result["completion_tokens"],
+                 "total_tokens": result["prompt_tokens"] + result["completion_tokens"]}
+        return AIMessage(content=content, tool_calls=tool_calls, usage_metadata=usage,
+                         response_metadata={"model_name": self.model_name, "finish_reason": result["finish_reason"],
+                                            "cached_prefix_tokens": result["cached_prefix_tokens"]})
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        result = self._submit(messages, stop, tools, **kwargs).result()
+        return ChatResult(generations=[ChatGeneration(message=self._message(result, tools))])
+
+    def _stream(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        if tools:
+            # Tool calls are only known once the whole reply is parsed
+            message = self._generate(messages, stop, run_manager, tools, **kwargs).generations[0].message
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=message.content, usage_metadata=message.usage_metadata,
+                tool_call_chunks=[{"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": i}
+                                  for i, c in enumerate(message.tool_calls)]))
+            return
+        deltas = queue.Queue()
+        future = self._submit(messages, stop, None, on_text=deltas.put, **kwargs)
+        future.add_done_callback(lambda _: deltas.put(None))
+        while (delta := deltas.get()) is not None:
+            if run_manager:
+                run_manager.on_llm_new_token(delta)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=delta))
+        message = self._message(future.result(), None)
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=message.usage_metadata,
+                                                         response_metadata=message.response_metadata))
@@ -0,0 +1,251 @@
+"""Per-pipeline model routing, with latency and token accounting per route.
+
+Each pipeline step is a route ("rag.rewrite", "summarization.map", ...)
+served by a model tier: auxiliary steps (question condensing, multi-query
+variants, map summaries, tool selection) go to a cheap, fast model, and only
+final synthesis goes to the strong one. The defaults are in DEFAULT_ROUTES;
+override single routes with FINWISE_MODEL_ROUTES, e.g.
+``rag.answer=pro,summarization.map=flash`` (a tier or a model name), and the
+tier models with FINWISE_MODEL_LITE / _FLASH / _PRO. With
+FINWISE_LLM_BACKEND=local every route runs on the offline model instead.
+
+Every call made through ``chat_model`` is recorded by route in SQLite:
+calls, cache hits, wall time and input / output tokens (the API's usage
+metadata, else an estimate). ``route_caption`` summarizes them for a sidebar.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler, CallbackManager
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import message_chunk_to_message
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from finwise_common.config import LLM_BACKEND, state_path
+from finwise_common.tokens import estimate_tokens
+
+TIERS = {
+    "lite": os.environ.get("FINWISE_MODEL_LITE", "gemini-2.0-flash-lite"),
+    "flash": os.environ.get("FINWISE_MODEL_FLASH", "gemini-2.0-flash"),
+    "pro": os.environ.get("FINWISE_MODEL_PRO", "gemini-2.5-pro"),
+}
+
+DEFAULT_ROUTES = {
+    "chatbot": {"reply": "flash"},
+    "agent": {"tool_selection": "flash", "synthesis": "pro"},
+    "rag": {"rewrite": "lite", "answer": "flash"},
+    "sql_qa": {"agent": "flash"},
+    "summarization": {"map": "lite", "combine": "flash", "stuff": "flash", "refine": "flash"},
+}
+
+
+def parse_overrides(spec):
+    """{pipeline: {route: tier or model}} from "pipeline.route=tier,..."."""
+    overrides = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, target = item.partition("=")
+        pipeline, _, route = name.strip().partition(".")
+        if not route or not target.strip():
+            raise ValueError(f"Invalid FINWISE_MODEL_ROUTES entry {item!r}; expected pipeline.route=tier")
+        overrides.setdefault(pipeline, {})[route] = target.strip()
+    return overrides
+
+
+def route_policy(pipeline, backend=None):
+    """{route: model name} for ``pipeline``, defaults merged with FINWISE_MODEL_ROUTES."""
+    if (backend or LLM_BACKEND) == "local":
+        from finwise_common.local_llm import DEFAULT_MODEL
+        return {route: DEFAULT_MODEL for route in DEFAULT_ROUTES.get(pipeline, {})}
+    routes = dict(DEFAULT_ROUTES.get(pipeline, {}))
+    routes.update(parse_overrides(os.environ.get("FINWISE_MODEL_ROUTES", "")).get(pipeline, {}))
+    return {route: TIERS.get(target, target) for route, target in routes.items()}
+
+
+def model_for(pipeline, route, backend=None):
+    policy = route_policy(pipeline, backend)
+    if route not in policy:
+        raise KeyError(f"No model route {pipeline}.{route}")
+    return policy[route]
+
+
+class RouteLedger:
+    """Per-route totals: calls, cache hits, wall time and tokens."""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or state_path("model_routes.db")
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS route_calls (
+                    pipeline TEXT NOT NULL,
+                    route TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    calls INTEGER NOT NULL DEFAULT 0,
+                    cached INTEGER NOT NULL DEFAULT 0,
+                    total_ms REAL NOT NULL DEFAULT 0,
+                    input_tokens INTEGER NOT NULL DEFAULT 0,
+                    output_tokens INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (pipeline, route, model)
+                )""")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def record(self, pipeline, route, model, elapsed_ms, input_tokens, output_tokens, cached=False):
+        # Cache hits are counted, but their tokens were not sent
+        if cached:
+            input_tokens = output_tokens = 0
+        with self._lock, self._connect() as conn:
+            conn.execute("""
+                INSERT INTO route_calls (pipeline, route, model, calls, cached, total_ms, input_tokens, output_tokens)
+                VALUES (?, ?, ?, 1, ?, ?, ?, ?)
+                ON CONFLICT(pipeline, route, model) DO UPDATE SET
+                    calls = calls + 1, cached = cached + excluded.cached, total_ms = total_ms + excluded.total_ms,
+                    input_tokens = input_tokens + excluded.input_tokens,
+                    output_tokens = output_tokens + excluded.output_tokens""",
+                         (pipeline, route, model, int(cached), elapsed_ms, input_tokens, output_tokens))
+
+    def stats(self, pipeline):
+        """One dict per route and model of ``pipeline``, most used first."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT route, model, calls, cached, total_ms, input_tokens, output_tokens "
+                                "FROM route_calls WHERE pipeline = ? ORDER BY calls DESC", (pipeline,)).fetchall()
+        return [{"route": route, "model": model, "calls": calls, "cached": cached,
+                 "avg_ms": total_ms / calls if calls else 0.0,
+                 "input_tokens": input_tokens, "output_tokens": output_tokens}
+                for route, model, calls, cached, total_ms, input_tokens, output_tokens in rows]
+
+    def reset(self, pipeline=None):
+        with self._lock, self._connect() as conn:
+            if pipeline is None:
+                conn.execute("DELETE FROM route_calls")
+            else:
+                conn.execute("DELETE FROM route_calls WHERE pipeline = ?", (pipeline,))
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_route_ledger():
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = RouteLedger()
+        return _ledger
+
+
+class RouteRecorder(BaseCallbackHandler):
+    """Callback attached to a routed model; records each call in the ledger."""
+
+    def __init__(self, pipeline, route, model, ledger=None):
+        self.pipeline = pipeline
+        self.route = route
+        self.model = model
+        self.ledger = ledger
+        self._started = {}  # run_id -> (start time, estimated prompt tokens)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        prompt_tokens = sum(estimate_tokens(str(m.content)) for batch in messages for m in batch)
+        self._started[run_id] = (time.perf_counter(), prompt_tokens)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started, prompt_tokens = self._started.pop(run_id, (time.perf_counter(), 0))
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        message = getattr(generation, "message", None)
+        usage = getattr(message, "usage_metadata", None) or {}
+        cached = bool(generation is not None and (generation.generation_info or {}).get("cached"))
+        (self.ledger or get_route_ledger()).record(
+            self.pipeline, self.route, self.model, (time.perf_counter() - started) * 1000,
+            usage.get("input_tokens") or prompt_tokens,
+            usage.get("output_tokens") or estimate_tokens(generation.text if generation else ""),
+            cached=cached,
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        if run_id not in self._started:
+            return
+        started, prompt_tokens = self._started.pop(run_id)
+        # A stream closed early (ReActRouter's answer steps) was still sent, prompt and all;
+        # other failures count as calls with no tokens
+        aborted = isinstance(error, GeneratorExit)
+        (self.ledger or get_route_ledger()).record(
+            self.pipeline, self.route, self.model, (time.perf_counter() - started) * 1000,
+            prompt_tokens if aborted else 0, 0)
+
+
+def chat_model(pipeline, route, temperature, backend=None, **kwargs):
+    """The chat model for ``pipeline.route``: routed model, shared cache, accounting.
+
+    Gemini (``kwargs`` go to ChatGoogleGenerativeAI), or the offline model when ``backend``
+    (default FINWISE_LLM_BACKEND) is "local".
+    """
+    from finwise_common.llm_cache import llm_cache
+
+    model = model_for(pipeline, route, backend)
+    cache = llm_cache(pipeline, temperature)
+    callbacks = [RouteRecorder(pipeline, route, model)]
+    if (backend or LLM_BACKEND) == "local":
+        from finwise_common.local_llm import LocalChatModel
+        return LocalChatModel(model_name=model, temperature=temperature, cache=cache, callbacks=callbacks)
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=model, temperature=temperature, cache=cache, callbacks=callbacks, **kwargs)
+
+
+class ReActRouter(BaseChatModel):
+    """Chat model for a ReAct agent: the fast model picks tools, the strong model writes the answer.
+
+    Every step starts on ``tool_model``, streamed, so tool selection runs on
+    the fast tier whatever came before (including later steps of multi-tool
+    chains). The first streamed chunk tells the step type: a tool call is
+    gathered and returned; text means an answer step, so the stream is
+    closed there and the step goes to ``answer_model``. A fast-model answer
+    is never generated in full and thrown away; the closed call is still
+    recorded for its route. Streamed steps do not use the completion cache.
+    """
+
+    tool_model: Any
+    answer_model: Any
+
+    @property
+    def _llm_type(self):
+        return "finwise-react-router"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"tool_model": self.tool_model.bind_tools(tools, **kwargs),
+                                       "answer_model": self.answer_model.bind_tools(tools, **kwargs)})
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        config = {}
+        if run_manager:
+            # Inner calls are traced as children of this run
+            config["callbacks"] = CallbackManager(handlers=run_manager.inheritable_handlers,
+                                                  inheritable_handlers=run_manager.inheritable_handlers,
+                                                  parent_run_id=run_manager.run_id)
+        gathered = None
+        stream = self.tool_model.stream(messages, config=config, stop=stop, **kwargs)
+        try:
+            for chunk in stream:
+                gathered = chunk if gathered is None else gathered + chunk
+                if gathered.content and not gathered.tool_call_chunks:
+                    break  # Text first: an answer step
+        finally:
+            stream.close()
+        if gathered is not None and gathered.tool_calls:
+            return ChatResult(generations=[ChatGeneration(message=message_chunk_to_message(gathered))])
+        message = self.answer_model.invoke(messages, config=config, stop=stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def route_caption(pipeline):
+    """One-line per-route summary (model, calls, latency, tokens) for an app's sidebar."""
+    stats = get_route_ledger().stats(pipeline)
+    if not stats:
+        return "🧭 Model routes: no calls recorded yet"
+    parts = [f"{s['route']} → {s['model']}: {s['calls']} calls ({s['cached']} cached), {s['avg_ms']:,.0f} ms avg, "
+             f"{s['input_tokens']:,} in / {s['output_tokens']:,} out tokens" for s in stats]
+    return "🧭 Model routes: " + " · ".join(parts)
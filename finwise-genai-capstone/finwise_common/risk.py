@@ -0,0 +1,179 @@
+"""Monte Carlo portfolio risk over the investments table.
+
+Fund returns are simulated once as correlated monthly GBM paths (a one-factor
+market model over the funds). Every client's portfolio is a linear mix of
+those fund paths, so client P&L is a matrix product over (clients x funds)
+exposures. Clients are processed in chunks sized to a memory budget, spread
+over a process pool, and reduced to per-client VaR, CVaR and max-drawdown
+statistics; the book (all clients together) gets full distributions.
+"""
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Illustrative annual assumptions per fund: (expected return, volatility, market loading)
+FUND_ASSUMPTIONS = {
+    "Bond Stabilizer": (0.06, 0.05, 0.20),
+    "Emerging Markets": (0.11, 0.24, 0.80),
+    "Equity Growth": (0.10, 0.18, 0.90),
+    "Global Diversified": (0.08, 0.12, 0.85),
+    "Real Estate Income": (0.07, 0.14, 0.60),
+    "Tech Innovators": (0.13, 0.28, 0.85),
+}
+DEFAULT_ASSUMPTION = (0.08, 0.15, 0.70)
+
+CHUNK_ELEMENTS = 4_000_000  # float32 cells per client chunk (~16 MB per working array)
+DRAWDOWN_PATHS = 2_000  # Paths per client used for drawdown quantiles
+PARALLEL_MIN_CELLS = 20_000_000  # Below this (clients x paths), a pool costs more than it saves
+
+
+def load_exposures(db_path, client_ids=None):
+    """Read holdings as an exposure matrix.
+
+    Returns (client_ids, fund_names, exposures) where exposures[i, j] is the
+    amount client i has invested in fund j.
+    """
+    query = "SELECT client_id, fund_name, SUM(amount_invested) FROM investments"
+    params = ()
+    if client_ids is not None:
+        client_ids = [int(c) for c in client_ids]
+        query += f" WHERE client_id IN ({','.join('?' * len(client_ids))})"
+        params = tuple(client_ids)
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute(query + " GROUP BY client_id, fund_name", params).fetchall()
+    clients = sorted({row[0] for row in rows})
+    funds = sorted({row[1] for row in rows})
+    client_pos = {c: i for i, c in enumerate(clients)}
+    fund_pos = {f: j for j, f in enumerate(funds)}
+    exposures = np.zeros((len(clients), len(funds)), dtype=np.float32)
+    for client_id, fund_name, amount in rows:
+        exposures[client_pos[client_id], fund_pos[fund_name]] = amount
+    return np.array(clients), funds, exposures
+
+
+def simulate_fund_paths(fund_names, n_paths, horizon_months=12, seed=None):
+    """Correlated monthly GBM growth factors, shape (horizon_months, n_funds, n_paths).
+
+    Entry [t, j, p] is the value after month t+1 of 1 invested in fund j on path p.
+    """
+    mu, sigma, loading = np.array(
+        [FUND_ASSUMPTIONS.get(name, DEFAULT_ASSUMPTION) for name in fund_names], dtype=np.float64).T
+    correlation = np.outer(loading, loading)
+    np.fill_diagonal(correlation, 1.0)
+    chol = np.linalg.cholesky(correlation)
+    rng = np.random.default_rng(seed)
+    dt = 1 / 12
+    growth = np.empty((horizon_months, len(fund_names), n_paths), dtype=np.float32)
+    log_value = np.zeros((len(fund_names), n_paths))
+    for t in range(horizon_months):
+        shocks = chol @ rng.standard_normal((len(fund_names), n_paths))
+        log_value += ((mu - sigma ** 2 / 2) * dt)[:, None] + (sigma * np.sqrt(dt))[:, None] * shocks
+        growth[t] = np.exp(log_value)
+    return growth
+
+
+def _tail_stats(losses, confidence):
+    # VaR is the confidence-quantile of losses; CVaR the mean loss at or beyond it
+    k = min(int(np.floor(confidence * losses.shape[1])), losses.shape[1] - 1)
+    part = np.partition(losses, k, axis=1)
+    return part[:, k], part[:, k:].mean(axis=1)
+
+
+_worker_growth = None
+
+
+def _init_worker(growth):
+    global _worker_growth
+    _worker_growth = growth
+
+
+def _client_chunk_stats(exposures, confidence, drawdowns, growth=None):
+    """Per-client stats for one chunk of exposure rows."""
+    growth = _worker_growth if growth is None else growth
+    horizon, _, n_paths = growth.shape
+    invested = exposures.sum(axis=1)
+    result = {"expected_pnl": np.empty(len(exposures)), "var": np.empty(len(exposures)),
+              "cvar": np.empty(len(exposures)), "max_drawdown_p50": np.full(len(exposures), np.nan),
+              "max_drawdown_p95": np.full(len(exposures), np.nan)}
+    rows = max(1, CHUNK_ELEMENTS // n_paths)
+    for start in range(0, len(exposures), rows):
+        block = exposures[start:start + rows]
+        final = block @ growth[-1]  # (rows, paths) terminal values
+        pnl = final - invested[start:start + rows, None]
+        result["expected_pnl"][start:start + rows] = pnl.mean(axis=1)
+        var, cvar = _tail_stats(-pnl, confidence)
+        result["var"][start:start + rows] = var
+        result["cvar"][start:start + rows] = cvar
+        if drawdowns:
+            # Step through the months keeping only the running peak and the worst value/peak ratio;
+            # per-client drawdown quantiles use the first DRAWDOWN_PATHS paths, which is plenty for p50/p95
+            d_paths = min(n_paths, DRAWDOWN_PATHS)
+            peak = np.repeat(np.maximum(invested[start:start + rows, None], 1e-9), d_paths, axis=1)
+            worst_ratio = np.ones_like(peak)
+            ratio = np.empty_like(peak)
+            for t in range(horizon):
+                value = block @ growth[t, :, :d_paths]
+                np.maximum(peak, value, out=peak)
+                np.divide(value, peak, out=ratio)
+                np.minimum(worst_ratio, ratio, out=worst_ratio)
+            k50, k95 = int(0.50 * (d_paths - 1)), int(0.95 * (d_paths - 1))
+            part = np.partition(worst_ratio, [d_paths - 1 - k95, d_paths - 1 - k50], axis=1)
+            result["max_drawdown_p50"][start:start + rows] = 1 - part[:, d_paths - 1 - k50]
+            result["max_drawdown_p95"][start:start + rows] = 1 - part[:, d_paths - 1 - k95]
+    return result
+
+
+def _book_stats(exposures, growth, confidence):
+    # The book is one portfolio holding every client's positions
+    book = exposures.sum(axis=0, dtype=np.float64)
+    invested = book.sum()
+    values = np.einsum("f,tfp->tp", book, growth.astype(np.float64))
+    pnl = values[-1] - invested
+    peak = np.maximum.accumulate(np.vstack([np.full(values.shape[1], invested), values]), axis=0)[1:]
+    max_drawdown = np.max(1 - values / peak, axis=0)
+    var, cvar = _tail_stats(-pnl[None, :], confidence)
+    return {
+        "invested": invested,
+        "expected_pnl": pnl.mean(),
+        "var": var[0],
+        "cvar": cvar[0],
+        "pnl_percentiles": dict(zip((1, 5, 25, 50, 75, 95, 99), np.percentile(pnl, (1, 5, 25, 50, 75, 95, 99)))),
+        "max_drawdown_percentiles": dict(zip((50, 75, 95, 99), np.percentile(max_drawdown, (50, 75, 95, 99)))),
+    }
+
+
+def simulate_risk(exposures, fund_names, n_paths=10_000, horizon_months=12, confidence=0.95,
+                  drawdowns=True, seed=None, max_workers=None):
+    """Monte Carlo VaR / CVaR / max drawdown per client and for the whole book.
+
+    ``exposures`` is (clients x funds) amounts. Losses are positive numbers in
+    the same currency. Returns {"clients": {stat: array}, "book": {...}}.
+    """
+    if not 0 < confidence < 1:
+        raise ValueError(f"confidence must be between 0 and 1 (exclusive), got {confidence}")
+    exposures = np.asarray(exposures, dtype=np.float32)
+    growth = simulate_fund_paths(fund_names, n_paths, horizon_months, seed)
+    workers = max_workers or os.cpu_count() or 1
+    cells = len(exposures) * (n_paths + (horizon_months * min(n_paths, DRAWDOWN_PATHS) if drawdowns else 0))
+    if workers == 1 or cells < PARALLEL_MIN_CELLS:
+        clients = _client_chunk_stats(exposures, confidence, drawdowns, growth)
+    else:
+        chunks = np.array_split(exposures, min(len(exposures), workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(growth,)) as pool:
+            parts = list(pool.map(_client_chunk_stats, chunks, [confidence] * len(chunks), [drawdowns] * len(chunks)))
+        clients = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+    return {"clients": clients, "book": _book_stats(exposures, growth, confidence)}
+
+
+def portfolio_risk(db_path, client_ids=None, **kwargs):
+    """simulate_risk over holdings read from ``db_path``; adds "client_ids" and "funds"."""
+    ids, funds, exposures = load_exposures(db_path, client_ids)
+    if not len(ids):
+        raise ValueError("No investments found for the requested clients.")
+    result = simulate_risk(exposures, funds, **kwargs)
+    result["client_ids"] = ids
+    result["funds"] = funds
+    result["clients"]["invested"] = exposures.sum(axis=1)
+    return result
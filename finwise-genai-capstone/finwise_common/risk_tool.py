@@ -0,0 +1,68 @@
+"""LangChain tool over finwise_common.risk, shared by the agent and the SQL QA app.
+
+Kept apart from risk so the engine itself has no LangChain dependency.
+"""
+from typing import List, Optional
+
+from langchain_core.tools import tool
+
+MAX_CLIENT_ROWS = 15  # Keep the observation small for the next LLM step
+
+
+def _money(value):
+    return f"₹{value:,.0f}"
+
+
+def format_risk_report(result, confidence):
+    """Short text report: book summary plus the riskiest (or requested) clients."""
+    book = result["book"]
+    clients = result["clients"]
+    lines = [
+        f"Book ({len(result['client_ids'])} clients, invested {_money(book['invested'])}), "
+        f"{confidence:.0%} confidence:",
+        f"- Expected P&L {_money(book['expected_pnl'])}; VaR {_money(book['var'])}; CVaR {_money(book['cvar'])}",
+        "- Max drawdown p50 / p95 / p99: " + " / ".join(
+            f"{book['max_drawdown_percentiles'][p]:.1%}" for p in (50, 95, 99)),
+        "Client | Invested | VaR | CVaR | VaR % | Max drawdown p50 / p95",
+    ]
+    var_pct = clients["var"] / clients["invested"]
+    for i in sorted(range(len(var_pct)), key=lambda i: -var_pct[i])[:MAX_CLIENT_ROWS]:
+        lines.append(
+            f"{result['client_ids'][i]} | {_money(clients['invested'][i])} | {_money(clients['var'][i])} | "
+            f"{_money(clients['cvar'][i])} | {var_pct[i]:.1%} | "
+            f"{clients['max_drawdown_p50'][i]:.1%} / {clients['max_drawdown_p95'][i]:.1%}")
+    if len(var_pct) > MAX_CLIENT_ROWS:
+        lines.append(f"(showing the {MAX_CLIENT_ROWS} clients with the highest VaR %)")
+    return "\n".join(lines)
+
+
+def _confidence_fraction(confidence):
+    """Confidence as a fraction: 95 or 99.5 (percent) become 0.95 / 0.995; None if outside (0, 1)."""
+    if confidence > 1:
+        confidence /= 100
+    return confidence if 0 < confidence < 1 else None
+
+
+def make_portfolio_risk_tool(db_path):
+    """Build the ``portfolio_risk`` tool reading holdings from the SQLite DB at ``db_path``."""
+
+    @tool(return_direct=False)
+    def portfolio_risk(client_ids: Optional[List[int]] = None, confidence: float = 0.95,
+                       horizon_months: int = 12, paths: int = 10000) -> str:
+        """Monte Carlo portfolio risk from the investments table: Value at Risk (VaR),
+        Conditional VaR (expected shortfall) and max-drawdown distribution over the horizon.
+        client_ids: clients to analyse (omit for the whole book). confidence: e.g. 0.95 or 0.99.
+        Losses are in rupees; simulations use illustrative per-fund return/volatility assumptions."""
+        from finwise_common.risk import portfolio_risk as run_portfolio_risk
+        level = _confidence_fraction(confidence)
+        if level is None:
+            return f"Risk simulation error: confidence must be a fraction such as 0.95 or 0.99, got {confidence}."
+        confidence = level
+        try:
+            result = run_portfolio_risk(db_path, client_ids, n_paths=max(1000, min(paths, 100000)),
+                                        horizon_months=max(1, min(horizon_months, 120)), confidence=confidence)
+        except Exception as e:
+            return f"Risk simulation error: {e}"
+        return format_risk_report(result, confidence)
+
+    return portfolio_risk
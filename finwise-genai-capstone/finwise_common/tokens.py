@@ -0,0 +1,52 @@
+"""Cheap token estimates and budget trimming for text sent back to an LLM.
+
+Gemini and the local models use different tokenizers, so an exact count is
+not worth a tokenizer dependency here; ~4 characters per token is close
+enough for English financial text and errs on the generous side.
+"""
+import math
+import re
+
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_END_RE = re.compile(r"[.!?](?=\s)")
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text to about ``max_tokens``, preferring a sentence, then a word boundary."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    sentence_ends = [m.end() for m in _SENTENCE_END_RE.finditer(cut + " ")]
+    if sentence_ends and sentence_ends[-1] > max_chars // 2:
+        return cut[:sentence_ends[-1]]
+    space = cut.rfind(" ")
+    return (cut[:space] if space > max_chars // 2 else cut).rstrip() + "…"
+
+
+def trim_to_budget(texts, max_tokens, separator="\n\n"):
+    """Keep texts in order until ``max_tokens`` is spent; the last one kept may be truncated.
+
+    Returns the kept texts joined by ``separator``.
+    """
+    kept = []
+    remaining = max_tokens
+    for text in texts:
+        if kept:
+            remaining -= estimate_tokens(separator)
+        if remaining <= 0:
+            break
+        if estimate_tokens(text) <= remaining:
+            kept.append(text)
+            remaining -= estimate_tokens(text)
+        else:
+            # Only worth truncating if a useful fragment fits
+            if remaining >= 20 or not kept:
+                kept.append(truncate_to_tokens(text, remaining))
+            break
+    return separator.join(kept)
@@ -1,7 +1,17 @@
+import os
+import sys
+import uuid
 import streamlit as st
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
+# LangChain and the Gemini client are imported on first use to keep cold starts fast.
+
+# Make the shared finwise_common package (one level up) importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from finwise_common.config import LLM_BACKEND
+from finwise_common.conversation_store import get_conversation_store
+
+HISTORY_PAGE_SIZE = 50 # Turns shown per page of chat history
+MEMORY_WINDOW = 20 # Turns the model sees as conversation memory
+COMPACT_AFTER = 200 # Fold older turns into a summary once a session grows past this
 
 # Page configuration
 st.set_page_config(
@@ -125,40 +135,77 @@ with st.sidebar:
 try:
     api_key = st.secrets['GOOGLE_API_KEY']
 except KeyError:
-    st.error("Google API Key not found. Please set it in your Streamlit secrets.toml file.")
-    st.stop() # Stop the app if the key is missing
+    if LLM_BACKEND != "local":
+        st.error("Google API Key not found. Please set it in your Streamlit secrets.toml file.")
+        st.stop() # Stop the app if the key is missing
+    api_key = None # Offline: replies come from the local model (FINWISE_LLM_BACKEND=local)
 
 # Initialize the Gemini chat model
 @st.cache_resource
 def load_llm():
-    return ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash",
-        google_api_key=api_key,
-        temperature=0.7
-    )
+    from finwise_common.model_router import chat_model
+    # Model from the "chatbot.reply" route; chat replies are sampled, so they are never cached
+    return chat_model("chatbot", "reply", temperature=0.7, google_api_key=api_key)
+
+# Durable conversation store shared by all sessions (and replicas, via a shared state dir)
+@st.cache_resource
+def load_store():
+    return get_conversation_store()
+
+store = load_store()
+
+# The session ID lives in the URL, so a refresh or another replica resumes the same conversation
+if "sid" not in st.query_params:
+    st.query_params["sid"] = uuid.uuid4().hex
+session_id = st.query_params["sid"]
+
+with st.sidebar:
+    if st.button("🆕 New conversation"):
+        st.query_params["sid"] = uuid.uuid4().hex
+        st.session_state.pop("conversation", None)
+        st.session_state.history_pages = 1
+        st.rerun()
 
-llm = load_llm()
+# Set up conversation memory and chain (built when the first question arrives)
+def get_conversation():
+    if st.session_state.get("conversation_sid") != session_id:
+        from langchain.chains import ConversationChain
+        from langchain.memory import ConversationBufferMemory
+        from finwise_common.chat_history import StoreChatMessageHistory
 
-# Set up conversation memory and chain
-if "memory" not in st.session_state:
-    st.session_state.memory = ConversationBufferMemory()
+        # The memory reads only the latest turns from the store and writes each new turn back
+        st.session_state.memory = ConversationBufferMemory(
+            chat_memory=StoreChatMessageHistory(store, session_id, window=MEMORY_WINDOW)
+        )
+        st.session_state.conversation = ConversationChain(
+            llm=load_llm(),
+            memory=st.session_state.memory,
+            verbose=False
+        )
+        st.session_state.conversation_sid = session_id
+    return st.session_state.conversation
 
-if "conversation" not in st.session_state:
-    st.session_state.conversation = ConversationChain(
-        llm=llm,
-        memory=st.session_state.memory,
-        verbose=False
-    )
+def summarize_turns(turns):
+    transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+    prompt = f"Summarize this financial-advice conversation in a short paragraph, keeping figures and goals:\n\n{transcript}"
+    return load_llm().invoke(prompt).content
 
 # Chat history container
 chat_container = st.container()
 
-# Display chat history
+# Display chat history, one page of recent turns at a time
 with chat_container:
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
+    pages = st.session_state.setdefault("history_pages", 1)
+    turns = store.recent(session_id, limit=pages * HISTORY_PAGE_SIZE)
+    if store.count(session_id) > len(turns):
+        if st.button("⬆️ Load earlier messages"):
+            st.session_state.history_pages += 1
+            st.rerun()
 
-    for message in st.session_state.messages:
+    for message in turns:
+        if message["role"] == "summary":
+            st.caption(f"Earlier conversation (summarized): {message['content']}")
+            continue
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
 
@@ -166,18 +213,23 @@ with chat_container:
 user_input = st.chat_input("Type your financial question here...")
 
 if user_input:
-    # Append user message
-    st.session_state.messages.append({"role": "user", "content": user_input})
-   
-    # Get response
+    # Get response; the chain's memory appends both turns to the store
     with st.spinner("Thinking..."):
-        response = st.session_state.conversation.predict(input=user_input)
-   
-    # Append bot message
-    st.session_state.messages.append({"role": "assistant", "content": response})
-   
+        response = get_conversation().predict(input=user_input)
+
+    # Keep long sessions compact: older turns are folded into a summary turn
+    if store.count(session_id) > COMPACT_AFTER:
+        store.compact(session_id, keep_last=COMPACT_AFTER // 2, summarize=summarize_turns)
+
     # Rerun to update the chat container
     st.rerun()
 
+# Shared LLM cache and model route statistics (once the model is loaded; chat replies here opt out)
+if st.session_state.get("conversation_sid"):
+    from finwise_common.llm_cache import stats_caption
+    from finwise_common.model_router import route_caption
+    st.sidebar.caption(stats_caption("chatbot"))
+    st.sidebar.caption(route_caption("chatbot"))
+
 # Footer
 st.markdown('<div class="footer">Built by Abhinav Nautiyal</div>', unsafe_allow_html=True)
@@ -1,17 +1,19 @@
 import os
+import sys
 import streamlit as st
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.prebuilt import create_react_agent
 from langchain_core.tools import tool
-from langchain_experimental.utilities.python import PythonREPL
-from langchain_community.tools import DuckDuckGoSearchRun
-import math
+# The Gemini client, LangGraph, PythonREPL and DuckDuckGo are imported lazily
+# (on the first question / first tool call) to keep cold starts fast.
 import requests
 import json
 import warnings
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage # Import message types
 from langchain_core.runnables import RunnableConfig # Import for the config to pass to agent.invoke
 
+# Make the shared finwise_common package (one level up) importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from finwise_common.config import LLM_BACKEND
+
 # Ignore warnings
 warnings.filterwarnings('ignore')
 
@@ -28,12 +30,13 @@ with st.sidebar:
     st.title("🤖 About This Agent")
     st.markdown("""
     This is an **Autonomous AI Agent** designed to assist with financial calculations and data fetching.
-    It uses **LangGraph** for advanced agentic orchestration and **Gemini 2.5 Pro** as its brain.
+    It uses **LangGraph** for advanced agentic orchestration: **Gemini 2.0 Flash** picks the tools and **Gemini 2.5 Pro** writes the answers.
 
     **Capabilities:**
-    - **Calculations:** Perform complex math, including EMI and compound interest, using a `calculator` or `python_repl` tool.
+    - **Calculations:** EMI, amortization schedules, FV/PV/NPV/IRR/XIRR, SIP projections and CAGR with dedicated finance tools; `python_repl` for anything else.
+    - **Portfolio Risk:** Monte Carlo VaR, CVaR and drawdowns for clients in the FinWise database.
     - **Stock Data:** Fetch real-time stock prices (requires Alpha Vantage API key).
-    - **Web Search:** Find general information using `DuckDuckGoSearch`.
+    - **Web Search:** Find general information using `DuckDuckGoSearch` (cached, with an offline market-news corpus).
 
     **How it Works (ReAct Agent):**
     The agent employs a **Reasoning and Acting (ReAct)** approach, thinking step-by-step to:
@@ -58,9 +61,10 @@ with st.sidebar:
 @st.cache_resource # Cache API keys so they are loaded only once
 def load_api_keys():
     try:
-        # Load Google API Key
-        google_api_key = st.secrets["GOOGLE_API_KEY"]
-        os.environ["GOOGLE_API_KEY"] = google_api_key # Set as environment variable for LangChain
+        # Load Google API Key (optional offline: FINWISE_LLM_BACKEND=local runs the agent on the local model)
+        google_api_key = st.secrets.get("GOOGLE_API_KEY") if LLM_BACKEND == "local" else st.secrets["GOOGLE_API_KEY"]
+        if google_api_key:
+            os.environ["GOOGLE_API_KEY"] = google_api_key # Set as environment variable for LangChain
 
         # Load Alpha Vantage Key (optional)
         alpha_vantage_key = st.secrets.get('ALPHA_VANTAGE_KEY') # Use .get() for optional keys
@@ -81,46 +85,9 @@ def load_api_keys():
 
 GOOGLE_API_KEY, ALPHA_VANTAGE_KEY = load_api_keys()
 
-# --- Initialize Gemini LLM ---
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-pro",
-    google_api_key=GOOGLE_API_KEY, # Pass the loaded key directly
-    temperature=0.1
-)
-
 # --- Define Tools ---
-@tool(return_direct=False)
-def calculator(expression: str) -> str:
-    """Perform mathematical calculations or EMI. Input:
-    - 'EMI(P, r, n)' for loan EMI where P=principal, r=annual interest rate (e.g., 0.09 for 9%), n=number of months.
-    - Simple arithmetic expressions like '2 + 2'.
-    Returns result or error message."""
-    try:
-        if expression.startswith("EMI("):
-            args = expression[4:-1].split(",")
-            if len(args) != 3:
-                return "Error: EMI function requires 3 arguments: principal, annual_rate, months."
-            P = float(args[0].strip())
-            r_annual = float(args[1].strip())
-            n = int(args[2].strip())
-            
-            if r_annual <= 0 or n <= 0:
-                return "Error: Annual rate and number of months must be positive for EMI calculation."
-
-            r_monthly = r_annual / 12
-            
-            # EMI Formula: P * r * (1 + r)^n / ((1 + r)^n - 1)
-            # Handle the case where r_monthly is effectively 0 (very low interest rate)
-            if r_monthly == 0:
-                emi = P / n # Simple division for 0 interest
-            else:
-                emi = P * r_monthly * (math.pow(1 + r_monthly, n)) / (math.pow(1 + r_monthly, n) - 1)
-            return f"Monthly EMI: ₹{emi:.2f}"
-        else:
-            # Evaluate simple expressions
-            return str(eval(expression))
-    except Exception as e:
-        return f"Error in calculation: {str(e)}"
+# Calculator, EMI, amortization, FV/PV/NPV/IRR/XIRR, SIP and CAGR are typed NumPy tools
+from finance_tools import FINANCE_TOOLS
 
 @tool(return_direct=False)
 def python_repl(code: str) -> str:
@@ -129,6 +96,7 @@ def python_repl(code: str) -> str:
     Example for compound interest: `P = 10000; r = 0.07; t = 10; amount = P * (1 + r)**t; print(f'Future Value: {amount:.2f}')`
     """
     try:
+        from langchain_experimental.utilities.python import PythonREPL
         repl = PythonREPL()
         result = repl.run(code)
         return str(result).strip()
@@ -162,30 +130,43 @@ def stock_price(symbol: str) -> str:
     except Exception as e:
         return f"An unexpected error occurred while fetching {symbol} data: {str(e)}"
 
+# One search client + persistent result cache per process (see web_search.py).
+# Set FINWISE_SEARCH_BACKEND=local to answer from saved market-news pages offline.
+@st.cache_resource
+def get_search():
+    from web_search import get_web_search
+    return get_web_search()
+
 @tool(return_direct=False)
 def web_search(query: str) -> str:
     """Search the web for general information, news, or explanations.
     Input: A search query string."""
     try:
-        search = DuckDuckGoSearchRun() # Corrected instantiation
-        results = search.run(query) # DuckDuckGoSearchRun has a .run() method
-        return results # Returns a string of search results
+        return get_search().run(query) # Cached, token-trimmed results
     except Exception as e:
         return f"Search error: {str(e)}"
 
-# List of tools
-tools = [calculator, python_repl, stock_price, web_search]
+# Monte Carlo VaR / CVaR / drawdown over the client holdings in the SQL QA database
+from finwise_common.risk_tool import make_portfolio_risk_tool
+FINANCIAL_DB_PATH = os.environ.get(
+    "FINWISE_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "task-05-sql-qa", "financial_data.db"),
+)
+portfolio_risk = make_portfolio_risk_tool(FINANCIAL_DB_PATH)
 
-# Bind tools to LLM
-llm_with_tools = llm.bind_tools(tools)
+# List of tools
+tools = FINANCE_TOOLS + [portfolio_risk, python_repl, stock_price, web_search]
 
 # --- System Prompt ---
 SYSTEM_PROMPT = """You are a highly capable and precise AI financial assistant. ALWAYS use the provided tools for calculations and data fetching when appropriate. Your workflow should be step-by-step:
 1.  **Analyze the User's Query:** Understand the core request.
-2.  **Identify Required Tools:** Determine which tool(s) are best suited for the task (e.g., calculator for EMI, python_repl for complex math, stock_price for market data, web_search for general info).
-3.  **Formulate Tool Calls:** Construct the exact input for the chosen tool.
-    -   For **EMI**: Call `calculator` with `EMI(PRINCIPAL, ANNUAL_RATE_DECIMAL, MONTHS)` (e.g., `EMI(2000000, 0.09, 60)`).
-    -   For **Compound Interest/Complex Math**: Call `python_repl` with Python code (e.g., `P = 10000; r = 0.07; t = 10; amount = P * (1 + r)**t; print(f"Future Value: {amount:.2f}")`).
+2.  **Identify Required Tools:** Determine which tool(s) are best suited for the task (e.g., loan_emi for EMI, sip_projection for SIPs, stock_price for market data, web_search for general info).
+3.  **Formulate Tool Calls:** Pass structured arguments; rates are decimals (9% -> 0.09).
+    -   For **EMI**: Call `loan_emi` (e.g., principal=2000000, annual_rate=0.09, months=60); use `amortization_schedule` for the month-by-month split.
+    -   For **Compound Interest / Returns**: Call `future_value`, `present_value`, `npv`, `irr`, `xirr`, `sip_projection` or `cagr`.
+    -   For **Rate Sensitivity**: Call `cashflow_scenarios` with the cash flows and a rate range.
+    -   For **Client / Book Risk (VaR, CVaR, drawdown)**: Call `portfolio_risk`, with `client_ids` for specific clients.
+    -   For **Plain Arithmetic**: Call `calculator` with an expression (e.g., `(1.07 ** 10) * 10000`).
     -   For **Stock Prices**: Call `stock_price` with the ticker symbol (e.g., `AAPL`).
     -   For **General Information**: Call `web_search` with a clear query.
 4.  **Execute Tool Calls:** Run the tool.
@@ -193,20 +174,35 @@ SYSTEM_PROMPT = """You are a highly capable and precise AI financial assistant.
 6.  **Refine and Answer:** Construct a clear, concise, and accurate final answer. If multiple steps or tools are needed, demonstrate multi-step reasoning.
 
 **Important Instructions:**
--   If a calculation involves steps not directly covered by a simple `calculator` expression, prefer `python_repl`.
+-   Prefer the finance tools over `python_repl`; use `python_repl` only for calculations none of them cover.
 -   Be explicit about which tool you are using and why, if asked to explain.
 -   Always provide a definitive final answer to the user's request.
 """
 
-# Create ReAct Agent (without system_message here)
-agent = create_react_agent(
-    llm_with_tools,
-    tools,
-)
+# Create ReAct Agent (without system_message here) on first use
+@st.cache_resource
+def get_agent():
+    from langgraph.prebuilt import create_react_agent
+    from finwise_common.model_router import ReActRouter, chat_model
+
+    # --- Initialize Gemini LLMs ---
+    # Every step starts streaming on the fast model (agent.* routes): tool calls are kept, and a step
+    # that starts with text is handed to the strong one, so final answers come from the strong model.
+    # Streamed steps bypass the shared completion cache, so tool selection is never a cache hit.
+    llm = ReActRouter(
+        tool_model=chat_model("agent", "tool_selection", temperature=0, google_api_key=GOOGLE_API_KEY),
+        answer_model=chat_model("agent", "synthesis", temperature=0.1, google_api_key=GOOGLE_API_KEY),
+    )
+
+    # Tools are bound to both models by the agent
+    return create_react_agent(
+        llm,
+        tools,
+    )
 
 # --- Streamlit App UI ---
 st.title("💰 Agentic Financial Assistant")
-st.markdown("### Powered by LangGraph & Gemini 2.5 Pro")
+st.markdown("### Powered by LangGraph, Gemini 2.0 Flash & Gemini 2.5 Pro")
 
 # Session state for conversation history
 if "messages" not in st.session_state:
@@ -238,7 +234,7 @@ if prompt := st.chat_input("Ask me about financial calculations, stock prices, o
                                     for m in st.session_state.messages if m["role"] != "user" or m["content"] != prompt] + \
                                    [HumanMessage(content=prompt)]
 
-            response = agent.invoke({"messages": agent_input_messages})
+            response = get_agent().invoke({"messages": agent_input_messages})
             
             # The final response from the agent is typically the last message content
             final_response = response["messages"][-1].content
@@ -247,6 +243,10 @@ if prompt := st.chat_input("Ask me about financial calculations, stock prices, o
             st.session_state.messages.append({"role": "assistant", "content": final_response})
             with st.chat_message("assistant"):
                 st.markdown(final_response)
+            from finwise_common.llm_cache import stats_caption
+            from finwise_common.model_router import route_caption
+            st.sidebar.caption(stats_caption("agent"))
+            st.sidebar.caption(route_caption("agent"))
 
             # Optional: Display tool calls for debugging/transparency
             with st.expander("Detailed Agent Trace (Tool Calls & Thoughts)"):
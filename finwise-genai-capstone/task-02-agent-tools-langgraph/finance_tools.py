@@ -0,0 +1,193 @@
+"""Typed financial-math tools for the agent, backed by finwise_common.finmath.
+
+Each tool takes structured arguments (no expression strings, no REPL round
+trip) and returns a short, deterministic text answer. NumPy is imported on
+the first tool call, not at app start.
+"""
+import ast
+import math
+import operator
+from typing import List
+
+from langchain_core.tools import tool
+
+MAX_POWER_BITS = 10000
+
+
+def _bounded_pow(base, exponent):
+    # Huge integer powers (e.g. 10 ** 10 ** 10 or (9 ** 9999) ** 9999) would hang the agent, so the size of
+    # the result is bounded; float powers overflow quickly on their own
+    if (isinstance(base, int) and isinstance(exponent, int) and exponent > 0 and abs(base) > 1
+            and exponent * math.log2(abs(base)) > MAX_POWER_BITS):
+        raise ValueError("Result too large.")
+    return operator.pow(base, exponent)
+
+
+_BINARY_OPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: _bounded_pow,
+}
+_UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+_FUNCTIONS = {"sqrt": math.sqrt, "log": math.log, "exp": math.exp, "abs": abs, "round": round, "min": min, "max": max}
+
+
+def safe_eval(expression):
+    """Evaluate plain arithmetic (numbers, + - * / // % **, a few math functions) without eval."""
+    def visit(node):
+        if isinstance(node, ast.Expression):
+            return visit(node.body)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return node.value
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+            return _BINARY_OPS[type(node.op)](visit(node.left), visit(node.right))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+            return _UNARY_OPS[type(node.op)](visit(node.operand))
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS:
+            return _FUNCTIONS[node.func.id](*[visit(arg) for arg in node.args])
+        raise ValueError(f"Unsupported expression element: {ast.dump(node)[:40]}")
+    return visit(ast.parse(expression, mode="eval"))
+
+
+def _money(value):
+    return f"₹{value:,.2f}"
+
+
+@tool(return_direct=False)
+def calculator(expression: str) -> str:
+    """Evaluate a plain arithmetic expression like '2 + 2' or '(1.07 ** 10) * 10000'.
+    Supports + - * / // % ** and sqrt, log, exp, abs, round, min, max.
+    For loans, interest and returns use the dedicated finance tools instead."""
+    try:
+        return str(safe_eval(expression))
+    except Exception as e:
+        return f"Error in calculation: {str(e)}"
+
+
+@tool(return_direct=False)
+def loan_emi(principal: float, annual_rate: float, months: int) -> str:
+    """Monthly EMI of a loan. annual_rate is a decimal (0.09 for 9%), months is the tenure in months."""
+    from finwise_common import finmath
+    if months <= 0 or annual_rate < 0:
+        return "Error: months must be positive and annual_rate non-negative."
+    payment = float(finmath.emi(principal, annual_rate, months))
+    return (f"Monthly EMI: {_money(payment)}; total payment {_money(payment * months)}, "
+            f"total interest {_money(payment * months - principal)}")
+
+
+@tool(return_direct=False)
+def amortization_schedule(principal: float, annual_rate: float, months: int, show_months: int = 12) -> str:
+    """Loan amortization schedule. Shows the first show_months rows plus yearly totals.
+    annual_rate is a decimal (0.09 for 9%)."""
+    from finwise_common import finmath
+    if months <= 0 or annual_rate < 0:
+        return "Error: months must be positive and annual_rate non-negative."
+    s = finmath.amortization_schedule(principal, annual_rate, months)
+    lines = ["Month | Payment | Interest | Principal | Balance"]
+    for i in range(min(show_months, months)):
+        lines.append(f"{s['month'][i]} | {s['payment'][i]:,.2f} | {s['interest'][i]:,.2f} | "
+                     f"{s['principal'][i]:,.2f} | {s['balance'][i]:,.2f}")
+    lines.append("Year | Interest | Principal | Closing balance")
+    for start in range(0, months, 12):
+        end = min(start + 12, months)
+        lines.append(f"{start // 12 + 1} | {s['interest'][start:end].sum():,.2f} | "
+                     f"{s['principal'][start:end].sum():,.2f} | {s['balance'][end - 1]:,.2f}")
+    return "\n".join(lines)
+
+
+@tool(return_direct=False)
+def future_value(rate: float, periods: int, present_value: float = 0.0, payment_per_period: float = 0.0,
+                 payment_at_start: bool = False) -> str:
+    """Future value of a lump sum and/or a regular payment. rate is per period as a decimal
+    (e.g. 0.07 yearly for 10 yearly periods). Example: 10,000 at 7% for 10 years -> rate=0.07, periods=10, present_value=10000."""
+    from finwise_common import finmath
+    value = float(finmath.future_value(rate, periods, payment_per_period, present_value, due=payment_at_start))
+    return f"Future value: {_money(value)}"
+
+
+@tool(return_direct=False)
+def present_value(rate: float, periods: int, future_value: float = 0.0, payment_per_period: float = 0.0,
+                  payment_at_start: bool = False) -> str:
+    """Present value of a future lump sum and/or a regular payment. rate is per period as a decimal."""
+    from finwise_common import finmath
+    value = float(finmath.present_value(rate, periods, payment_per_period, future_value, due=payment_at_start))
+    return f"Present value: {_money(value)}"
+
+
+@tool(return_direct=False)
+def npv(rate: float, cashflows: List[float]) -> str:
+    """Net present value. cashflows[0] is today (negative for an investment), then one per period.
+    rate is the per-period discount rate as a decimal."""
+    from finwise_common import finmath
+    return f"NPV: {_money(float(finmath.npv(rate, cashflows)))}"
+
+
+@tool(return_direct=False)
+def irr(cashflows: List[float]) -> str:
+    """Internal rate of return of evenly spaced cash flows (cashflows[0] today, usually negative)."""
+    from finwise_common import finmath
+    rate = finmath.irr(cashflows)
+    if math.isnan(rate):
+        return "IRR is undefined: the cash flows must include both outflows and inflows."
+    return f"IRR: {rate:.4%} per period"
+
+
+@tool(return_direct=False)
+def xirr(cashflows: List[float], dates: List[str]) -> str:
+    """Annualized return of irregularly dated cash flows. dates are ISO strings (YYYY-MM-DD),
+    one per cash flow; investments negative, redemptions/current value positive."""
+    from finwise_common import finmath
+    if len(cashflows) != len(dates):
+        return "Error: cashflows and dates must have the same length."
+    rate = finmath.xirr(cashflows, dates)
+    if math.isnan(rate):
+        return "XIRR is undefined: the cash flows must include both outflows and inflows."
+    return f"XIRR: {rate:.4%} per year"
+
+
+@tool(return_direct=False)
+def sip_projection(monthly_investment: float, annual_return: float, years: int, annual_step_up: float = 0.0) -> str:
+    """Projected value of a monthly SIP. annual_return and annual_step_up (yearly increase
+    of the instalment) are decimals. Returns year-by-year invested amount and value."""
+    from finwise_common import finmath
+    if years <= 0:
+        return "Error: years must be positive."
+    p = finmath.sip_projection(monthly_investment, annual_return, years, annual_step_up)
+    lines = ["Year | Invested | Value"]
+    lines += [f"{y} | {i:,.2f} | {v:,.2f}" for y, i, v in zip(p["year"], p["invested"], p["value"])]
+    lines.append(f"Final value {_money(p['value'][-1])} on {_money(p['invested'][-1])} invested "
+                 f"(gain {_money(p['value'][-1] - p['invested'][-1])})")
+    return "\n".join(lines)
+
+
+@tool(return_direct=False)
+def cagr(begin_value: float, end_value: float, years: float) -> str:
+    """Compound annual growth rate between a starting and an ending value."""
+    from finwise_common import finmath
+    if begin_value <= 0 or years <= 0:
+        return "Error: begin_value and years must be positive."
+    return f"CAGR: {float(finmath.cagr(begin_value, end_value, years)):.4%}"
+
+
+@tool(return_direct=False)
+def cashflow_scenarios(cashflows: List[float], min_rate: float, max_rate: float, scenarios: int = 1000) -> str:
+    """NPV of a portfolio's cash flows across many discount-rate scenarios (evenly spaced
+    from min_rate to max_rate, decimals). Reports the NPV range, percentiles and break-even rate."""
+    import numpy as np
+    from finwise_common import finmath
+    rates = np.linspace(min_rate, max_rate, max(2, min(scenarios, 100000)))
+    values = finmath.evaluate_cashflows(cashflows, rates)
+    p5, p50, p95 = np.percentile(values, [5, 50, 95])
+    lines = [
+        f"{len(rates)} scenarios, rates {min_rate:.2%} to {max_rate:.2%}",
+        f"NPV range: {_money(values.min())} to {_money(values.max())}",
+        f"NPV 5th / 50th / 95th percentile: {_money(p5)} / {_money(p50)} / {_money(p95)}",
+        f"Share of scenarios with NPV > 0: {np.mean(values > 0):.1%}",
+    ]
+    crossings = np.nonzero(np.diff(np.sign(values)))[0]
+    if len(crossings):
+        lines.append(f"Break-even rate ≈ {rates[crossings[0]]:.2%}")
+    return "\n".join(lines)
+
+
+FINANCE_TOOLS = [calculator, loan_emi, amortization_schedule, future_value, present_value,
+                 npv, irr, xirr, sip_projection, cagr, cashflow_scenarios]
@@ -0,0 +1,188 @@
+"""Cached web search for the agent's ``web_search`` tool.
+
+Results are kept in a persistent query -> results cache (SQLite, with a TTL)
+so repeated searches within and across conversations skip the network.
+Backends are tried in order: DuckDuckGo when online, then a local BM25 corpus
+of saved market-news pages that also works fully offline. What goes back to
+the model is trimmed to a token budget to keep the next agent step small.
+"""
+import glob
+import html
+import json
+import os
+import re
+import sqlite3
+import time
+
+from finwise_common.bm25 import BM25Index
+from finwise_common.config import state_path
+from finwise_common.tokens import trim_to_budget
+
+DEFAULT_TTL_SECONDS = 6 * 3600
+CORPUS_EXTENSIONS = (".txt", ".md", ".html", ".htm")
+
+_TAG_RE = re.compile(r"<(script|style)\b.*?</\1>|<[^>]+>", re.S | re.I)
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+class DuckDuckGoBackend:
+    """Online backend; one client is reused for every query."""
+
+    name = "duckduckgo"
+
+    def __init__(self):
+        from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
+        self.client = DuckDuckGoSearchAPIWrapper()
+
+    def search(self, query, max_results=5):
+        return [
+            {"title": r.get("title", ""), "snippet": r.get("snippet", ""), "url": r.get("link", "")}
+            for r in self.client.results(query, max_results)
+            if "link" in r  # The wrapper returns a placeholder entry when nothing matched
+        ]
+
+
+class LocalCorpusBackend:
+    """BM25 over saved pages (.txt, .md, .html) in a directory, split into passages."""
+
+    name = "local"
+
+    def __init__(self, corpus_dir, passage_chars=800):
+        self.corpus_dir = corpus_dir
+        self.passages = []
+        for path in sorted(glob.glob(os.path.join(corpus_dir, "**", "*"), recursive=True)):
+            if not path.lower().endswith(CORPUS_EXTENSIONS):
+                continue
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                text = f.read()
+            if path.lower().endswith((".html", ".htm")):
+                text = html.unescape(_TAG_RE.sub(" ", text))
+            title = os.path.splitext(os.path.basename(path))[0].replace("_", " ")
+            for passage in self._split(text, passage_chars):
+                self.passages.append({"title": title, "snippet": passage, "url": f"file://{os.path.abspath(path)}"})
+        self.index = BM25Index([p["title"] + " " + p["snippet"] for p in self.passages])
+
+    @staticmethod
+    def _split(text, passage_chars):
+        # Pack paragraphs into passages of about passage_chars
+        passage = ""
+        for paragraph in re.split(r"\n\s*\n", text):
+            paragraph = " ".join(paragraph.split())
+            if not paragraph:
+                continue
+            if passage and len(passage) + len(paragraph) > passage_chars:
+                yield passage
+                passage = ""
+            passage = f"{passage} {paragraph}".strip()
+        if passage:
+            yield passage
+
+    def search(self, query, max_results=5):
+        return [dict(self.passages[position]) for position, _ in self.index.search(query, max_results)]
+
+
+class SearchCache:
+    """Persistent (backend, normalized query) -> results cache with a TTL."""
+
+    def __init__(self, db_path=None, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.db_path = db_path or state_path("search_cache.db")
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                "backend TEXT NOT NULL, query TEXT NOT NULL, results TEXT NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (backend, query))"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def get(self, backend, query):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT results FROM search_cache WHERE backend = ? AND query = ? AND created_at >= ?",
+                (backend, query, time.time() - self.ttl_seconds),
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, backend, query, results):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO search_cache (backend, query, results, created_at) VALUES (?, ?, ?, ?)",
+                (backend, query, json.dumps(results), time.time()),
+            )
+            conn.execute("DELETE FROM search_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+class CachedWebSearch:
+    """Tries each backend in order (cache first) and formats results within a token budget."""
+
+    def __init__(self, backends, cache, max_results=5, max_tokens=400):
+        self.backends = backends
+        self.cache = cache
+        self.max_results = max_results
+        self.max_tokens = max_tokens
+
+    def search(self, query):
+        """Return (backend name, results) from the first backend with any results."""
+        query = normalize_query(query)
+        errors = []
+        for backend in self.backends:
+            results = self.cache.get(backend.name, query)
+            if results is None:
+                try:
+                    results = backend.search(query, self.max_results)
+                except Exception as e:
+                    errors.append(f"{backend.name}: {e}")
+                    continue
+                if results:
+                    # Empty answers (rate limits, an unsynced corpus) are retried next time, not kept for the TTL
+                    self.cache.put(backend.name, query, results)
+            if results:
+                return backend.name, results
+        if errors:
+            raise RuntimeError("; ".join(errors))
+        return None, []
+
+    def run(self, query):
+        backend, results = self.search(query)
+        if not results:
+            return "No results found."
+        entries = [f"[{i}] {r['title']}: {r['snippet']} ({r['url']})" for i, r in enumerate(results, 1)]
+        return f"Source: {backend}\n" + trim_to_budget(entries, self.max_tokens)
+
+
+def get_web_search():
+    """Build the search subsystem from the environment.
+
+    FINWISE_SEARCH_BACKEND: "auto" (DuckDuckGo, then local corpus), "duckduckgo" or "local".
+    FINWISE_SEARCH_CORPUS_DIR: saved market-news pages (default <state dir>/market_news).
+    FINWISE_SEARCH_TTL_SECONDS, FINWISE_SEARCH_MAX_TOKENS: cache TTL and result budget.
+    """
+    mode = os.environ.get("FINWISE_SEARCH_BACKEND", "auto")
+    corpus_dir = os.environ.get("FINWISE_SEARCH_CORPUS_DIR", os.path.dirname(state_path("market_news", "_")))
+    backends = []
+    if mode in ("auto", "duckduckgo"):
+        try:
+            backends.append(DuckDuckGoBackend())
+        except ImportError:
+            if mode == "duckduckgo":
+                raise
+    if mode in ("auto", "local"):
+        backends.append(LocalCorpusBackend(corpus_dir))
+    cache = SearchCache(ttl_seconds=float(os.environ.get("FINWISE_SEARCH_TTL_SECONDS", DEFAULT_TTL_SECONDS)))
+    return CachedWebSearch(backends, cache, max_tokens=int(os.environ.get("FINWISE_SEARCH_MAX_TOKENS", "400")))
@@ -1,15 +1,18 @@
 import os
+import sys
+import uuid
+import hashlib
 import streamlit as st
-from langchain.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings, HuggingFaceEndpoint
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.retrievers.multi_query import MultiQueryRetriever
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
-from transformers import pipeline # For local LLM fallback
 import requests # For N8N webhook
+# Heavy stacks (transformers, langchain chains, FAISS, Gemini client) are imported
+# inside the functions that need them so a cold start only pays for Streamlit.
+
+# Make the shared finwise_common package (one level up) importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from finwise_common.config import LLM_BACKEND, state_path
+from finwise_common.jobs import JobQueue
+from finwise_common.conversation_store import get_conversation_store
+from ingest_jobs import document_id, ingest_pdf_job
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -28,11 +31,13 @@ with st.sidebar:
     **Key Features:**
     -   **Document Upload:** Upload any text-based PDF.
     -   **RAG Pipeline:** Utilizes a Retrieval-Augmented Generation (RAG) system to find relevant information within your document.
-    -   **Semantic Search:** Employs **HuggingFace Embeddings** for deep semantic understanding.
+    -   **Semantic Search:** Employs **HuggingFace Embeddings** (int8 ONNX Runtime on CPU) for deep semantic understanding.
     -   **Vector Store:** Stores document chunks in a **FAISS** index for efficient retrieval.
-    -   **Intelligent QA:** Powered by **Gemini 2.0 Flash** (with fallback to local LLM) for generating answers.
+    -   **Intelligent QA:** Powered by **Gemini 2.0 Flash** (with fallback to local LLM) for generating answers; follow-up condensing and multi-query variants are one **Gemini 2.0 Flash-Lite** call, made only when needed and overlapped with retrieval.
     -   **Conversation Memory:** Remembers previous turns in the conversation for contextual responses.
-    -   **Multi-Query Retrieval:** Enhances retrieval by generating multiple perspectives on a user's question to capture more nuanced information.
+    -   **Hybrid Retrieval:** Fuses **BM25** keyword search (fund names, tickers, section numbers, figures) with vector search and reranks locally.
+    -   **Figure Lookup:** Key figures and table rows are extracted locally at upload, so questions like "what was net revenue in FY2024?" are answered without an LLM call.
+    -   **Multi-Query Retrieval (optional):** Generates multiple perspectives on a user's question to capture more nuanced information, in the same call that condenses follow-ups.
     """)
     st.markdown("---")
     st.info("Ensure `GOOGLE_API_KEY` and `HUGGINGFACE_API_KEY` are set in your `.streamlit/secrets.toml`.")
@@ -60,8 +65,10 @@ def load_api_keys():
         keys["GOOGLE_API_KEY"] = st.secrets["GOOGLE_API_KEY"]
         os.environ["GOOGLE_API_KEY"] = keys["GOOGLE_API_KEY"]
     except KeyError:
-        st.sidebar.error("❌ Google API Key not found. Gemini LLM will not be available.")
-        st.stop() # Stop if Gemini key is critical for primary LLM
+        if LLM_BACKEND != "local":
+            st.sidebar.error("❌ Google API Key not found. Gemini LLM will not be available.")
+            st.stop() # Stop if Gemini key is critical for primary LLM
+        keys["GOOGLE_API_KEY"] = None # Offline: answers come from the local model
     except Exception as e:
         st.sidebar.error(f"Error loading Google API key: {e}")
         st.stop()
@@ -71,8 +78,22 @@ def load_api_keys():
 API_KEYS = load_api_keys()
 
 # --- Embedding Model Initialization ---
+# Backend for local embeddings: "onnx" (int8 ONNX Runtime, fastest on CPU) or "torch".
+# Set EMBEDDING_BACKEND in the environment or in .streamlit/secrets.toml.
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", st.secrets.get("EMBEDDING_BACKEND", "onnx"))
+
 @st.cache_resource
-def get_embeddings(hf_api_key):
+def get_embeddings(hf_api_key, backend=EMBEDDING_BACKEND):
+    from langchain_huggingface import HuggingFaceEmbeddings, HuggingFaceEndpoint
+    if backend == "onnx":
+        try:
+            # Option 0: Same MiniLM model as an int8-quantized ONNX Runtime graph
+            from onnx_embeddings import OnnxMiniLMEmbeddings
+            embeddings = OnnxMiniLMEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+            st.sidebar.success("✅ Using local int8 ONNX embeddings (sentence-transformers/all-MiniLM-L6-v2).")
+            return embeddings
+        except Exception as e:
+            st.sidebar.warning(f"ONNX embedding backend unavailable ({e}); falling back to PyTorch.")
     try:
         # Option 1: Local Inference (Default - No Limits)
         embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
@@ -100,141 +121,287 @@ def get_embeddings(hf_api_key):
             st.sidebar.error("❌ Hugging Face API key is missing, and local embeddings failed. Cannot proceed without an embedding model.")
             st.stop()
 
-embeddings = get_embeddings(API_KEYS["HUGGINGFACE_API_KEY"])
-
+# The embedding model and the LLM are loaded on first use (first upload), not at startup.
 
 # --- LLM Initialization ---
+# One model per route: question rewriting (condensing + multi-query variants) on the fast model, answers on the strong one
+RAG_TEMPERATURES = {"rewrite": 0, "answer": 0.2}
+
 @st.cache_resource
-def get_llm(google_api_key, hf_api_key):
+def get_llms(google_api_key, hf_api_key):
+    from finwise_common.model_router import chat_model, route_policy
     try:
-        # Try Gemini with API key
-        llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", google_api_key=google_api_key, temperature=0.2)
-        st.sidebar.success("✅ Initialized Gemini 2.0 Flash with API key.")
-        return llm
+        # Gemini with API key (or the offline model with FINWISE_LLM_BACKEND=local); question rewriting
+        # is deterministic and goes through the shared completion cache, answers are sampled
+        policy = route_policy("rag")
+        llms = {route: chat_model("rag", route, temperature=RAG_TEMPERATURES[route], google_api_key=google_api_key)
+                for route in policy}
+        backend = "local model" if LLM_BACKEND == "local" else "Gemini with API key"
+        st.sidebar.success(f"✅ Initialized {backend} ({policy['answer']} for answers, "
+                           f"{policy['rewrite']} for question rewriting).")
+        return llms
     except Exception as e:
         st.sidebar.warning(f"Gemini authentication or initialization failed: {e}")
-        st.sidebar.info("Attempting fallback to local Hugging Face LLM (flan-t5-small)...")
+        from finwise_common.local_llm import DEFAULT_MODEL, get_local_engine # Only imported when Gemini is unavailable
+        st.sidebar.info(f"Attempting fallback to the offline local LLM ({DEFAULT_MODEL})...")
 
-        # Fallback to local Hugging Face LLM
+        # Fallback to the local CPU model: same chat interface, so both routes share one batched engine
         try:
-            # Note: For conversational chains, pipeline output needs to be wrapped or adapted.
-            # This fallback is a simplified illustration. For robust local LLM RAG,
-            # you might use a specific LangChain HuggingFacePipeline wrapper.
-            local_llm_pipeline = pipeline("text-generation", model="google/flan-t5-small")
-            # This is a very basic wrapper to make it act like a LangChain LLM
-            class LocalLLMWrapper:
-                def __init__(self, pipeline_model):
-                    self.pipeline_model = pipeline_model
-                def invoke(self, prompt, config=None): # Using invoke to match LangChain interface
-                    # For RAG, prompt might be complex, simplify for basic pipeline
-                    if isinstance(prompt, list):
-                        prompt_text = " ".join([m.content for m in prompt if hasattr(m, 'content')])
-                    else:
-                        prompt_text = str(prompt)
-                    # Use a simple prompt structure for the fallback model
-                    response = self.pipeline_model(prompt_text, max_new_tokens=100, num_return_sequences=1)
-                    return response[0]['generated_text'] if response else ""
-                
-                # Add other methods expected by LangChain components if needed, e.g., _call
-                def _call(self, prompt: str, stop=None, run_manager=None) -> str:
-                     return self.invoke(prompt)
-
-            llm = LocalLLMWrapper(local_llm_pipeline)
-            st.sidebar.success("✅ Initialized local Hugging Face LLM (flan-t5-small) as fallback.")
-            return llm
+            get_local_engine() # Load the weights now so a failure shows up here, not on the first question
+            llms = {route: chat_model("rag", route, temperature=RAG_TEMPERATURES[route], backend="local")
+                    for route in route_policy("rag", "local")}
+            st.sidebar.success(f"✅ Initialized local LLM ({DEFAULT_MODEL}) as fallback.")
+            return llms
         except Exception as local_e:
             st.sidebar.error(f"❌ Error initializing local LLM: {local_e}")
             st.sidebar.error("LLM initialization failed. Check dependencies and internet connection.")
             st.stop()
 
-llm = get_llm(API_KEYS["GOOGLE_API_KEY"], API_KEYS["HUGGINGFACE_API_KEY"])
-
-
-# --- PDF Processing and RAG Setup ---
-@st.cache_resource(hash_funcs={ChatGoogleGenerativeAI: lambda _: None, HuggingFaceEmbeddings: lambda _: None})
-def process_pdf_and_setup_rag(uploaded_file_buffer, current_llm, current_embeddings):
-    # Temporary save uploaded file
-    file_path = "uploaded.pdf"
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file_buffer.getbuffer())
-
-    # Load documents
-    loader = PyPDFLoader(file_path)
-    documents = loader.load()
-    if not documents:
-        raise ValueError("No content extracted from PDF. Ensure it's a valid, text-based PDF.")
-
-    # Split documents
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len,
-    )
-    splits = text_splitter.split_documents(documents)
-    if not splits:
-        raise ValueError("No document chunks created. Document might be too short or content extraction failed.")
-
-    # Create FAISS vector store
-    vectorstore = FAISS.from_documents(splits, current_embeddings)
-
-    # Create basic retriever
-    retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 4})
-
-    # Enhance with MultiQueryRetriever
-    multi_retriever = MultiQueryRetriever.from_llm(
-        retriever=retriever,
-        llm=current_llm,
-        include_original=True # Ensures the original query is also used for retrieval
-    )
-
-    # Set up conversation memory
-    memory = ConversationBufferMemory(
-        memory_key="chat_history",
-        return_messages=True,
-        output_key="answer"
-    )
-
-    # Create the conversational retrieval chain
-    qa_chain = ConversationalRetrievalChain.from_llm(
-        llm=current_llm,
-        retriever=multi_retriever,
-        memory=memory,
-        return_source_documents=True,
-        verbose=False
-    )
-    return qa_chain
+
+
+# --- Background Ingestion Jobs ---
+# Large PDFs are embedded on a worker thread; progress is checkpointed per batch
+@st.cache_resource
+def get_job_queue():
+    queue = JobQueue(state_path("jobs.db"), max_workers=2)
+    queue.register("ingest_pdf", lambda ctx: ingest_pdf_job(ctx, get_embeddings(API_KEYS["HUGGINGFACE_API_KEY"])))
+    return queue
+
+job_queue = get_job_queue()
+
+# Near-duplicate chunks are embedded once (RAG_DEDUP_THRESHOLD, estimated Jaccard; 0 disables)
+DEDUP_THRESHOLD = float(os.environ.get("RAG_DEDUP_THRESHOLD", st.secrets.get("RAG_DEDUP_THRESHOLD", "0.85")))
+
+def submit_ingest_job(file_bytes, embeddings):
+    # Content hash + embedding backend + dedup threshold is the job ID, so re-uploads and refreshes
+    # reuse the same job, and an index is never queried with a different embedder
+    doc_hash = hashlib.sha256(file_bytes).hexdigest()[:32]
+    file_path = state_path("uploads", f"{doc_hash}.pdf")
+    if not os.path.exists(file_path):
+        with open(file_path, "wb") as f:
+            f.write(file_bytes)
+    backend_id = type(embeddings).__name__
+    return job_queue.submit("ingest_pdf", {"file_path": file_path, "dedup_threshold": DEDUP_THRESHOLD},
+                            job_id=f"ingest-{backend_id}-{doc_hash}-dd{DEDUP_THRESHOLD:g}")
+
+
+# --- Extracted Figures ---
+# Written by the ingestion job, one set of facts per document content hash
+@st.cache_resource
+def get_fact_store():
+    from finwise_common.facts import FactStore
+    return FactStore(state_path("facts.db"))
+
+
+# --- Query Caches ---
+# Shared by every session in this process: repeated questions skip encoding and search
+@st.cache_resource
+def get_query_caches():
+    from retrieval_cache import LRUCache
+    return {"embeddings": LRUCache(max_entries=4096), "retrieval": LRUCache(max_entries=2048)}
+
+query_caches = get_query_caches()
+
+
+# Worker threads for speculative and multi-query retrieval, shared by all sessions
+@st.cache_resource
+def get_retrieval_executor():
+    from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="rag-retrieval")
+
+
+@st.cache_resource
+def get_reranker():
+    try:
+        from hybrid_retrieval import CrossEncoderReranker
+        return CrossEncoderReranker()
+    except Exception as e:
+        st.sidebar.warning(f"Local reranker unavailable ({e}); using fused BM25 + vector ranking.")
+        return None
+
+
+# --- Shared Index Registry ---
+# Heavy read-only parts (vectors, chunk texts, BM25) are loaded once per document and shared
+# by every session; idle indexes are evicted LRU beyond the memory budget (RAG_INDEX_MEMORY_MB).
+@st.cache_resource
+def get_index_registry():
+    from index_registry import IndexRegistry
+    max_mb = float(os.environ.get("RAG_INDEX_MEMORY_MB", "1024"))
+    return IndexRegistry(max_bytes=int(max_mb * 1024 * 1024), lease_ttl_seconds=1800)
+
+index_registry = get_index_registry()
+
+def load_shared_index(index_version, index_path, current_embeddings):
+    from langchain.vectorstores import FAISS
+    from retrieval_cache import CachedEmbeddings
+    from index_registry import SharedIndex
+    from compact_docstore import DOCSTORE_DIR, CompactDocstore
+    from finwise_common.bm25 import BM25Index
+
+    # Load the FAISS index built by the ingestion job; query vectors go through the cache
+    cached_embeddings = CachedEmbeddings(current_embeddings, query_caches["embeddings"])
+    if os.path.exists(os.path.join(index_path, DOCSTORE_DIR)):
+        import faiss
+        # Chunk texts and metadata stay memory-mapped; Documents are built only for retrieved chunks
+        documents = CompactDocstore(os.path.join(index_path, DOCSTORE_DIR))
+        vectorstore = FAISS(embedding_function=cached_embeddings,
+                            index=faiss.read_index(os.path.join(index_path, "index.faiss")),
+                            docstore=documents, index_to_docstore_id=documents.ids)
+        texts = documents.texts
+    else:
+        # Indexes built before the compact docstore: pickled Documents
+        vectorstore = FAISS.load_local(index_path, cached_embeddings, allow_dangerous_deserialization=True)
+        documents = [
+            vectorstore.docstore.search(vectorstore.index_to_docstore_id[i])
+            for i in range(vectorstore.index.ntotal)
+        ]
+        texts = [doc.page_content for doc in documents]
+    bm25 = BM25Index(texts)
+    return SharedIndex(index_version, vectorstore, bm25, documents)
+
+
+# --- RAG Setup ---
+def process_pdf_and_setup_rag(shared_index, llms, use_reranker=True, use_multi_query=False):
+    """Build (or reuse) the stateless QA chain over a shared index.
+
+    The chain has no memory: each call passes the session's own chat history,
+    so sessions querying the same document never see each other's turns.
+    """
+    def build():
+        from conversational_rag import ConversationalRAG
+        from retrieval_cache import CachedRetriever
+        from hybrid_retrieval import HybridRetriever
+
+        # Hybrid first pass: BM25 over exact terms fused with MiniLM similarity, then local reranking
+        hybrid_retriever = HybridRetriever(
+            vectorstore=shared_index.vectorstore,
+            bm25=shared_index.bm25,
+            documents=shared_index.documents,
+            k=4,
+            fetch_k=20,
+            reranker=get_reranker() if use_reranker else None,
+            rerank_budget_ms=150,
+        )
+
+        # Top-k results are cached per index version (the ingestion job ID + retrieval settings)
+        retriever = CachedRetriever(
+            retriever=hybrid_retriever,
+            cache=query_caches["retrieval"],
+            index_version=f"{shared_index.version}-hybrid-rr{int(use_reranker)}",
+        )
+
+        # Follow-ups are condensed only when they refer back to the conversation; condensing and the optional
+        # multi-query variants are one call, and retrieval for the question as asked runs meanwhile
+        return ConversationalRAG(
+            retriever=retriever,
+            answer_llm=llms["answer"],
+            rewrite_llm=llms["rewrite"],
+            multi_query=use_multi_query,
+            executor=get_retrieval_executor(),
+        )
+
+    return shared_index.chain((use_reranker, use_multi_query), build)
+
+# --- Conversation Store ---
+# Chat history survives refreshes and restarts and can be served by any replica
+@st.cache_resource
+def load_store():
+    return get_conversation_store()
+
+store = load_store()
+HISTORY_PAGE_SIZE = 20 # Question/answer pairs shown per page
+MEMORY_WINDOW = 10 # Turns of this session's history passed to the chain
+
+# The session ID lives in the URL, so a refresh resumes the same conversation
+if "sid" not in st.query_params:
+    st.query_params["sid"] = uuid.uuid4().hex
+session_id = st.query_params["sid"]
 
 # --- Main App Logic ---
 st.title("🚀 AI-Powered PDF Insight Agent")
 st.markdown("Ask questions about your uploaded PDF and get intelligent, contextual answers!")
 
 uploaded_file = st.sidebar.file_uploader("Upload your PDF file (e.g., financial prospectus or compliance report)", type="pdf")
+use_reranker = st.sidebar.checkbox("Rerank with local cross-encoder", value=True,
+                                   help="Reorders the fused BM25 + vector candidates within a 150 ms budget.")
+use_multi_query = st.sidebar.checkbox("Multi-query expansion", value=False,
+                                      help="Hybrid retrieval already matches exact terms; enable for vague questions. "
+                                           "Variants come from the same fast-model call that condenses follow-ups.")
+use_fact_lookup = st.sidebar.checkbox("Answer figure lookups from extracted tables", value=True,
+                                      help="Questions like 'what was net revenue in FY2024?' are answered from the figures "
+                                           "extracted at upload, without an LLM call, when one figure clearly matches.")
 
 qa_chain = None
 if uploaded_file is not None:
-    st.sidebar.success("PDF uploaded successfully! Processing document...")
-    try:
-        qa_chain = process_pdf_and_setup_rag(uploaded_file, llm, embeddings)
-        st.sidebar.success("✅ RAG pipeline and memory initialized!")
-        st.session_state["qa_chain"] = qa_chain # Store in session state
-    except Exception as e:
-        st.error(f"Error setting up RAG pipeline: {e}")
+    embeddings = get_embeddings(API_KEYS["HUGGINGFACE_API_KEY"])
+    job_id = submit_ingest_job(uploaded_file.getvalue(), embeddings)
+    job = job_queue.get(job_id)
+    if job["status"] == "done":
+        try:
+            llms = get_llms(API_KEYS["GOOGLE_API_KEY"], API_KEYS["HUGGINGFACE_API_KEY"])
+            # Lease the shared index for this session; release the previous document's lease
+            shared_index = index_registry.acquire(
+                job_id, session_id,
+                lambda: load_shared_index(job_id, job["result"]["index_path"], embeddings),
+            )
+            previous_version = st.session_state.get("index_version")
+            if previous_version and previous_version != job_id:
+                index_registry.release(previous_version, session_id)
+            qa_chain = process_pdf_and_setup_rag(shared_index, llms, use_reranker, use_multi_query)
+            st.sidebar.success(f"✅ RAG pipeline and memory initialized! ({job['result']['num_chunks']} chunks indexed)")
+            dedup = job["result"].get("dedup")
+            if dedup and dedup["duplicates"]:
+                st.sidebar.caption(f"🧬 {dedup['duplicates']} of {dedup['chunks']} chunks were near-duplicates: "
+                                   f"{dedup['duplicates']} embeddings saved; citations list every page.")
+            facts_report = job["result"].get("facts")
+            if facts_report and facts_report["figures"]:
+                st.sidebar.caption(f"📊 {facts_report['figures']} key figures extracted "
+                                   f"({facts_report['table_rows']} from tables) for LLM-free lookups.")
+            st.session_state["index_version"] = job_id # One conversation per session and document
+        except Exception as e:
+            st.error(f"Error setting up RAG pipeline: {e}")
+            qa_chain = None # Reset qa_chain if setup fails
+    elif job["status"] == "failed":
+        st.error(f"Error setting up RAG pipeline: {job['error']}")
         st.warning("Please check your PDF file and ensure it is text-based and contains extractable content.")
-        qa_chain = None # Reset qa_chain if setup fails
+        if st.sidebar.button("🔁 Retry ingestion"):
+            job_queue.submit("ingest_pdf", job["payload"], job_id=job_id)
+            st.rerun()
+    else:
+        st.sidebar.success("PDF uploaded successfully! Processing document in the background...")
+        st.sidebar.progress(min(job["completed"] / max(job["total"], 1), 1.0), text=job["message"] or "Waiting for a worker...")
+        st.sidebar.button("🔄 Refresh status")
+        st.info("⏳ Your document is being indexed. You can refresh the page; ingestion continues in the background.")
 
 # --- Chat Interface ---
-if "qa_chain" in st.session_state and st.session_state["qa_chain"] is not None:
-    # Initialize chat history in session state
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
-
-    # Display chat history
-    for entry in st.session_state.chat_history:
-        st.chat_message("user").markdown(entry["question"])
-        st.chat_message("assistant").markdown(entry["answer"])
-        if entry["sources"]:
-            with st.expander(f"Sources for: '{entry['question'][:50]}...'"):
-                for s in entry["sources"]:
+if qa_chain is not None:
+    with st.sidebar.expander("⚡ Query cache statistics"):
+        for name, cache in query_caches.items():
+            stats = cache.stats()
+            st.write(f"**{name.title()}:** {stats['hits']} hits / {stats['misses']} misses "
+                     f"({stats['hit_rate']:.0%}), {stats['entries']} entries, {stats['evictions']} evicted")
+        from finwise_common.llm_cache import stats_caption
+        from finwise_common.model_router import route_caption
+        st.write(stats_caption("rag"))
+        st.write(route_caption("rag"))
+        registry_stats = index_registry.stats()
+        st.write(f"**Shared indexes:** {registry_stats['indexes']} resident for {registry_stats['sessions']} sessions, "
+                 f"{registry_stats['resident_mb']:.1f} / {registry_stats['budget_mb']:.0f} MB")
+
+    conversation_id = f"{session_id}:{st.session_state['index_version']}"
+
+    # Display chat history: a page of recent turns read from the conversation store
+    pages = st.session_state.setdefault("history_pages", 1)
+    turns = store.recent(conversation_id, limit=pages * HISTORY_PAGE_SIZE * 2)
+    if store.count(conversation_id) > len(turns):
+        if st.button("⬆️ Load earlier questions"):
+            st.session_state.history_pages += 1
+            st.rerun()
+    for turn in turns:
+        st.chat_message(turn["role"]).markdown(turn["content"])
+        if turn["metadata"].get("sources"):
+            with st.expander(f"Sources for: '{turn['metadata']['question'][:50]}...'"):
+                for s in turn["metadata"]["sources"]:
                     st.write(s)
 
     # Input for new question
@@ -269,34 +436,55 @@ if "qa_chain" in st.session_state and st.session_state["qa_chain"] is not None:
         with st.spinner("Searching and generating answer..."):
             try:
                 # Invoke the QA chain
-                result = st.session_state["qa_chain"].invoke({"question": question})
-                response_text = result["answer"]
-                
-                # Extract source documents and format them
-                sources = []
-                if "source_documents" in result and result["source_documents"]:
+                from finwise_common.chat_history import StoreChatMessageHistory
+                from finwise_common.dedup import format_pages
+                from finwise_common.facts import answer_figure
+
+                # Figure lookups with one clear match are answered from the extracted facts, no LLM call
+                direct = None
+                if use_fact_lookup:
+                    facts = get_fact_store().facts(document_id(job["payload"]["file_path"]))
+                    direct = answer_figure(question, facts) if facts else None
+                if direct:
+                    response_text = direct["answer"]
                     sources = [
                         {
-                            "page": doc.metadata.get("page", "N/A"),
-                            "source": doc.metadata.get("source", "N/A"),
-                            "content_preview": doc.page_content[:150] + "..."
+                            "page": fact["page"] if fact["page"] is not None else "N/A",
+                            "source": f"extracted {'table' if fact['kind'] == 'table' else 'text'}",
+                            "content_preview": fact["context"][:150]
                         }
-                        for doc in result["source_documents"]
+                        for fact in direct["facts"]
                     ]
+                else:
+                    chat_history = StoreChatMessageHistory(store, conversation_id, window=MEMORY_WINDOW).messages
+                    result = qa_chain.invoke({"question": question, "chat_history": chat_history})
+                    response_text = result["answer"]
+
+                    # Extract source documents and format them
+                    sources = []
+                    if "source_documents" in result and result["source_documents"]:
+                        sources = [
+                            {
+                                "page": format_pages(doc.metadata), # Every page a deduplicated chunk appears on
+                                "source": doc.metadata.get("source", "N/A"),
+                                "content_preview": doc.page_content[:150] + "..."
+                            }
+                            for doc in result["source_documents"]
+                        ]
 
                 # Store history with question, answer, and processed sources
-                st.session_state.chat_history.append({
-                    "question": question,
-                    "answer": response_text,
-                    "sources": sources
-                })
+                store.append(conversation_id, "user", question)
+                store.append(conversation_id, "assistant", response_text,
+                             {"question": question, "sources": sources})
                 
                 # Display the assistant's response
                 st.chat_message("assistant").markdown(response_text)
+                if direct:
+                    st.caption("📊 Answered from the figures extracted at upload, without an LLM call.")
                 if sources:
                     with st.expander("Show Sources"):
                         for i, s in enumerate(sources):
-                            st.markdown(f"**Source {i+1}:** Page {s['page']} (File: {s['source']})")
+                            st.markdown(f"**Source {i+1}:** Page{'s' if ',' in str(s['page']) else ''} {s['page']} (File: {s['source']})")
                             st.code(s['content_preview'], language="text")
 
             except Exception as e:
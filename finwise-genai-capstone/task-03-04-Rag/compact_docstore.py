@@ -0,0 +1,181 @@
+"""Compact, memory-mapped chunk store for the RAG indexes.
+
+LangChain's FAISS store pickles every chunk as a ``Document`` (a str plus a
+metadata dict), and loading an index rebuilds all of those objects; at a
+million chunks the Python object overhead is larger than the vectors.
+Here chunk texts live in one UTF-8 arena file with an int64 offset array,
+and metadata is stored column by column: integer keys (page, duplicates) as
+int64 arrays, lists of integers (the pages of a deduplicated chunk) as
+offsets + values, and everything else (source path, PDF producer, ...)
+dictionary-encoded, since it repeats across a document's chunks.
+
+Every file is memory-mapped, so opening a store costs a few page faults and
+a ``Document`` is materialized only for the chunks a query returns.
+``CompactDocstore`` answers ``search(id)`` like a LangChain docstore, so it
+can stand in for the FAISS store's in-memory one.
+"""
+import json
+import mmap
+import os
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+DOCSTORE_DIR = "docstore"
+_MISSING = np.iinfo(np.int64).min
+
+
+def _column_type(values):
+    present = [v for v in values if v is not _MISSING]
+    if present and all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        return "int"
+    if present and all(isinstance(v, list) and all(isinstance(x, int) and not isinstance(x, bool) for x in v)
+                       for v in present):
+        return "int_list"
+    return "category"
+
+
+def write_docstore(path, texts, metadatas):
+    """Write chunk ``texts`` and their ``metadatas`` as a compact store in directory ``path``."""
+    os.makedirs(path, exist_ok=True)
+    offsets = [0]
+    with open(os.path.join(path, "text.bin"), "wb") as arena:
+        for text in texts:
+            offsets.append(offsets[-1] + arena.write(text.encode("utf-8")))
+    np.save(os.path.join(path, "text_offsets.npy"), np.asarray(offsets, dtype=np.int64))
+
+    keys = list(dict.fromkeys(key for metadata in metadatas for key in metadata))
+    columns = {}
+    for c, key in enumerate(keys):
+        values = [metadata.get(key, _MISSING) for metadata in metadatas]
+        kind = _column_type(values)
+        spec = {"type": kind, "file": f"col_{c}.npy"}
+        if kind == "int":
+            np.save(os.path.join(path, spec["file"]), np.asarray(values, dtype=np.int64))
+        elif kind == "int_list":
+            lengths = [0 if v is _MISSING else len(v) for v in values]
+            spec["offsets"] = f"col_{c}_offsets.npy"
+            np.save(os.path.join(path, spec["offsets"]), np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64))
+            if any(v is _MISSING for v in values):
+                spec["present"] = f"col_{c}_present.npy"
+                np.save(os.path.join(path, spec["present"]), np.asarray([v is not _MISSING for v in values]))
+            np.save(os.path.join(path, spec["file"]),
+                    np.asarray([x for v in values if v is not _MISSING for x in v], dtype=np.int64))
+        else:
+            encoded = [None if v is _MISSING else json.dumps(v, sort_keys=True, default=str) for v in values]
+            dictionary = list(dict.fromkeys(e for e in encoded if e is not None))
+            codes = {e: i for i, e in enumerate(dictionary)}
+            spec["values"] = dictionary
+            np.save(os.path.join(path, spec["file"]),
+                    np.asarray([-1 if e is None else codes[e] for e in encoded], dtype=np.int32))
+        columns[key] = spec
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"count": len(offsets) - 1, "columns": columns}, f)
+
+
+class _TextView(Sequence):
+    """Chunk texts decoded on access; what BM25 indexing iterates over."""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __len__(self):
+        return len(self._store)
+
+    def __getitem__(self, i):
+        return self._store.text(i)
+
+
+class _PositionIds(Mapping):
+    """FAISS position -> docstore ID ("0", "1", ...) without a million-entry dict."""
+
+    def __init__(self, count):
+        self._count = count
+
+    def __getitem__(self, position):
+        if not 0 <= position < self._count:
+            raise KeyError(position)
+        return str(position)
+
+    def __iter__(self):
+        return iter(range(self._count))
+
+    def __len__(self):
+        return self._count
+
+
+class CompactDocstore(Sequence):
+    """Read-only, memory-mapped chunk store; ``store[i]`` is the Document at FAISS position i."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self._count = meta["count"]
+        self._offsets = np.load(os.path.join(path, "text_offsets.npy"), mmap_mode="r")
+        arena_path = os.path.join(path, "text.bin")
+        if os.path.getsize(arena_path):
+            with open(arena_path, "rb") as f:
+                self._arena = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._arena = b""
+        self._columns = []
+        for key, spec in meta["columns"].items():
+            data = np.load(os.path.join(path, spec["file"]), mmap_mode="r")
+            offsets = np.load(os.path.join(path, spec["offsets"]), mmap_mode="r") if "offsets" in spec else None
+            present = np.load(os.path.join(path, spec["present"]), mmap_mode="r") if "present" in spec else None
+            values = [json.loads(v) for v in spec.get("values", [])]
+            self._columns.append((key, spec["type"], data, offsets, present, values))
+        self.ids = _PositionIds(self._count)
+        self.texts = _TextView(self)
+
+    def __len__(self):
+        return self._count
+
+    def _position(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        return i
+
+    def text(self, i):
+        i = self._position(i)
+        return self._arena[int(self._offsets[i]):int(self._offsets[i + 1])].decode("utf-8")
+
+    def metadata(self, i):
+        i = self._position(i)
+        metadata = {}
+        for key, kind, data, offsets, present, values in self._columns:
+            if kind == "int":
+                if data[i] != _MISSING:
+                    metadata[key] = int(data[i])
+            elif kind == "int_list":
+                if present is None or present[i]:
+                    metadata[key] = [int(x) for x in data[int(offsets[i]):int(offsets[i + 1])]]
+            elif data[i] >= 0:
+                metadata[key] = values[data[i]]
+        return metadata
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        return Document(page_content=self.text(i), metadata=self.metadata(i))
+
+    def search(self, search):
+        """LangChain docstore lookup by ID (the FAISS position as a string)."""
+        try:
+            return self[int(search)]
+        except (ValueError, IndexError):
+            return f"ID {search} not found."
+
+    @property
+    def resident_nbytes(self):
+        # The arena and the arrays are memory-mapped (reclaimable page cache); only the dictionaries are heap
+        return sum(len(json.dumps(column[-1])) for column in self._columns)
+
+    @property
+    def mapped_nbytes(self):
+        arrays = [self._offsets] + [a for column in self._columns for a in column[2:5] if a is not None]
+        return len(self._arena) + sum(a.nbytes for a in arrays)
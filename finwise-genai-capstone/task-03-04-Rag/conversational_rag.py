@@ -0,0 +1,170 @@
+"""Conversational RAG with at most one rewrite call, overlapped with retrieval.
+
+LangChain's ConversationalRetrievalChain condenses every follow-up into a
+standalone question, MultiQueryRetriever then asks for query variants, and
+only then does the answer call run: three serial model round trips. Here:
+
+- a local heuristic decides whether a question needs condensing at all
+  (never on the first turn; not when it has no pronouns or ellipsis that
+  point back into the conversation);
+- condensing and variant generation are one structured (JSON) call;
+- retrieval for the raw question starts on a worker thread before that call,
+  so when the rewrite keeps the question, or only adds variants, its
+  results are already there.
+
+``ConversationalRAG.invoke`` takes and returns the same keys as the chain.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.output_parsers import JsonOutputParser
+
+from hybrid_retrieval import reciprocal_rank_fusion
+from retrieval_cache import normalize_query
+
+# Words and phrases that only make sense with the previous turns
+_REFERENCE_RE = re.compile(
+    r"\b(it|its|it's|they|them|their|theirs|this(?!\s+(year|quarter|half|month|period|report|document))|"
+    r"that|these|those|he|she|him|his|her|former|latter|"
+    r"the same|same period|above|previous|previously|earlier|aforementioned|said|mentioned above|"
+    r"the other|the rest|else|further|more on|more about|elaborate|explain that|why so)\b", re.I)
+# Follow-ups that continue the previous question ("and for FY2023?", "what about debt?")
+_CONTINUATION_RE = re.compile(r"^\s*(and|also|but|or|so|then|what about|how about|same for|why|why not|"
+                              r"compared to|versus|vs\.?)\b", re.I)
+_WORD_RE = re.compile(r"[A-Za-z0-9₹$%.]+")
+MIN_SELF_CONTAINED_WORDS = 4
+
+QA_PROMPT = """Use the following pieces of context to answer the question at the end. If you don't know the answer, just say that you don't know, don't try to make up an answer.
+
+{context}
+
+Question: {question}
+Helpful Answer:"""
+
+REWRITE_PROMPT = """You prepare search queries for questions about a financial document.
+
+Conversation so far:
+{history}
+
+Latest question: {question}
+
+{task}
+Reply with JSON only, in this form: {schema}"""
+
+_CONDENSE_TASK = "Rewrite the latest question as a standalone question that can be understood without the conversation."
+_VARIANTS_TASK = ("Write {n} alternative phrasings of the question that could find other relevant passages "
+                  "(different terms for the same figures, sections or concepts).")
+
+
+def is_self_contained(question):
+    """True when a question can be searched as is, without the conversation."""
+    if len(_WORD_RE.findall(question)) < MIN_SELF_CONTAINED_WORDS:
+        return False
+    return not (_REFERENCE_RE.search(question) or _CONTINUATION_RE.match(question))
+
+
+def _history_text(chat_history, max_turns=6):
+    lines = []
+    for message in list(chat_history)[-max_turns * 2:]:
+        if isinstance(message, (tuple, list)):
+            lines += [f"User: {message[0]}", f"Assistant: {message[1]}"]
+        else:
+            role = "User" if getattr(message, "type", "") == "human" else "Assistant"
+            lines.append(f"{role}: {message.content}")
+    return "\n".join(lines) or "(none)"
+
+
+def _text(output):
+    # Chat models return a message; plain LLMs return a string
+    return getattr(output, "content", output)
+
+
+class ConversationalRAG:
+    """Stand-in for ConversationalRetrievalChain over any retriever.
+
+    ``rewrite_llm`` (the fast model) condenses follow-ups and, with
+    ``multi_query``, writes ``num_variants`` query variants in the same call;
+    ``answer_llm`` writes the answer from the fused results.
+    """
+
+    def __init__(self, retriever, answer_llm, rewrite_llm, multi_query=False, num_variants=3, max_documents=8,
+                 executor=None):
+        self.retriever = retriever
+        self.answer_llm = answer_llm
+        self.rewrite_llm = rewrite_llm
+        self.multi_query = multi_query
+        self.num_variants = num_variants
+        self.max_documents = max_documents
+        self.executor = executor or ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-retrieval")
+
+    def rewrite(self, question, chat_history, condense):
+        """One call for the standalone question and/or the variants; falls back to the raw question."""
+        tasks, schema = [], {}
+        if condense:
+            tasks.append(_CONDENSE_TASK)
+            schema["standalone"] = "..."
+        if self.multi_query:
+            tasks.append(_VARIANTS_TASK.format(n=self.num_variants))
+            schema["variants"] = ["..."] * self.num_variants
+        prompt = REWRITE_PROMPT.format(history=_history_text(chat_history) if condense else "(not needed)",
+                                       question=question, task="\n".join(tasks),
+                                       schema=str(schema).replace("'", '"'))
+        try:
+            parsed = JsonOutputParser().parse(_text(self.rewrite_llm.invoke(prompt)))
+        except Exception:
+            parsed = {}  # Unparseable or failed rewrite: search with the question as asked
+        if not isinstance(parsed, dict):
+            parsed = {}
+        standalone = parsed.get("standalone") if condense else None
+        variants = parsed.get("variants") if self.multi_query else None
+        return {
+            "standalone": standalone.strip() if isinstance(standalone, str) and standalone.strip() else question,
+            "variants": [v.strip() for v in variants if isinstance(v, str) and v.strip()][:self.num_variants]
+            if isinstance(variants, list) else [],
+        }
+
+    def _fuse(self, ranked_lists):
+        if len(ranked_lists) == 1:
+            return ranked_lists[0]
+        by_key = {}
+        keys = []
+        for docs in ranked_lists:
+            ranked = []
+            for doc in docs:
+                key = (doc.metadata.get("source"), doc.metadata.get("page"), doc.page_content)
+                by_key.setdefault(key, doc)
+                ranked.append(key)
+            keys.append(ranked)
+        return [by_key[key] for key in reciprocal_rank_fusion(keys)[:self.max_documents]]
+
+    def invoke(self, inputs, config=None):
+        question = inputs["question"]
+        chat_history = inputs.get("chat_history") or []
+        condense = bool(chat_history) and not is_self_contained(question)
+
+        # Speculative retrieval for the question as asked, while the rewrite call runs
+        raw = self.executor.submit(self.retriever.invoke, question)
+        rewrite_calls = 0
+        standalone, variants = question, []
+        if condense or self.multi_query:
+            rewritten = self.rewrite(question, chat_history, condense)
+            standalone, variants = rewritten["standalone"], rewritten["variants"]
+            rewrite_calls = 1
+
+        # The raw results count unless condensing changed the question
+        raw_usable = normalize_query(standalone) == normalize_query(question) or not condense
+        queries = []
+        seen = {normalize_query(question)} if raw_usable else set()
+        for query in [standalone] + variants:
+            if normalize_query(query) not in seen:
+                seen.add(normalize_query(query))
+                queries.append(query)
+        futures = [self.executor.submit(self.retriever.invoke, query) for query in queries]
+        ranked_lists = ([raw.result()] if raw_usable else []) + [future.result() for future in futures]
+        documents = self._fuse(ranked_lists)
+
+        context = "\n\n".join(doc.page_content for doc in documents)
+        answer = _text(self.answer_llm.invoke(QA_PROMPT.format(context=context, question=standalone), config=config))
+        return {"question": question, "chat_history": chat_history, "answer": answer,
+                "source_documents": documents, "generated_question": standalone,
+                "rewrite_calls": rewrite_calls, "condensed": condense}
@@ -0,0 +1,87 @@
+"""Hybrid BM25 + FAISS retrieval with an optional local cross-encoder reranker.
+
+Exact terms (fund names, tickers, section numbers, figures) are found by
+BM25; paraphrases are found by MiniLM vectors. The two ranked lists are
+merged with reciprocal rank fusion, and the fused candidates can be
+reranked by a small cross-encoder within a fixed latency budget.
+"""
+import time
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from finwise_common.bm25 import BM25Index
+
+DEFAULT_RERANKER = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+def reciprocal_rank_fusion(ranked_lists, k=60):
+    """Fuse ranked lists of IDs; returns IDs ordered by summed 1 / (k + rank)."""
+    scores = {}
+    for ranked in ranked_lists:
+        for rank, doc_id in enumerate(ranked):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class CrossEncoderReranker:
+    """Scores (query, passage) pairs with a local cross-encoder under a time budget."""
+
+    def __init__(self, model_name=DEFAULT_RERANKER, batch_size=8):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name, max_length=512)
+        self.batch_size = batch_size
+
+    def rerank(self, query, docs, budget_ms=150.0):
+        """Rerank docs best-first.
+
+        Candidates are scored in batches, in their incoming order, until the
+        next batch would overrun the budget; unscored candidates keep their
+        original order after the scored ones.
+        """
+        start = time.perf_counter()
+        scored = []
+        last_batch_ms = 0.0
+        for i in range(0, len(docs), self.batch_size):
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if scored and elapsed_ms + last_batch_ms > budget_ms:
+                break
+            batch = docs[i:i + self.batch_size]
+            batch_start = time.perf_counter()
+            scores = self.model.predict([(query, doc.page_content) for doc in batch])
+            last_batch_ms = (time.perf_counter() - batch_start) * 1000
+            scored.extend(zip(scores, batch))
+        order = sorted(range(len(scored)), key=lambda j: -float(scored[j][0]))
+        return [scored[j][1] for j in order] + docs[len(scored):]
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuses FAISS similarity and BM25 results over the same chunk positions."""
+
+    vectorstore: Any
+    bm25: BM25Index
+    documents: Any  # List of Documents, or a CompactDocstore (Any, so pydantic does not copy it into a list)
+    k: int = 4
+    fetch_k: int = 20
+    reranker: Optional[Any] = None
+    rerank_budget_ms: float = 150.0
+
+    def _vector_positions(self, query):
+        vector = np.asarray([self.vectorstore.embeddings.embed_query(query)], dtype=np.float32)
+        _, positions = self.vectorstore.index.search(vector, min(self.fetch_k, len(self.documents)))
+        return [int(p) for p in positions[0] if p >= 0]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        if not self.documents:
+            return []
+        lexical = [position for position, _ in self.bm25.search(query, self.fetch_k)]
+        fused = reciprocal_rank_fusion([self._vector_positions(query), lexical])
+        candidates = [self.documents[position] for position in fused[:self.fetch_k]]
+        if self.reranker is not None:
+            candidates = self.reranker.rerank(query, candidates, self.rerank_budget_ms)
+        return candidates[:self.k]
@@ -0,0 +1,103 @@
+"""Process-wide registry of read-only document indexes shared across sessions.
+
+Each ingested document (keyed by its ingestion job ID) is loaded once: FAISS
+vectors, chunk texts and the BM25 index are shared by every session that asks
+about it. Sessions hold leases instead of copies; conversation state lives in
+the conversation store, never in the shared entry. Indexes with no active
+lease are evicted least-recently-used once the memory budget is exceeded.
+"""
+import threading
+import time
+
+
+class SharedIndex:
+    """Read-only parts of one document's RAG pipeline."""
+
+    def __init__(self, version, vectorstore, bm25, documents):
+        self.version = version
+        self.vectorstore = vectorstore
+        self.bm25 = bm25
+        self.documents = documents
+        self.chains = {}  # Stateless chains by retrieval settings; memory is passed per call
+        self.leases = {}  # session_id -> last time the session used this index
+        self.last_used = time.time()
+        self.nbytes = self._estimate_nbytes()
+
+    def _estimate_nbytes(self):
+        index = self.vectorstore.index
+        vectors = index.ntotal * index.d * 4
+        texts = getattr(self.documents, "resident_nbytes", None)  # Memory-mapped docstore: only its dictionaries
+        if texts is None:
+            texts = sum(len(doc.page_content.encode("utf-8")) for doc in self.documents)
+        postings = sum(ids.nbytes + tfs.nbytes for ids, tfs in self.bm25.postings.values())
+        return vectors + texts + postings
+
+    def chain(self, key, build):
+        if key not in self.chains:
+            self.chains[key] = build()
+        return self.chains[key]
+
+
+class IndexRegistry:
+    """Reference-counted (by session lease) cache of SharedIndex objects."""
+
+    def __init__(self, max_bytes=1024 * 1024 * 1024, lease_ttl_seconds=1800):
+        self.max_bytes = max_bytes
+        self.lease_ttl_seconds = lease_ttl_seconds
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self._build_locks = {}
+
+    def acquire(self, version, session_id, build):
+        """Return the shared index for ``version``, building it at most once.
+
+        ``build`` is called without arguments and must return a SharedIndex.
+        The calling session holds a lease until it releases it or goes idle
+        for longer than the lease TTL.
+        """
+        with self._lock:
+            build_lock = self._build_locks.setdefault(version, threading.Lock())
+        with build_lock:  # Concurrent sessions asking for the same new document wait for one build
+            with self._lock:
+                shared = self._indexes.get(version)
+            if shared is None:
+                shared = build()
+                with self._lock:
+                    self._indexes[version] = shared
+        with self._lock:
+            now = time.time()
+            shared.leases[session_id] = now
+            shared.last_used = now
+            self._evict()
+        return shared
+
+    def release(self, version, session_id):
+        with self._lock:
+            shared = self._indexes.get(version)
+            if shared is not None:
+                shared.leases.pop(session_id, None)
+            self._evict()
+
+    def _evict(self):
+        # Caller holds self._lock
+        cutoff = time.time() - self.lease_ttl_seconds
+        for shared in self._indexes.values():
+            for session_id in [sid for sid, seen in shared.leases.items() if seen < cutoff]:
+                del shared.leases[session_id]
+        total = sum(shared.nbytes for shared in self._indexes.values())
+        idle = sorted((s for s in self._indexes.values() if not s.leases), key=lambda s: s.last_used)
+        for shared in idle:
+            if total <= self.max_bytes:
+                break
+            del self._indexes[shared.version]
+            self._build_locks.pop(shared.version, None)
+            total -= shared.nbytes
+
+    def stats(self):
+        with self._lock:
+            return {
+                "indexes": len(self._indexes),
+                "sessions": sum(len(s.leases) for s in self._indexes.values()),
+                "resident_mb": sum(s.nbytes for s in self._indexes.values()) / 1e6,
+                "budget_mb": self.max_bytes / 1e6,
+            }
@@ -0,0 +1,83 @@
+import os
+
+EMBED_BATCH_SIZE = 64
+
+
+def load_and_split_pdf(file_path):
+    """Load a PDF; returns (pages, chunks), the chunks being what the RAG pipeline indexes."""
+    from langchain.document_loaders import PyPDFLoader
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    loader = PyPDFLoader(file_path)
+    documents = loader.load()
+    if not documents:
+        raise ValueError("No content extracted from PDF. Ensure it's a valid, text-based PDF.")
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200,
+        length_function=len,
+    )
+    splits = text_splitter.split_documents(documents)
+    if not splits:
+        raise ValueError("No document chunks created. Document might be too short or content extraction failed.")
+    return documents, splits
+
+
+def document_id(file_path):
+    # Uploads are stored as <content hash>.pdf
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+
+def ingest_pdf_job(ctx, embeddings):
+    """Job handler for the 'ingest_pdf' kind.
+
+    Payload: {"file_path", "dedup_threshold"}. Key figures and table rows are
+    extracted per page into the fact store first (keyed by the file's content
+    hash), so figure lookups need no LLM call. Near-duplicate chunks (repeated
+    disclaimers, fund descriptions) are embedded once; the kept chunk lists
+    the pages of every copy. Chunks are embedded in batches and each batch of
+    vectors is checkpointed, so a resumed job only embeds what is missing.
+    The finished FAISS index is saved in the job's artifact directory, next to
+    a compact memory-mapped docstore holding the chunk texts and metadata.
+    """
+    import faiss
+    import numpy as np
+    from compact_docstore import DOCSTORE_DIR, write_docstore
+    from finwise_common.config import state_path
+    from finwise_common.dedup import dedup_chunks
+    from finwise_common.facts import FactStore, extract_facts
+
+    pages, splits = load_and_split_pdf(ctx.payload["file_path"])
+    ctx.set_message("Extracting key figures and tables...")
+    facts = extract_facts([(page.page_content, page.metadata.get("page")) for page in pages])
+    FactStore(state_path("facts.db")).replace(document_id(ctx.payload["file_path"]), facts)
+    dedup_report = None
+    if ctx.payload.get("dedup_threshold"):
+        ctx.set_message("Removing near-duplicate chunks...")
+        kept, metadatas, dedup_report = dedup_chunks([doc.page_content for doc in splits],
+                                                     [doc.metadata for doc in splits], ctx.payload["dedup_threshold"])
+        splits = [splits[i] for i in kept]
+        for doc, metadata in zip(splits, metadatas):
+            doc.metadata = metadata
+    batches = [splits[i:i + EMBED_BATCH_SIZE] for i in range(0, len(splits), EMBED_BATCH_SIZE)]
+    ctx.set_total(len(batches))
+
+    done = ctx.completed_chunks()
+    for i, batch in enumerate(batches):
+        if i in done:
+            continue
+        ctx.set_message(f"Embedding chunks {i * EMBED_BATCH_SIZE + 1}-{i * EMBED_BATCH_SIZE + len(batch)} of {len(splits)}...")
+        done[i] = embeddings.embed_documents([doc.page_content for doc in batch])
+        ctx.checkpoint(i, done[i])
+
+    ctx.set_message("Building FAISS index...")
+    vectors = np.asarray([vector for i in range(len(batches)) for vector in done[i]], dtype=np.float32)
+    index = faiss.IndexFlatL2(vectors.shape[1])  # What FAISS.from_embeddings builds, without pickled Documents
+    index.add(vectors)
+    index_path = ctx.artifact_dir()
+    faiss.write_index(index, os.path.join(index_path, "index.faiss"))
+    write_docstore(os.path.join(index_path, DOCSTORE_DIR), [doc.page_content for doc in splits],
+                   [doc.metadata for doc in splits])
+    return {"index_path": index_path, "num_chunks": len(splits), "dedup": dedup_report,
+            "facts": {"figures": len(facts), "table_rows": sum(f["kind"] == "table" for f in facts)}}
@@ -0,0 +1,154 @@
+"""Int8-quantized ONNX Runtime backend for the MiniLM sentence embedder.
+
+The model is exported from the same Hugging Face checkpoint the PyTorch path
+uses, its weights are quantized to int8 once and cached on disk, and texts are
+tokenized with the Rust ``tokenizers`` fast path. Texts are bucketed by token
+length so each batch pads to a similar length instead of to the longest text
+in the whole call.
+"""
+import inspect
+import os
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+MAX_SEQ_LENGTH = 256  # all-MiniLM-L6-v2 truncates inputs at 256 word pieces
+
+
+def export_quantized_model(model_name, output_dir):
+    """Export the transformer to ONNX and quantize its weights to int8.
+
+    Runs once per model; later calls return the cached file.
+    """
+    quantized_path = os.path.join(output_dir, "model.int8.onnx")
+    if os.path.exists(quantized_path):
+        return quantized_path
+
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    tokenizer.save_pretrained(output_dir)  # Writes tokenizer.json for the fast path
+    model = AutoModel.from_pretrained(model_name).eval()
+
+    class _HiddenStates(torch.nn.Module):
+        def __init__(self, encoder):
+            super().__init__()
+            self.encoder = encoder
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.encoder(input_ids=input_ids, attention_mask=attention_mask,
+                                token_type_ids=token_type_ids).last_hidden_state
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    # Newer torch defaults to the dynamo exporter (needs onnxscript); use the TorchScript one
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    torch.onnx.export(
+        _HiddenStates(model),
+        tuple(sample[name] for name in input_names),
+        fp32_path,
+        input_names=input_names,
+        output_names=["last_hidden_state"],
+        dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]},
+        opset_version=14,
+        **legacy,
+    )
+    quantize_dynamic(fp32_path, quantized_path, weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    return quantized_path
+
+
+class OnnxMiniLMEmbeddings(Embeddings):
+    """LangChain embeddings running an int8 ONNX graph with mean pooling + L2 norm.
+
+    Produces the same (normalized) vectors as HuggingFaceEmbeddings for
+    sentence-transformers/all-MiniLM-L6-v2, so indexes are interchangeable
+    within the parity tolerance checked by ``check_parity``.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL, cache_dir=None, max_tokens_per_batch=8192,
+                 max_batch_size=128, num_threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        if cache_dir is None:
+            from finwise_common.config import state_path
+            cache_dir = os.path.dirname(state_path("onnx", model_name.replace("/", "--"), "model"))
+        model_path = export_quantized_model(model_name, cache_dir)
+
+        self.model_name = model_name
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.max_batch_size = max_batch_size
+        self.tokenizer = Tokenizer.from_file(os.path.join(cache_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(MAX_SEQ_LENGTH)
+        self.tokenizer.no_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+    def _batches(self, lengths):
+        """Group text indices, shortest first, so each batch stays under the token budget."""
+        order = np.argsort(lengths, kind="stable")
+        batch = []
+        for index in order:
+            # Sorted ascending, so the newest text sets the padded length of the batch
+            if batch and ((len(batch) + 1) * lengths[index] > self.max_tokens_per_batch
+                          or len(batch) == self.max_batch_size):
+                yield batch
+                batch = []
+            batch.append(index)
+        if batch:
+            yield batch
+
+    def _embed(self, texts):
+        encodings = self.tokenizer.encode_batch(list(texts))
+        lengths = np.fromiter((len(e.ids) for e in encodings), dtype=np.int64, count=len(encodings))
+        vectors = None
+        for batch in self._batches(lengths):
+            width = int(lengths[batch].max())
+            input_ids = np.zeros((len(batch), width), dtype=np.int64)
+            attention_mask = np.zeros((len(batch), width), dtype=np.int64)
+            for row, index in enumerate(batch):
+                input_ids[row, :lengths[index]] = encodings[index].ids
+                attention_mask[row, :lengths[index]] = 1
+            hidden = self.session.run(None, {
+                "input_ids": input_ids,
+                "attention_mask": attention_mask,
+                "token_type_ids": np.zeros_like(input_ids),
+            })[0]
+
+            # Mean pooling over real tokens, then L2 normalization (as sentence-transformers does)
+            mask = attention_mask[:, :, None].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            if vectors is None:
+                vectors = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            vectors[batch] = pooled
+        return vectors
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text):
+        return self._embed([text])[0].tolist()
+
+
+def check_parity(candidate, reference, texts, min_cosine=0.99):
+    """Compare two embedding backends on the same texts by cosine similarity.
+
+    Returns {"min", "mean", "passed"}; ``passed`` is True when every text's
+    vectors agree to at least ``min_cosine``.
+    """
+    a = np.asarray(candidate.embed_documents(texts), dtype=np.float64)
+    b = np.asarray(reference.embed_documents(texts), dtype=np.float64)
+    cosine = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    return {"min": float(cosine.min()), "mean": float(cosine.mean()), "passed": bool(cosine.min() >= min_cosine)}
@@ -0,0 +1,97 @@
+"""Query-embedding and retrieval result caches for the RAG chat loop.
+
+Both caches are process-wide (held by st.cache_resource), so a question asked
+again in the same session, or the same standard question asked by another
+analyst about the same document, skips the MiniLM encode and the FAISS search.
+"""
+import threading
+from collections import OrderedDict
+from typing import List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+
+def normalize_query(text):
+    """Case- and whitespace-insensitive cache key for a question."""
+    return " ".join(text.lower().split())
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU map with hit/miss counters."""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embedder and caches query vectors; document embedding is passed through."""
+
+    def __init__(self, embeddings, cache, model_id=None):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_id = model_id or type(embeddings).__name__
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        key = (self.model_id, normalize_query(text))
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(key, vector)
+        return vector
+
+
+class CachedRetriever(BaseRetriever):
+    """Caches top-k results of another retriever, keyed by index version and query."""
+
+    retriever: BaseRetriever
+    cache: LRUCache
+    index_version: str
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        key = (self.index_version, normalize_query(query))
+        docs = self.cache.get(key)
+        if docs is None:
+            docs = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+            self.cache.put(key, docs)
+        return list(docs)
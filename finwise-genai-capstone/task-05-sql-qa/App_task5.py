@@ -1,17 +1,14 @@
 import os
+import sys
 import streamlit as st
-import sqlite3
-import pandas as pd
-import numpy as np
 import requests # Import requests for N8N webhook
-from datetime import datetime, timedelta
-import google.generativeai as genai
-from langchain_community.utilities import SQLDatabase
-from langchain_community.agent_toolkits import SQLDatabaseToolkit
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import PromptTemplate
-from langchain.agents import create_sql_agent
-from langchain.callbacks import StreamlitCallbackHandler  # For verbose output in Streamlit
+from datetime import datetime
+# The Gemini client and the LangChain SQL agent stack are imported
+# inside the functions that use them to keep cold starts fast.
+
+# Make the shared finwise_common package (one level up) importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from finwise_common.config import LLM_BACKEND
 
 # --------------------------------------------------------
 # --- Configuration ---
@@ -30,11 +27,13 @@ st.markdown("Ask natural language questions about our financial database (client
 def load_api_key():
     try:
         google_api_key = st.secrets["GOOGLE_API_KEY"]
-        os.environ["GOOGLE_API_KEY"] = google_api_key
-        genai.configure(api_key=google_api_key)
+        os.environ["GOOGLE_API_KEY"] = google_api_key # Read by ChatGoogleGenerativeAI
         st.success("✅ Google API Key loaded successfully.")
         return True
     except KeyError:
+        if LLM_BACKEND == "local":
+            st.info("ℹ️ No Google API Key: the agent runs on the offline local model.")
+            return True
         st.error("❌ Google API Key not found. Please add it to `.streamlit/secrets.toml`.")
         st.stop()
     except Exception as e:
@@ -64,33 +63,69 @@ def fetch_github_db():
 
 fetch_github_db()
 
+# --------------------------------------------------------
+# --- Working Copy & Index Advisor ---
+# --------------------------------------------------------
+# Queries run against a managed copy of the downloaded DB, where the advisor adds
+# indexes for the SQL the agent generates (SQL_QA_INDEX_MODE=suggest to only report them).
+# The copy is re-synced before each question when the downloaded DB has changed.
+@st.cache_resource
+def get_index_advisor():
+    from index_advisor import IndexAdvisor
+    advisor = IndexAdvisor(os.path.abspath(DB_FILE), mode=os.environ.get("SQL_QA_INDEX_MODE", "auto"))
+    advisor.prepare_working_copy()
+    return advisor
+
+WORKING_DB = get_index_advisor().working_path if os.path.exists(DB_FILE) else DB_FILE
+
+# --------------------------------------------------------
+# --- Schema Catalog ---
+# --------------------------------------------------------
+# Tables, column stats, exact categorical values and sample rows, built once per DB
+# version and persisted next to the DB; the agent gets it in its prompt instead of
+# calling sql_db_list_tables / sql_db_schema on every question
+def get_schema_catalog():
+    from schema_catalog import load_or_build
+    return load_or_build(WORKING_DB)
+
 # --------------------------------------------------------
 # --- LangChain Initialization ---
 # --------------------------------------------------------
 @st.cache_resource(ttl=3600)
-def initialize_langchain_agent():
+def initialize_langchain_agent(catalog_version):
+    # Keyed by catalog version: a changed DB gets an agent with the new schema in its prompt
+    from langchain_community.utilities import SQLDatabase
+    from langchain.agents import create_sql_agent
+    from finwise_common.model_router import chat_model
+    from finwise_common.risk_tool import make_portfolio_risk_tool
+    from sql_toolkit import DigestSQLToolkit
+    from schema_catalog import AGENT_SUFFIX, agent_prefix
+
     if not os.path.exists(DB_FILE):
         st.error("Database missing. Please ensure the GitHub DB is accessible.")
         return None
 
-    llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0)
-    db = SQLDatabase.from_uri(f"sqlite:///{DB_FILE}")
-    toolkit = SQLDatabaseToolkit(db=db, llm=llm)
+    # Deterministic: a repeated question (same catalog, same query results) is answered from the shared cache
+    llm = chat_model("sql_qa", "agent", temperature=0)
+    db = SQLDatabase.from_uri(f"sqlite:///{WORKING_DB}")
+    # The query tool hands the LLM a bounded digest of each result, never the raw rows,
+    # and records the SQL it runs for the index advisor
+    toolkit = DigestSQLToolkit(db=db, llm=llm, db_path=WORKING_DB, on_query=get_index_advisor().record,
+                               introspection=False)
 
     # Improved prompt
     prompt_template = """
     You are an expert AI assistant interacting with a financial database.
     Convert the user question into an accurate SQL query, execute it, and explain the answer clearly.
 
-    Database tables:
-    - clients(client_id, name, age, risk_profile, portfolio_value)
-    - investments(investment_id, client_id, fund_name, amount_invested, date)
-
     Interpret number units correctly:
     - 'L' or 'lakh' = ×100,000
     - 'Cr' or 'crore' = ×10,000,000
     - 'K' or 'thousand' = ×1,000
 
+    For risk questions (VaR, CVaR, expected shortfall, drawdown, "how much could ... lose"),
+    use the portfolio_risk tool instead of SQL; pass client_ids for specific clients.
+
     Answer only using available data. Never invent or assume data.
     If data isn’t found, state that clearly.
 
@@ -100,16 +135,63 @@ def initialize_langchain_agent():
     agent = create_sql_agent(
         llm=llm,
         toolkit=toolkit,
+        extra_tools=[make_portfolio_risk_tool(WORKING_DB)],
+        prefix=agent_prefix(get_schema_catalog()),
+        suffix=AGENT_SUFFIX,
         verbose=True,
         handle_parsing_errors=True,
+        agent_executor_kwargs={"return_intermediate_steps": True}, # To show the queried rows in the UI
     )
     return agent, prompt_template
 
-if 'agent_executor' not in st.session_state:
-    agent_data = initialize_langchain_agent()
-    if agent_data:
-        st.session_state.agent_executor, st.session_state.prompt_template = agent_data
-        st.sidebar.success("✅ LangChain agent initialized!")
+def get_agent_executor():
+    # Built on the first question rather than at startup, rebuilt when the DB version changes
+    catalog_version = get_schema_catalog()["version"] if os.path.exists(WORKING_DB) else None
+    if st.session_state.get('catalog_version') != catalog_version or 'agent_executor' not in st.session_state:
+        agent_data = initialize_langchain_agent(catalog_version)
+        if agent_data:
+            st.session_state.agent_executor, st.session_state.prompt_template = agent_data
+            st.session_state.catalog_version = catalog_version
+            st.sidebar.success("✅ LangChain agent initialized!")
+    return st.session_state.get('agent_executor')
+
+# --------------------------------------------------------
+# --- Analytics Cache ---
+# --------------------------------------------------------
+# Columnar copy of the DB with rollups by risk profile, fund, client and month;
+# refreshed (incrementally for appended investments) whenever the DB file changes
+@st.cache_resource
+def get_analytics_cache():
+    from analytics_cache import AnalyticsCache
+    return AnalyticsCache(WORKING_DB)
+
+# --------------------------------------------------------
+# --- Paged Results ---
+# --------------------------------------------------------
+# Rows are read from an open cursor one page at a time; only the current page is held
+RESULT_PAGE_SIZE = 50
+
+def _next_result_page(key):
+    view = st.session_state[key]
+    view["rows"] = view["stream"].next_page()
+
+def render_result_pages(key, sql, page_size=RESULT_PAGE_SIZE):
+    from result_stream import ResultStream, recent_result
+    view = st.session_state.get(key)
+    if view is None or view["stream"].sql != sql:
+        if view is not None:
+            view["stream"].close()
+        # Starts from the rows kept when the agent's query was digested, so it is not run twice
+        stream = ResultStream(WORKING_DB, sql, page_size=page_size, head=recent_result(WORKING_DB, sql))
+        view = st.session_state[key] = {"stream": stream, "rows": stream.next_page()}
+    stream = view["stream"]
+    if not view["rows"]:
+        st.info("No rows.")
+        return
+    st.dataframe(view["rows"], use_container_width=True)
+    first_row = (stream.pages_read - 1) * page_size + 1
+    st.caption(f"Rows {first_row:,}–{stream.rows_read:,}" + (" (end of result)" if stream.exhausted else ""))
+    st.button("Next page ▶", key=f"{key}_next", on_click=_next_result_page, args=(key,), disabled=stream.exhausted)
 
 # --------------------------------------------------------
 # --- Question Handling ---
@@ -117,7 +199,7 @@ if 'agent_executor' not in st.session_state:
 if 'history' not in st.session_state:
     st.session_state.history = []
 
-if 'agent_executor' in st.session_state:
+if os.path.exists(DB_FILE):
     st.markdown("---")
     st.subheader("Ask Your Question")
 
@@ -130,26 +212,60 @@ if 'agent_executor' in st.session_state:
     st.markdown("- Who are clients with medium risk and portfolio < 5L?")
     st.markdown("- Total amount invested in 'Tech Innovators' fund?")
     st.markdown("- Average portfolio value by risk profile?")
+    st.markdown("- What is the 99% VaR of client 11's holdings over 6 months?")
 
     if st.button("Get Answer", type="primary"):
         if user_question.strip():
             st.info("⏳ Querying the database...")
-            st_callback = StreamlitCallbackHandler(st.empty())
 
             try:
-                formatted_prompt = PromptTemplate.from_template(st.session_state.prompt_template).format(input=user_question)
-                with st.spinner("Generating SQL and fetching answer..."):
-                    response = st.session_state.agent_executor.invoke(
-                        {"input": formatted_prompt},
-                        config={"callbacks": [st_callback]}
-                    )
+                get_index_advisor().prepare_working_copy() # Picks up edits to the downloaded DB
+                # Indexes created by the background analysis of earlier questions
+                for report in get_index_advisor().take_reports():
+                    if report.get("created"):
+                        st.toast(f"Index added: {report['before_ms']:.1f} ms → {report['after_ms']:.1f} ms", icon="⚡")
+
+                # Aggregates that match a materialized rollup skip SQLite and the LLM entirely
+                fast_answer = get_analytics_cache().answer(user_question)
+                st.session_state.last_queries = []
+                if fast_answer:
+                    answer_text = fast_answer["answer"]
+                    st.caption(f"⚡ Answered from the analytics cache ({fast_answer['rollup']}); no SQL or LLM call.")
+                else:
+                    from langchain.callbacks import StreamlitCallbackHandler  # For verbose output in Streamlit
+                    from langchain_core.prompts import PromptTemplate
+                    st_callback = StreamlitCallbackHandler(st.empty())
+
+                    agent_executor = get_agent_executor()
+                    formatted_prompt = PromptTemplate.from_template(st.session_state.prompt_template).format(input=user_question)
+                    with st.spinner("Generating SQL and fetching answer..."):
+                        response = agent_executor.invoke(
+                            {"input": formatted_prompt},
+                            config={"callbacks": [st_callback]}
+                        )
+                    answer_text = response['output']
+
+                    # The queries whose digests the agent read; their rows are paged below
+                    for action, _ in response.get("intermediate_steps", []):
+                        if action.tool == "sql_db_query":
+                            sql = action.tool_input.get("query") if isinstance(action.tool_input, dict) else action.tool_input
+                            if sql not in st.session_state.last_queries:
+                                st.session_state.last_queries.append(sql)
+                    st.session_state.last_queries = st.session_state.last_queries[-3:]
+
+                    # Index the new query shapes so the next similar question is fast (off the script thread)
+                    get_index_advisor().analyze_async()
                 st.subheader("🧠 AI Answer:")
-                st.success(response['output'])
+                st.success(answer_text)
+                from finwise_common.llm_cache import stats_caption
+                from finwise_common.model_router import route_caption
+                st.sidebar.caption(stats_caption("sql_qa"))
+                st.sidebar.caption(route_caption("sql_qa"))
 
                 # Save history
                 st.session_state.history.append({
                     "question": user_question,
-                    "answer": response['output']
+                    "answer": answer_text
                 })
 
                 # --- N8N Workflow Trigger ---
@@ -163,7 +279,7 @@ if 'agent_executor' in st.session_state:
                         n8n_payload = {
                             "event": "sql_qa_query_answered",
                             "user_question": user_question,
-                            "ai_answer": response['output'],
+                            "ai_answer": answer_text,
                             "timestamp": datetime.now().isoformat()
                         }
                         # Send a POST request to the N8N webhook
@@ -189,6 +305,17 @@ if 'agent_executor' in st.session_state:
         else:
             st.warning("Please enter a question first.")
 
+    # Query results, streamed page by page
+    if st.session_state.get("last_queries"):
+        st.subheader("📄 Query Results")
+        for i, sql in enumerate(st.session_state.last_queries):
+            with st.expander(f"Query {i + 1}", expanded=i == len(st.session_state.last_queries) - 1):
+                st.code(sql, language="sql")
+                try:
+                    render_result_pages(f"result_view_{i}", sql)
+                except Exception as e:
+                    st.error(f"Error reading results: {e}")
+
     # Display history
     if st.session_state.history:
         with st.expander("📜 Conversation History"):
@@ -200,6 +327,57 @@ if 'agent_executor' in st.session_state:
 else:
     st.info("Please ensure the API key and database are set up before asking questions.")
 
+# --------------------------------------------------------
+# --- Index Advisor Report ---
+# --------------------------------------------------------
+if os.path.exists(DB_FILE):
+    with st.expander("🛠️ Index Advisor"):
+        advisor = get_index_advisor()
+        st.caption(f"Mode: **{advisor.mode}** · working copy: `{advisor.working_path}`")
+        st.markdown("**Managed indexes:**")
+        for ddl in advisor.managed_indexes() or ["(none yet)"]:
+            st.code(ddl, language="sql")
+        query_log = advisor.query_log(limit=20)
+        if query_log:
+            st.markdown("**Recorded agent queries (slowest first):**")
+            st.dataframe(query_log, use_container_width=True)
+        if st.button("Analyze recorded queries"):
+            reports = advisor.analyze([entry["sql"] for entry in query_log])
+            for report in reports:
+                if report.get("index"):
+                    verb = "Created" if report["created"] else "Suggested"
+                    st.write(f"{verb}: `{report['index']}` — {report['before_ms']:.2f} ms → {report['after_ms']:.2f} ms")
+                    st.caption(" / ".join(report["plan_after"]))
+            if not any(report.get("index") for report in reports):
+                st.info("No full-table scans left to index in the recorded queries.")
+
+# --------------------------------------------------------
+# --- Portfolio Risk ---
+# --------------------------------------------------------
+@st.cache_data(ttl=600, show_spinner=False)
+def run_portfolio_risk(confidence, horizon_months, paths):
+    from finwise_common.risk import portfolio_risk
+    return portfolio_risk(WORKING_DB, confidence=confidence,
+                          horizon_months=horizon_months, n_paths=paths, seed=42)
+
+if os.path.exists(DB_FILE):
+    st.markdown("---")
+    with st.expander("📉 Portfolio Risk (Monte Carlo VaR / CVaR / Drawdown)"):
+        rc1, rc2, rc3 = st.columns(3)
+        risk_confidence = rc1.selectbox("Confidence", [0.95, 0.99], format_func=lambda c: f"{c:.0%}")
+        risk_horizon = rc2.slider("Horizon (months)", 1, 36, 12)
+        risk_paths = rc3.selectbox("Paths", [5000, 10000, 50000], index=1)
+        if st.button("Run risk simulation"):
+            from finwise_common.risk_tool import format_risk_report
+            with st.spinner("Simulating return paths..."):
+                risk_result = run_portfolio_risk(risk_confidence, risk_horizon, risk_paths)
+            book = risk_result["book"]
+            m1, m2, m3 = st.columns(3)
+            m1.metric("Book VaR", f"₹{book['var']:,.0f}")
+            m2.metric("Book CVaR", f"₹{book['cvar']:,.0f}")
+            m3.metric("Max drawdown (p95)", f"{book['max_drawdown_percentiles'][95]:.1%}")
+            st.code(format_risk_report(risk_result, risk_confidence), language="text")
+
 # --------------------------------------------------------
 # --- Database Preview ---
 # --------------------------------------------------------
@@ -211,9 +389,7 @@ with col1:
     with st.expander("Clients Table"):
         if os.path.exists(DB_FILE):
             try:
-                with sqlite3.connect(DB_FILE) as conn:
-                    df_clients = pd.read_sql_query("SELECT * FROM clients LIMIT 5;", conn)
-                    st.dataframe(df_clients)
+                render_result_pages("preview_clients", "SELECT * FROM clients", page_size=10)
             except Exception as e:
                 st.error(f"Error loading clients table: {e}")
 
@@ -221,9 +397,7 @@ with col2:
     with st.expander("Investments Table"):
         if os.path.exists(DB_FILE):
             try:
-                with sqlite3.connect(DB_FILE) as conn:
-                    df_invest = pd.read_sql_query("SELECT * FROM investments LIMIT 5;", conn)
-                    st.dataframe(df_invest)
+                render_result_pages("preview_investments", "SELECT * FROM investments", page_size=10)
             except Exception as e:
                 st.error(f"Error loading investments table: {e}")
 
@@ -0,0 +1,311 @@
+"""Columnar in-memory cache of financial_data.db with materialized rollups.
+
+``clients`` and ``investments`` are held as NumPy columns. Investments are
+rolled up into a small cube keyed by (risk profile, fund, month) with count,
+sum, min and max, plus per-client totals; clients are rolled up by risk
+profile. Aggregate questions that map onto these rollups ("average portfolio
+value by risk profile", "total invested in Tech Innovators in 2024") are
+answered without touching SQLite or the LLM.
+
+The cache refreshes when the DB file changes. Rows appended to investments
+are folded into the rollups incrementally; any other change (updates,
+deletes, client edits) triggers a full reload. Changes are detected with a
+per-row checksum over every column the rollups read.
+"""
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+_AGGREGATES = [
+    ("avg", r"\b(average|avg|mean)\b"),
+    ("sum", r"\b(total|sum)\b"),
+    ("count", r"\b(how many|count|number of)\b"),
+    ("max", r"\b(max|maximum|highest|largest)\b"),
+    ("min", r"\b(min|minimum|lowest|smallest)\b"),
+]
+_GROUPS = [
+    ("risk_profile", r"\b(by|per|for each|each|across)\s+(client\s+)?risk"),
+    ("fund_name", r"\b(by|per|for each|each|across)\s+fund"),
+    ("client_id", r"\b(by|per|for each|each)\s+client\b"),
+    ("month", r"\b(by|per|for each|each)\s+month|\bmonthly\b"),
+    ("year", r"\b(by|per|for each|each)\s+year|\byearly\b|\bannual"),
+]
+# Anything that filters beyond fund / risk profile / year goes to the SQL agent
+_UNSUPPORTED_RE = re.compile(
+    r"[<>=]|\b(greater|less|more than|fewer|above|below|between|top|bottom|list|who|which|names?|age|older|"
+    r"younger|where|except|exclud\w*|not|without|since|before|after|month of|ratio|percent\w*|median)\b")
+_RISK_RE = re.compile(r"\b(high|medium|low)[\s-]+risk\b")
+_YEAR_RE = re.compile(r"\b(19|20)\d{2}\b")
+# Questions that count clients rather than investment rows
+_CLIENT_COUNT_RE = re.compile(r"\b(how many|number of|count of|count)\s+(\w+[\s-]+)?(risk\s+)?(clients|customers)\b")
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Every other word of a question must be one of these; anything else (client IDs or names, months,
+# quarters, fund categories) is a filter the rollups cannot apply, so the SQL agent answers instead
+_KNOWN_WORDS = set("""
+    what whats is was were are be been the a an of in on for to by per each across all every overall whole entire
+    book our my me show give tell please s has have had did do does made make there
+    total sum average avg mean how many much count number max maximum highest largest min minimum lowest smallest
+    invest invests invested investing investment investments amount amounts money value values
+    portfolio portfolios client clients customer customers fund funds risk profile profiles
+    month months monthly year years yearly annual annually
+""".split())
+
+_STAT_LABELS = {"avg": "Average", "sum": "Total", "max": "Maximum", "min": "Minimum"}
+# Columns each rollup reads; any edit to them outside a pure append forces a full reload
+_CLIENT_COLUMNS = "client_id, age, risk_profile, portfolio_value"
+_INVESTMENT_COLUMNS = "client_id, fund_name, amount_invested, date"
+
+
+def _row_checksum(*values):
+    return zlib.crc32(repr(values).encode("utf-8"))
+
+
+def _merge_stats(stats, count, total, low, high):
+    # stats = [count, sum, min, max]; all four combine associatively, so appends fold in
+    stats[0] += count
+    stats[1] += total
+    stats[2] = min(stats[2], low)
+    stats[3] = max(stats[3], high)
+
+
+def _new_stats():
+    return [0, 0.0, float("inf"), float("-inf")]
+
+
+def _stat(stats, agg):
+    count, total, low, high = stats
+    return {"count": count, "sum": total, "avg": total / count if count else 0.0, "min": low, "max": high}[agg]
+
+
+class AnalyticsCache:
+    """Columnar snapshot of the DB plus rollups; safe to share between sessions."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._signature = None
+        self.full_reloads = 0
+        self.incremental_refreshes = 0
+        self.refresh()
+
+    # --- Loading ---
+    def _connect(self):
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        conn.create_function("row_checksum", -1, _row_checksum, deterministic=True)
+        return conn
+
+    def _file_signature(self):
+        stat = os.stat(self.db_path)
+        wal = self.db_path + "-wal"
+        wal_stat = os.stat(wal) if os.path.exists(wal) else None
+        return (stat.st_mtime_ns, stat.st_size, wal_stat and (wal_stat.st_mtime_ns, wal_stat.st_size))
+
+    @staticmethod
+    def _table_fingerprint(conn, table, columns, upto_rowid=None):
+        # Row count, max rowid and a checksum of every rollup column (and the rowid) of each row
+        return conn.execute(
+            f"SELECT COUNT(*), COALESCE(MAX(rowid), 0), COALESCE(SUM(row_checksum(rowid, {columns})), 0) "
+            f"FROM {table} WHERE rowid <= ?", (upto_rowid if upto_rowid is not None else 2 ** 63 - 1,)).fetchone()
+
+    def refresh(self):
+        """Bring the cache up to date with the DB; returns "unchanged", "incremental" or "full"."""
+        with self._lock:
+            signature = self._file_signature()
+            if signature == self._signature:
+                return "unchanged"
+            with self._connect() as conn:
+                mode = self._refresh(conn)
+            self._signature = signature
+            return mode
+
+    def _refresh(self, conn):
+        clients_fp = self._table_fingerprint(conn, "clients", _CLIENT_COLUMNS)
+        if self._signature is None or clients_fp != self._clients_fp:
+            self._load_all(conn, clients_fp)
+            return "full"
+        investments_fp = self._table_fingerprint(conn, "investments", _INVESTMENT_COLUMNS)
+        if investments_fp == self._investments_fp:
+            return "unchanged"
+        old_max_rowid = self._investments_fp[1]
+        # Appends only if the old prefix is untouched row for row and every new row has a higher rowid
+        prefix = self._table_fingerprint(conn, "investments", _INVESTMENT_COLUMNS, upto_rowid=old_max_rowid)
+        if prefix != self._investments_fp or investments_fp[1] < old_max_rowid:
+            self._load_all(conn, clients_fp)
+            return "full"
+        self._append_investments(self._read_investments(conn, after_rowid=old_max_rowid))
+        self._investments_fp = investments_fp
+        self.incremental_refreshes += 1
+        return "incremental"
+
+    @staticmethod
+    def _read_investments(conn, after_rowid=0):
+        rows = conn.execute(
+            "SELECT client_id, fund_name, amount_invested, date FROM investments WHERE rowid > ? ORDER BY rowid",
+            (after_rowid,)).fetchall()
+        return {
+            "client_id": np.array([r[0] for r in rows], dtype=np.int64),
+            "fund_name": np.array([r[1] for r in rows], dtype=object),
+            "amount_invested": np.array([r[2] or 0.0 for r in rows], dtype=np.float64),
+            "month": np.array([(r[3] or "")[:7] for r in rows], dtype=object),
+        }
+
+    def _load_all(self, conn, clients_fp):
+        rows = conn.execute("SELECT client_id, age, risk_profile, portfolio_value FROM clients").fetchall()
+        self.clients = {
+            "client_id": np.array([r[0] for r in rows], dtype=np.int64),
+            "age": np.array([r[1] or 0 for r in rows], dtype=np.int64),
+            "risk_profile": np.array([r[2] or "" for r in rows], dtype=object),
+            "portfolio_value": np.array([r[3] or 0.0 for r in rows], dtype=np.float64),
+        }
+        self._risk_of_client = dict(zip(self.clients["client_id"].tolist(), self.clients["risk_profile"].tolist()))
+        self.client_rollup = defaultdict(_new_stats)
+        for risk in np.unique(self.clients["risk_profile"]):
+            values = self.clients["portfolio_value"][self.clients["risk_profile"] == risk]
+            _merge_stats(self.client_rollup[risk], len(values), values.sum(), values.min(), values.max())
+        self.investments = None
+        self.cube = defaultdict(_new_stats)  # (risk_profile, fund_name, month) -> [count, sum, min, max]
+        self.by_client = defaultdict(_new_stats)  # client_id -> [count, sum, min, max]
+        self._append_investments(self._read_investments(conn))
+        self._clients_fp = clients_fp
+        self._investments_fp = self._table_fingerprint(conn, "investments", _INVESTMENT_COLUMNS)
+        self.full_reloads += 1
+
+    def _append_investments(self, new):
+        if self.investments is None:
+            self.investments = new
+        elif len(new["client_id"]):
+            self.investments = {key: np.concatenate([column, new[key]]) for key, column in self.investments.items()}
+        if not len(new["client_id"]):
+            return
+        risk = np.array([self._risk_of_client.get(c, "") for c in new["client_id"].tolist()], dtype=object)
+        self._fold(self.cube, np.stack([risk, new["fund_name"], new["month"]], axis=1), new["amount_invested"])
+        self._fold(self.by_client, new["client_id"][:, None], new["amount_invested"])
+
+    @staticmethod
+    def _fold(rollup, keys, amounts):
+        # Group the new rows by key with NumPy, then merge one stats record per group
+        unique_keys, first_rows, inverse = np.unique(
+            keys.astype(str), axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        counts = np.bincount(inverse, minlength=len(unique_keys))
+        sums = np.bincount(inverse, weights=amounts, minlength=len(unique_keys))
+        lows = np.full(len(unique_keys), np.inf)
+        highs = np.full(len(unique_keys), -np.inf)
+        np.minimum.at(lows, inverse, amounts)
+        np.maximum.at(highs, inverse, amounts)
+        for i, first in enumerate(first_rows):
+            typed_key = tuple(keys[first].tolist())  # Original (typed) key values, not their str form
+            typed_key = typed_key[0] if len(typed_key) == 1 else typed_key
+            _merge_stats(rollup[typed_key], int(counts[i]), float(sums[i]), float(lows[i]), float(highs[i]))
+
+    # --- Queries ---
+    @property
+    def fund_names(self):
+        return sorted({key[1] for key in self.cube})
+
+    def rollup(self, agg, group=None, fund=None, risk=None, year=None):
+        """Aggregate amount_invested over the cube; returns [(group value, value)] or a single value."""
+        groups = defaultdict(_new_stats)
+        source = self.by_client.items() if group == "client_id" else self.cube.items()
+        for key, stats in source:
+            if group == "client_id":
+                group_key = key
+            else:
+                cell_risk, cell_fund, month = key
+                if (fund and cell_fund != fund) or (risk and cell_risk != risk) or (year and not month.startswith(year)):
+                    continue
+                group_key = {"risk_profile": cell_risk, "fund_name": cell_fund, "month": month,
+                             "year": month[:4], None: None}[group]
+            _merge_stats(groups[group_key], *stats)
+        if group is None:
+            return _stat(groups[None], agg) if None in groups else None
+        return [(key, _stat(stats, agg)) for key, stats in sorted(groups.items())]
+
+    def answer(self, question):
+        """Answer an aggregate question from the rollups, or return None to use the SQL agent.
+
+        Returns {"answer": text, "rows": [{...}], "rollup": name}.
+        """
+        self.refresh()
+        q = " ".join(question.lower().split())
+        if _UNSUPPORTED_RE.search(q):
+            return None
+        agg = next((name for name, pattern in _AGGREGATES if re.search(pattern, q)), None)
+        group = next((name for name, pattern in _GROUPS if re.search(pattern, q)), None)
+        funds = [name for name in self.fund_names if name.lower() in q]
+        risk_match = _RISK_RE.search(q)
+        risk = risk_match.group(1).title() if risk_match else None
+        years = _YEAR_RE.findall(q)
+        year_match = _YEAR_RE.search(q)
+        if agg is None or len(funds) > 1 or len(years) > 1:
+            return None
+        # Answer only when every constraint in the question is one the rollups apply
+        rest = _YEAR_RE.sub(" ", _RISK_RE.sub(" ", q))
+        for name in funds:
+            rest = rest.replace(name.lower(), " ")
+        if any(token not in _KNOWN_WORDS for token in _TOKEN_RE.findall(rest)):
+            return None
+
+        if "portfolio" in q:
+            # Client portfolio values: only risk-profile rollups exist
+            if funds or year_match or group not in (None, "risk_profile") or agg == "count":
+                return None
+            return self._client_answer(agg, group, risk)
+        if agg == "count" and _CLIENT_COUNT_RE.search(q):
+            # Distinct clients with a fund, year or investment filter are not in the rollups
+            if funds or year_match or "invest" in q or group not in (None, "risk_profile"):
+                return None
+            return self._client_answer("count", group, risk)
+        if "invest" not in q and not funds:
+            return None
+
+        fund = funds[0] if funds else None
+        year = year_match.group(0) if year_match else None
+        label = "Number of investments" if agg == "count" else f"{_STAT_LABELS[agg]} amount invested"
+        scope = ", ".join(filter(None, [fund and f"fund {fund}", risk and f"{risk}-risk clients", year]))
+        if group is None:
+            value = self.rollup(agg, fund=fund, risk=risk, year=year)
+            if value is None:
+                return {"answer": f"No investments found for {scope or 'the book'}.", "rows": [], "rollup": "investments"}
+            return {"answer": f"{label}{' for ' + scope if scope else ''}: {self._format(agg, value)}",
+                    "rows": [{"value": value}], "rollup": "investments"}
+        if group == "client_id" and (fund or risk or year):
+            return None
+        rows = self.rollup(agg, group=group, fund=fund, risk=risk, year=year)
+        lines = [f"- {key}: {self._format(agg, value)}" for key, value in rows]
+        return {"answer": f"{label} by {group.replace('_', ' ')}{' for ' + scope if scope else ''}:\n" + "\n".join(lines),
+                "rows": [{group: key, agg: value} for key, value in rows], "rollup": f"investments_by_{group}"}
+
+    def _client_answer(self, agg, group, risk):
+        label = "Number of clients" if agg == "count" else f"{_STAT_LABELS[agg]} portfolio value"
+        if group == "risk_profile":
+            rows = [(key, _stat(stats, agg)) for key, stats in sorted(self.client_rollup.items())
+                    if risk is None or key == risk]
+            lines = [f"- {key}: {self._format(agg, value)}" for key, value in rows]
+            return {"answer": f"{label} by risk profile:\n" + "\n".join(lines),
+                    "rows": [{"risk_profile": key, agg: value} for key, value in rows], "rollup": "clients_by_risk_profile"}
+        total = _new_stats()
+        for key, stats in self.client_rollup.items():
+            if risk is None or key == risk:
+                _merge_stats(total, *stats)
+        value = _stat(total, agg) if total[0] else 0
+        return {"answer": f"{label}{f' for {risk}-risk clients' if risk else ''}: {self._format(agg, value)}",
+                "rows": [{"value": value}], "rollup": "clients_by_risk_profile"}
+
+    @staticmethod
+    def _format(agg, value):
+        return f"{int(value):,}" if agg == "count" else f"₹{value:,.2f}"
+
+    def stats(self):
+        return {
+            "clients": len(self.clients["client_id"]),
+            "investments": len(self.investments["client_id"]),
+            "cube_cells": len(self.cube),
+            "full_reloads": self.full_reloads,
+            "incremental_refreshes": self.incremental_refreshes,
+        }
@@ -0,0 +1,274 @@
+"""Index advisor for the SQL QA database.
+
+The app queries a managed working copy of the downloaded DB, so indexes can
+be added without touching the original. SELECTs run by the SQL agent are
+recorded; the advisor runs EXPLAIN QUERY PLAN on each, derives a (covering)
+index for every table the plan scans in full from the columns the query
+filters, joins, groups and sorts on, and either creates it ("auto") or only
+suggests it ("suggest"). An index is kept only if the new plan uses it, and
+each result carries before / after latency.
+
+The working copy is re-synced whenever the source file's mtime or size
+changes, and analysis runs on the advisor's own worker thread so it never
+delays an answer.
+"""
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from finwise_common.config import state_path
+
+# The filters and joins of the example questions, analyzed when a working copy is created
+DEFAULT_WORKLOAD = [
+    "SELECT name, portfolio_value FROM clients WHERE risk_profile = 'High' AND portfolio_value > 1000000",
+    "SELECT SUM(amount_invested) FROM investments WHERE fund_name = 'Tech Innovators'",
+    "SELECT risk_profile, AVG(portfolio_value) FROM clients GROUP BY risk_profile",
+    "SELECT c.name, SUM(i.amount_invested) FROM clients c JOIN investments i ON c.client_id = i.client_id "
+    "GROUP BY c.client_id",
+    "SELECT fund_name, SUM(amount_invested) FROM investments WHERE date >= '2024-01-01' GROUP BY fund_name",
+]
+
+_KEYWORDS = {"where", "join", "on", "group", "order", "limit", "inner", "left", "right", "outer", "cross",
+             "natural", "using", "as", "having", "union", "select", "from"}
+_TABLE_REF_RE = re.compile(r"\b(?:from|join)\s+\"?(\w+)\"?(?:\s+(?:as\s+)?(\w+))?", re.I)
+_COLUMN_RE = re.compile(r"(?:\"?(\w+)\"?\.)?\"?(\w+)\"?")
+_CLAUSE_RE = re.compile(r"\b(select|from|where|on|group\s+by|order\s+by|having|limit)\b", re.I)
+_HASH_CHUNK = 1024 * 1024
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _best_of(conn, sql, repeats=3):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        conn.execute(sql).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def explain(conn, sql):
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+
+
+def _full_scans(plan):
+    # "SCAN investments" / "SCAN i" without an index is a full table scan
+    scans = []
+    for line in plan:
+        match = re.match(r"SCAN (?:TABLE )?(\w+)(?: AS (\w+))?(.*)", line)
+        if match and "INDEX" not in match.group(3):
+            scans.append(match.group(2) or match.group(1))
+    return scans
+
+
+class IndexAdvisor:
+    """Keeps the working copy, the query log and the indexes created on it."""
+
+    def __init__(self, source_path, working_path=None, mode="auto"):
+        self.source_path = source_path
+        self.working_path = working_path or state_path("sql_qa", os.path.basename(source_path))
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._source_signature = None  # (mtime, size) of the source at the last sync
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-advisor")
+        self._finished = []  # Reports of background analyses with an index, not yet shown
+        self._log_path = state_path("sql_qa", "advisor.db")
+        with sqlite3.connect(self._log_path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS queries (sql TEXT PRIMARY KEY, runs INTEGER NOT NULL, "
+                         "total_ms REAL NOT NULL, analyzed INTEGER NOT NULL DEFAULT 0)")
+            conn.execute("CREATE TABLE IF NOT EXISTS managed_indexes (name TEXT PRIMARY KEY, ddl TEXT NOT NULL)")
+
+    # --- Working copy ---
+    def prepare_working_copy(self):
+        """Copy the source DB when it changed and re-create managed indexes; returns the working path.
+
+        Only stats the source while its mtime and size are unchanged, so it is called on every question.
+        """
+        stat = os.stat(self.source_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._source_signature and os.path.exists(self.working_path):
+            return self.working_path
+        source_hash = _file_hash(self.source_path)
+        marker = self.working_path + ".source"
+        with self._lock:
+            current = open(marker).read() if os.path.exists(marker) else None
+            copied = current != source_hash or not os.path.exists(self.working_path)
+            if copied:
+                shutil.copyfile(self.source_path, self.working_path + ".tmp")
+                os.replace(self.working_path + ".tmp", self.working_path)
+                with open(marker, "w") as f:
+                    f.write(source_hash)
+                with sqlite3.connect(self._log_path) as log, sqlite3.connect(self.working_path) as conn:
+                    for (ddl,) in log.execute("SELECT ddl FROM managed_indexes"):
+                        conn.execute(ddl)
+                    conn.execute("PRAGMA optimize")
+            self._source_signature = signature
+        if copied and current is None:
+            for sql in DEFAULT_WORKLOAD:
+                self.record(sql, 0.0)
+            self.analyze_async()
+        return self.working_path
+
+    # --- Query log ---
+    def record(self, sql, elapsed_ms):
+        sql = " ".join(sql.split()).rstrip(";")
+        with sqlite3.connect(self._log_path) as conn:
+            conn.execute(
+                "INSERT INTO queries (sql, runs, total_ms) VALUES (?, 1, ?) "
+                "ON CONFLICT(sql) DO UPDATE SET runs = runs + 1, total_ms = total_ms + excluded.total_ms",
+                (sql, elapsed_ms),
+            )
+
+    def pending_queries(self):
+        with sqlite3.connect(self._log_path) as conn:
+            return [row[0] for row in conn.execute("SELECT sql FROM queries WHERE analyzed = 0 ORDER BY total_ms DESC")]
+
+    def query_log(self, limit=50):
+        with sqlite3.connect(self._log_path) as conn:
+            rows = conn.execute("SELECT sql, runs, total_ms / runs, analyzed FROM queries "
+                                "ORDER BY total_ms DESC LIMIT ?", (limit,)).fetchall()
+        return [{"sql": sql, "runs": runs, "avg_ms": avg_ms, "analyzed": bool(analyzed)}
+                for sql, runs, avg_ms, analyzed in rows]
+
+    def managed_indexes(self):
+        with sqlite3.connect(self._log_path) as conn:
+            return [row[0] for row in conn.execute("SELECT ddl FROM managed_indexes ORDER BY name")]
+
+    # --- Analysis ---
+    @staticmethod
+    def _table_columns(conn):
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                                                 "AND name NOT LIKE 'sqlite_%'")]
+        return {t: [row[1] for row in conn.execute(f'PRAGMA table_info("{t}")')] for t in tables}
+
+    @staticmethod
+    def _candidate(sql, table, columns, aliases, shared_columns):
+        """Index columns for ``table``: equality filters/joins, one range column, then GROUP/ORDER BY,
+        then the other referenced columns when few enough to make the index covering."""
+        parts = _CLAUSE_RE.split(sql)
+        clauses = {}
+        for keyword, body in zip(parts[1::2], parts[2::2]):
+            clauses.setdefault(" ".join(keyword.lower().split()), []).append(body)
+
+        def refs(text):
+            # Qualified names must point at this table; unqualified ones must not exist in another joined table
+            return [name for qualifier, name in _COLUMN_RE.findall(re.sub(r"'[^']*'", "''", text))
+                    if name in columns and (aliases.get(qualifier) == table if qualifier else name not in shared_columns)]
+
+        equality, ranges = [], []
+        for text in clauses.get("where", []) + clauses.get("on", []):
+            for condition in re.split(r"\band\b|\bor\b", text, flags=re.I):
+                cols = refs(condition)
+                if not cols:
+                    continue
+                target = equality if re.search(r"(?<![<>!])=|\bin\b|\bis\b", condition, re.I) else ranges
+                target.extend(cols)
+        ordering = refs(" ".join(clauses.get("group by", []) + clauses.get("order by", [])))
+        selected = " ".join(clauses.get("select", []))
+        extra = refs(selected + " " + " ".join(ranges[1:])) if "*" not in selected else []
+        variants = []
+        # A selective range belongs before GROUP/ORDER BY columns, an unselective one after them
+        for order in (equality + ranges[:1] + ordering, equality + ordering + ranges[:1]):
+            index_columns = list(dict.fromkeys(order))
+            covering = [name for name in dict.fromkeys(extra) if name not in index_columns]
+            if index_columns and len(index_columns) + len(covering) <= 4:
+                index_columns += covering
+            if index_columns and index_columns not in variants:
+                variants.append(index_columns)
+        return variants
+
+    def analyze(self, queries=None):
+        """Analyze recorded (or given) queries; returns one report dict per query.
+
+        Report keys: sql, plan_before, plan_after, index (DDL or None), created, before_ms, after_ms.
+        """
+        queries = self.pending_queries() if queries is None else queries
+        reports = []
+        with self._lock, sqlite3.connect(self.working_path) as conn, sqlite3.connect(self._log_path) as log:
+            table_columns = self._table_columns(conn)
+            for sql in queries:
+                try:
+                    reports.append(self._analyze_one(conn, log, sql, table_columns))
+                except sqlite3.Error as e:
+                    reports.append({"sql": sql, "error": str(e)})
+                log.execute("UPDATE queries SET analyzed = 1 WHERE sql = ?", (sql,))
+        return reports
+
+    def analyze_async(self, queries=None):
+        """``analyze`` on the advisor's worker thread; returns a Future of the reports."""
+        return self._executor.submit(self._analyze_and_keep, queries)
+
+    def _analyze_and_keep(self, queries):
+        reports = self.analyze(queries)
+        with self._lock:
+            self._finished.extend(report for report in reports if report.get("index"))
+        return reports
+
+    def take_reports(self):
+        """Reports with an index from background analyses finished since the last call."""
+        with self._lock:
+            reports, self._finished = self._finished, []
+        return reports
+
+    def _analyze_one(self, conn, log, sql, table_columns):
+        plan_before = explain(conn, sql)
+        before_ms = _best_of(conn, sql)
+        report = {"sql": sql, "plan_before": plan_before, "plan_after": plan_before, "index": None,
+                  "created": False, "before_ms": before_ms, "after_ms": before_ms}
+        aliases = {}
+        for table, alias in _TABLE_REF_RE.findall(sql):
+            if table in table_columns:
+                aliases[table] = table
+                if alias and alias.lower() not in _KEYWORDS:
+                    aliases[alias] = table
+        tables = set(aliases.values())
+        kept = []
+        after_ms, plan_after = before_ms, plan_before
+        for scanned in _full_scans(plan_before):
+            table = aliases.get(scanned, scanned)
+            if table not in table_columns:
+                continue
+            shared = {c for other in tables - {table} for c in table_columns[other]}
+            # Try each candidate on the working copy; keep the fastest one the planner actually uses
+            best = None
+            for columns in self._candidate(sql, table, table_columns[table], aliases, shared):
+                name = f"idx_{table}_{'_'.join(columns)}"
+                ddl = f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({", ".join(columns)})'
+                existed = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                                       (name,)).fetchone()
+                conn.execute(ddl)
+                plan = explain(conn, sql)
+                if any(name in line for line in plan):
+                    elapsed_ms = _best_of(conn, sql)
+                    if elapsed_ms < 0.9 * after_ms and (best is None or elapsed_ms < best[2]):
+                        best = (name, ddl, elapsed_ms, plan)
+                if not existed:
+                    conn.execute(f'DROP INDEX IF EXISTS "{name}"')
+            if best is not None:
+                name, ddl, after_ms, plan_after = best
+                kept.append((name, ddl))
+                conn.execute(ddl)  # Stays in place while the next scanned table is evaluated
+        if not kept:
+            return report
+        report.update(index="; ".join(ddl for _, ddl in kept), plan_after=plan_after, after_ms=after_ms)
+        if self.mode == "auto":
+            for name, ddl in kept:
+                log.execute("INSERT OR IGNORE INTO managed_indexes (name, ddl) VALUES (?, ?)", (name, ddl))
+            conn.execute("PRAGMA optimize")
+            report["created"] = True
+        else:
+            for name, _ in kept:
+                conn.execute(f'DROP INDEX IF EXISTS "{name}"')
+        return report
@@ -0,0 +1,197 @@
+"""Paged SQL results and bounded statistical digests.
+
+ResultStream keeps one read-only SQLite cursor open and hands out fixed-size
+pages, so the UI can show the first page at once and fetch the rest on
+demand. ResultDigest folds pages into counts, sums, min/max, top-N values
+and the top-N rows by the first numeric non-ID column; that digest (never the raw
+result set) is what the LLM sees. Memory and prompt size stay bounded by the
+page size and N, whatever the number of rows.
+
+The first rows of the agent's recent queries are kept while they are
+digested, so the UI pager starts from them instead of running the query a
+second time; SQLite is only queried again for pages beyond them.
+"""
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from finwise_common.tokens import truncate_to_tokens
+
+MAX_DISTINCT_TRACKED = 1000  # Per text column; later new values are counted as "other"
+KEEP_ROWS = 200              # First rows of a digested query kept for the pager
+RECENT_RESULTS = 32          # Digested queries whose first rows are kept
+
+_recent = OrderedDict()  # (db_path, db mtime, sql) -> {"columns", "rows", "total"}
+_recent_lock = threading.Lock()
+
+
+def connect_readonly(db_path):
+    # check_same_thread=False: Streamlit reruns of one session may run on different threads
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+
+
+def _result_key(db_path, sql):
+    return db_path, os.stat(db_path).st_mtime_ns, " ".join(sql.split())
+
+
+def remember_result(db_path, sql, columns, rows, total):
+    """Keep the first ``rows`` (tuples) of a query that returned ``total`` rows."""
+    with _recent_lock:
+        key = _result_key(db_path, sql)
+        _recent[key] = {"columns": columns, "rows": rows, "total": total}
+        _recent.move_to_end(key)
+        while len(_recent) > RECENT_RESULTS:
+            _recent.popitem(last=False)
+
+
+def recent_result(db_path, sql):
+    """The kept first rows of ``sql`` on the DB as it is now, or None."""
+    with _recent_lock:
+        return _recent.get(_result_key(db_path, sql))
+
+
+class ResultStream:
+    """Forward-only pages of a query's rows (each row a dict).
+
+    With ``head`` (a ``recent_result``), pages come from the kept rows and the
+    query only runs again, skipping them, when paging goes past them.
+    """
+
+    def __init__(self, db_path, sql, params=(), page_size=50, head=None):
+        self.db_path = db_path
+        self.sql = sql
+        self.params = params
+        self.page_size = page_size
+        self._conn = self._cursor = None
+        self._head = head["rows"] if head else []
+        self._total = head["total"] if head else None
+        if head:
+            self.columns = head["columns"]
+        else:
+            self._open(skip=0)
+        self.rows_read = 0
+        self.pages_read = 0
+        self.exhausted = not self.columns
+
+    def _open(self, skip):
+        self._conn = connect_readonly(self.db_path)
+        self._cursor = self._conn.execute(self.sql, self.params)
+        self.columns = [d[0] for d in self._cursor.description or []]
+        while skip > 0:
+            skipped = len(self._cursor.fetchmany(min(skip, 1000)))
+            if not skipped:
+                break
+            skip -= skipped
+
+    def next_page(self):
+        if self.exhausted:
+            return []
+        rows = self._head[self.rows_read:self.rows_read + self.page_size]
+        if len(rows) < self.page_size and (self._total is None or self.rows_read + len(rows) < self._total):
+            if self._cursor is None:
+                self._open(skip=len(self._head))
+            rows += self._cursor.fetchmany(self.page_size - len(rows))
+        self.rows_read += len(rows)
+        self.pages_read += 1
+        if len(rows) < self.page_size or (self._total is not None and self.rows_read >= self._total):
+            self.close()
+        return [dict(zip(self.columns, row)) for row in rows]
+
+    def close(self):
+        self.exhausted = True
+        if self._conn is not None:
+            self._conn.close()
+
+
+class ResultDigest:
+    """Streaming summary of a result set."""
+
+    def __init__(self, columns, top_n=5):
+        self.columns = columns
+        self.top_n = top_n
+        self.rows = 0
+        self.numeric = {}  # column -> [count, sum, min, max]
+        self.values = {c: Counter() for c in columns}
+        self.other = Counter()
+        self._top_rows = []  # min-heap of (value, seq, row) by the first numeric column
+        self._seq = itertools.count()
+        self.rank_column = None
+
+    def update(self, rows):
+        for row in rows:
+            self.rows += 1
+            for column, value in row.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    stats = self.numeric.setdefault(column, [0, 0.0, value, value])
+                    stats[0] += 1
+                    stats[1] += value
+                    stats[2] = min(stats[2], value)
+                    stats[3] = max(stats[3], value)
+                elif value is not None:
+                    counter = self.values[column]
+                    if value in counter or len(counter) < MAX_DISTINCT_TRACKED:
+                        counter[value] += 1
+                    else:
+                        self.other[column] += 1
+            if self.rank_column is None and self.numeric:
+                # Rank by a measure (e.g. amount_invested) rather than an ID column when there is one
+                numeric = [c for c in self.columns if c in self.numeric]
+                self.rank_column = next((c for c in numeric if not c.lower().endswith("id")), numeric[0])
+            rank_value = row.get(self.rank_column) if self.rank_column else None
+            if isinstance(rank_value, (int, float)):
+                entry = (rank_value, next(self._seq), row)
+                if len(self._top_rows) < self.top_n:
+                    heapq.heappush(self._top_rows, entry)
+                elif rank_value > self._top_rows[0][0]:
+                    heapq.heapreplace(self._top_rows, entry)
+            elif self.rank_column is None and len(self._top_rows) < self.top_n:
+                self._top_rows.append((0, next(self._seq), row))  # No numeric column: keep the first rows
+
+    def to_text(self, max_tokens=600):
+        lines = [f"Rows: {self.rows:,} (columns: {', '.join(self.columns)})"]
+        if self.numeric:
+            lines.append("Numeric columns:")
+            for column, (count, total, low, high) in self.numeric.items():
+                lines.append(f"- {column}: count {count:,}, sum {total:,.2f}, mean {total / count:,.2f}, "
+                             f"min {low:,.2f}, max {high:,.2f}")
+        text_columns = [c for c in self.columns if self.values[c] and c not in self.numeric]
+        if text_columns:
+            lines.append(f"Text columns (top {self.top_n} values with counts):")
+            for column in text_columns:
+                counter = self.values[column]
+                distinct = f"{len(counter):,}{'+' if self.other[column] else ''} distinct"
+                top = ", ".join(f"{value} ({count:,})" for value, count in counter.most_common(self.top_n))
+                lines.append(f"- {column} ({distinct}): {top}")
+        if self._top_rows:
+            label = f"Top {len(self._top_rows)} rows by {self.rank_column}" if self.rank_column else \
+                f"First {len(self._top_rows)} rows"
+            lines.append(label + ":")
+            for _, _, row in sorted(self._top_rows, key=lambda e: (-e[0], e[1])):
+                lines.append("- " + ", ".join(f"{k}={v}" for k, v in row.items()))
+        if self.rows > len(self._top_rows):
+            lines.append("(Digest of the full result; the user sees all rows in a paged table.)")
+        return truncate_to_tokens("\n".join(lines), max_tokens)
+
+
+def digest_query(db_path, sql, page_size=1000, top_n=5, keep_rows=0):
+    """Run ``sql`` page by page and return (digest, elapsed_ms) without holding the rows.
+
+    With ``keep_rows``, the first rows are kept for ``recent_result``.
+    """
+    start = time.perf_counter()
+    stream = ResultStream(db_path, sql, page_size=page_size)
+    digest = ResultDigest(stream.columns, top_n=top_n)
+    head = []
+    while not stream.exhausted:
+        page = stream.next_page()
+        digest.update(page)
+        if len(head) < keep_rows:
+            head += [tuple(row.values()) for row in page[:keep_rows - len(head)]]
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if keep_rows:
+        remember_result(db_path, sql, stream.columns, head, digest.rows)
+    return digest, elapsed_ms
@@ -0,0 +1,140 @@
+"""Schema catalog of the SQL QA database, built once per DB version.
+
+Holds what the SQL agent would otherwise rediscover with sql_db_list_tables /
+sql_db_schema on every question: tables, columns and types, row counts,
+per-column statistics, the exact distinct values of low-cardinality columns
+(risk_profile, fund_name, ...) and a few sample rows. The catalog is kept in
+memory, persisted as JSON next to the DB, and rendered into the agent prompt.
+
+The DB version is a fingerprint of the schema SQL plus each table's row count
+and a checksum of every row, so appended or updated rows refresh the
+statistics and value lists too.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import zlib
+
+LOW_CARDINALITY = 25  # Columns with at most this many distinct values list them all
+SAMPLE_ROWS = 3
+
+# create_sql_agent prompt pieces: the catalog replaces the list-tables / schema tool calls
+AGENT_PREFIX = """You are an agent designed to interact with a {dialect} database.
+Given an input question, create a syntactically correct {dialect} query, run it and answer from its result.
+Unless the user asks for a specific number of rows, limit the query to at most {top_k} results.
+Never make DML statements (INSERT, UPDATE, DELETE, DROP etc.).
+
+The database schema is below; do not look it up with tools. Filter categorical columns
+using exactly the listed values (spelling and case).
+
+"""
+AGENT_SUFFIX = """Begin!
+
+Question: {input}
+Thought: The schema and column values are listed above, so I can write the query directly.
+{agent_scratchpad}"""
+
+_loaded = {}  # db_path -> (file signature, catalog): an unchanged file skips even the fingerprint
+
+
+def _row_checksum(*values):
+    return zlib.crc32(repr(values).encode("utf-8"))
+
+
+def _connect(db_path):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn.create_function("row_checksum", -1, _row_checksum, deterministic=True)
+    return conn
+
+
+def db_version(db_path):
+    with _connect(db_path) as conn:
+        schema = conn.execute("SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' "
+                              "AND type = 'table' ORDER BY name").fetchall()
+        parts = [repr(schema)]
+        for _, table, _ in schema:
+            columns = ", ".join(f'"{row[1]}"' for row in conn.execute(f'PRAGMA table_info("{table}")'))
+            # Content checksum: UPDATEs that add a category value or move a range change the version too
+            parts.append(repr(conn.execute(
+                f'SELECT COUNT(*), SUM(row_checksum(rowid, {columns})) FROM "{table}"').fetchone()))
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+
+
+def build_catalog(db_path):
+    """Introspect the DB into a JSON-serializable dict."""
+    catalog = {"version": db_version(db_path), "tables": {}}
+    with _connect(db_path) as conn:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+        for table in tables:
+            columns = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+            row_count = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            column_info = []
+            for _, name, col_type, _, _, _ in columns:
+                nulls, distinct, low, high = conn.execute(
+                    f'SELECT SUM("{name}" IS NULL), COUNT(DISTINCT "{name}"), MIN("{name}"), MAX("{name}") '
+                    f'FROM "{table}"').fetchone()
+                info = {"name": name, "type": col_type, "nulls": nulls or 0, "distinct": distinct,
+                        "min": low, "max": high}
+                if 0 < distinct <= LOW_CARDINALITY:
+                    info["values"] = [row[0] for row in conn.execute(
+                        f'SELECT "{name}", COUNT(*) FROM "{table}" GROUP BY 1 ORDER BY 2 DESC, 1')]
+                column_info.append(info)
+            sample = conn.execute(f'SELECT * FROM "{table}" LIMIT {SAMPLE_ROWS}').fetchall()
+            catalog["tables"][table] = {"rows": row_count, "columns": column_info, "sample": sample}
+    return catalog
+
+
+def load_or_build(db_path):
+    """Return the catalog for the DB's current version, rebuilding and saving it when stale."""
+    path = db_path + ".catalog.json"
+    stat = os.stat(db_path)
+    wal = db_path + "-wal"
+    signature = (stat.st_mtime_ns, stat.st_size, os.path.getsize(wal) if os.path.exists(wal) else 0)
+    if db_path in _loaded and _loaded[db_path][0] == signature:
+        return _loaded[db_path][1]
+    version = db_version(db_path)
+    if db_path in _loaded and _loaded[db_path][1]["version"] == version:
+        _loaded[db_path] = (signature, _loaded[db_path][1])  # e.g. only an index was added
+        return _loaded[db_path][1]
+    catalog = None
+    if os.path.exists(path):
+        with open(path) as f:
+            catalog = json.load(f)
+    if catalog is None or catalog.get("version") != version:
+        catalog = build_catalog(db_path)
+        with open(path + ".tmp", "w") as f:
+            json.dump(catalog, f)
+        os.replace(path + ".tmp", path)
+    _loaded[db_path] = (signature, catalog)
+    return catalog
+
+
+def _fmt(value):
+    return f"{value:,.2f}" if isinstance(value, float) else str(value)
+
+
+def catalog_to_prompt(catalog):
+    """Compact schema description for the agent prompt."""
+    lines = []
+    for table, info in catalog["tables"].items():
+        lines.append(f"Table {table} ({info['rows']:,} rows):")
+        for col in info["columns"]:
+            detail = f"{col['distinct']:,} distinct"
+            if "values" in col:
+                detail = "values: " + ", ".join(repr(v) for v in col["values"])
+            elif col["min"] is not None:
+                detail += f", range {_fmt(col['min'])} to {_fmt(col['max'])}"
+            if col["nulls"]:
+                detail += f", {col['nulls']:,} NULL"
+            lines.append(f"  - {col['name']} {col['type']}: {detail}")
+        header = ", ".join(col["name"] for col in info["columns"])
+        lines.append(f"  Sample rows ({header}):")
+        lines.extend(f"    {tuple(row)}" for row in info["sample"])
+    # Braces would be read as template variables by the agent prompt
+    return "\n".join(lines).replace("{", "(").replace("}", ")")
+
+
+def agent_prefix(catalog):
+    return AGENT_PREFIX + catalog_to_prompt(catalog) + "\n"
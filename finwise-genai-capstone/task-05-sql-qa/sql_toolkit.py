@@ -0,0 +1,68 @@
+"""SQL agent toolkit whose query tool returns a digest instead of raw rows.
+
+Same tools as SQLDatabaseToolkit, except ``sql_db_query`` streams the result
+through result_stream.digest_query on a read-only connection and returns
+the bounded digest text. The app shows the actual rows in a paged table,
+starting from the first rows kept during the digest.
+With ``introspection=False`` the list-tables and schema tools are left out,
+for agents whose prompt already carries the schema catalog.
+"""
+import sqlite3
+from typing import Any, Callable, Optional, Type
+
+from langchain_community.agent_toolkits import SQLDatabaseToolkit
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from result_stream import KEEP_ROWS, digest_query
+
+
+class _DigestQueryInput(BaseModel):
+    query: str = Field(..., description="A detailed and correct SQL query.")
+
+
+class DigestSQLQueryTool(BaseTool):
+    """Runs a read-only query and returns its statistical digest."""
+
+    name: str = "sql_db_query"
+    description: str = "Execute a SQL query and get back a digest of the result (row count, sums, top values)."
+    args_schema: Type[BaseModel] = _DigestQueryInput
+    db_path: str
+    on_query: Optional[Callable[[str, float], Any]] = None  # Called with (sql, elapsed_ms)
+    max_tokens: int = 600
+
+    def _run(self, query: str, run_manager=None) -> str:
+        try:
+            digest, elapsed_ms = digest_query(self.db_path, query, keep_rows=KEEP_ROWS)
+        except sqlite3.Error as e:
+            return f"Error: {e}"
+        if self.on_query is not None:
+            self.on_query(query, elapsed_ms)
+        return digest.to_text(self.max_tokens)
+
+
+class DigestSQLToolkit(SQLDatabaseToolkit):
+    """SQLDatabaseToolkit with the digest query tool in place of the raw-rows one."""
+
+    db_path: str
+    on_query: Optional[Callable[[str, float], Any]] = None
+    introspection: bool = True  # False: the schema is in the prompt (schema_catalog)
+
+    def get_tools(self):
+        tools = super().get_tools()
+        if not self.introspection:
+            tools = [tool for tool in tools if tool.name not in ("sql_db_list_tables", "sql_db_schema")]
+        result = []
+        for tool in tools:
+            if tool.name == "sql_db_query":
+                description = tool.description.replace(
+                    "output is a result from the database",
+                    "output is a digest of the result (row count, per-column sums/min/max, "
+                    "top values and top rows); the user sees the full rows in a table",
+                )
+                if not self.introspection:
+                    description = description.replace("use sql_db_schema to query the correct table fields",
+                                                      "check the column names in the schema catalog")
+                tool = DigestSQLQueryTool(db_path=self.db_path, on_query=self.on_query, description=description)
+            result.append(tool)
+        return result
@@ -1,18 +1,20 @@
 import os
+import re
+import sys
+import json
+import hashlib
 import streamlit as st
-import google.generativeai as genai
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chains.summarize import load_summarize_chain
-from langchain_core.documents import Document
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_core.prompts import PromptTemplate
-from langchain.prompts import PromptTemplate as LangchainPromptTemplate
-from packaging import version
-import langchain
+# Document loaders, the text splitter and the Gemini client are imported on first use.
 import tempfile
 import requests # Import requests for N8N webhook
 
+# Make the shared finwise_common package (one level up) importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from finwise_common.config import LLM_BACKEND, state_path
+from finwise_common.tokens import estimate_tokens
+from finwise_common.jobs import JobQueue
+from summary_jobs import summarize_job, summarize_versioned_job
+
 # Page configuration for a clean, wide layout
 st.set_page_config(
     page_title="Financial Document Summarizer",
@@ -48,50 +50,56 @@ st.markdown("""
 try:
     api_key = st.secrets['GOOGLE_API_KEY']
 except KeyError:
-    st.error("🚨 Please set `GOOGLE_API_KEY` in your Streamlit secrets file (.streamlit/secrets.toml).")
-    st.stop()
+    if LLM_BACKEND != "local":
+        st.error("🚨 Please set `GOOGLE_API_KEY` in your Streamlit secrets file (.streamlit/secrets.toml).")
+        st.stop()
+    api_key = None # Offline: the summary jobs run on the local model
 
-# Configure environment and GenAI
-os.environ['GOOGLE_API_KEY'] = api_key
-genai.configure(api_key=api_key)
+# Configure environment (read by ChatGoogleGenerativeAI in the summary jobs)
+if api_key:
+    os.environ['GOOGLE_API_KEY'] = api_key
 
 # Sidebar for options
 st.sidebar.header("⚙️ Summarization Options")
-temperature = st.sidebar.slider("Temperature", 0.0, 1.0, 0.3, 0.1)
+temperature = st.sidebar.slider("Temperature", 0.0, 1.0, 0.3, 0.1,
+                                help="Used for the final summary; chunk summaries always run at 0.")
 chain_type = st.sidebar.selectbox(
     "Chain Type",
-    options=["stuff", "map_reduce", "refine"],
-    help="stuff: Fast for short docs; map_reduce: For long docs; refine: High-quality coherent summaries."
+    options=["auto", "stuff", "map_reduce", "refine"],
+    help="auto: Fastest strategy that fits the model limits, with chunks regrouped; stuff: Fast for short docs; "
+         "map_reduce: For long docs; refine: High-quality coherent summaries."
+)
+use_dedup = st.sidebar.checkbox(
+    "Remove near-duplicate chunks",
+    value=True,
+    help="Summarize repeated blocks (disclaimers, fund descriptions, headers) once, using MinHash similarity."
+)
+dedup_threshold = st.sidebar.slider("Duplicate similarity threshold", 0.5, 1.0, 0.85, 0.05, disabled=not use_dedup)
+use_facts_sheet = st.sidebar.checkbox(
+    "Facts sheet for tables",
+    value=True,
+    help="Extract key figures and table rows locally and send them as one compact list instead of the raw table chunks."
+)
+use_prefilter = st.sidebar.checkbox(
+    "Extractive pre-filter",
+    value=True,
+    help="Drop boilerplate and keep only the key sentences (figures, amounts, central content) locally before any LLM call."
+)
+extract_budget = st.sidebar.number_input(
+    "Pre-filter token budget", min_value=1000, max_value=200000, value=8000, step=1000, disabled=not use_prefilter
+)
+versioned = st.sidebar.checkbox(
+    "Versioned report series",
+    value=False,
+    help="For a new version of a report summarized before (e.g. next quarter): unchanged sections reuse their "
+         "stored summaries and only changed or new sections are summarized. Chain type and pre-filter do not apply."
 )
 verbose = st.sidebar.checkbox("Verbose (logs in console)", value=False)
 
-# Initialize LLM
-@st.cache_resource
-def get_llm(temp):
-    return ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=temp)
-
-llm = get_llm(temperature)
-
-# Prompt templates
-summary_prompt_template = """Write a concise summary of the following financial document, focusing on key financial figures, strategic developments, and future outlook:
-
-"{text}"
-
-CONCISE SUMMARY:"""
-
-refine_prompt_template = """Your job is to produce a final summary of the provided financial document.
-We have an existing summary up to a certain point: {existing_answer}
-We have the opportunity to refine the existing summary (only if needed) with some more context below:
-------------
-{text}
-------------
-Given the new context, refine the original summary to include any new key financial figures, strategic developments, or future outlook.
-If the context isn't useful, return the original summary.
-REFINED SUMMARY:"""
-
 # Document loading function
 @st.cache_data
 def load_documents(uploaded_files):
+    from langchain_community.document_loaders import PyPDFLoader, TextLoader
     raw_documents = []
     for uploaded_file in uploaded_files:
         # Create a temporary file to store the uploaded content
@@ -104,11 +112,15 @@ def load_documents(uploaded_files):
             if uploaded_file.type == "application/pdf":
                 loader = PyPDFLoader(temp_file_path)
                 docs = loader.load()
+                for doc in docs:
+                    doc.metadata["file_name"] = uploaded_file.name # source is the temp file path
                 raw_documents.extend(docs)
                 st.info(f"✅ Loaded {len(docs)} pages from PDF: {uploaded_file.name}")
             elif uploaded_file.type == "text/plain":
                 loader = TextLoader(temp_file_path)
                 docs = loader.load()
+                for doc in docs:
+                    doc.metadata["file_name"] = uploaded_file.name
                 raw_documents.extend(docs)
                 st.info(f"✅ Loaded text from TXT: {uploaded_file.name}")
             else:
@@ -122,6 +134,7 @@ def load_documents(uploaded_files):
 # Text splitter
 @st.cache_data
 def split_documents(raw_documents):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000,
         chunk_overlap=100,
@@ -130,63 +143,157 @@ def split_documents(raw_documents):
     )
     return text_splitter.split_documents(raw_documents)
 
-# Summarization function
-def summarize_documents(docs, chain_type, llm, verbose=False):
-    if not docs:
-        return "No documents provided for summarization."
+# Background job queue: summaries run on worker threads, not the script thread
+@st.cache_resource
+def get_job_queue():
+    queue = JobQueue(state_path("jobs.db"), max_workers=2)
+    queue.register("summarize", summarize_job)
+    queue.register("summarize_version", summarize_versioned_job)
+    return queue
 
-    summary_prompt = PromptTemplate(template=summary_prompt_template, input_variables=["text"])
+job_queue = get_job_queue()
 
-    if chain_type == "stuff":
-        total_length = sum(len(doc.page_content) for doc in docs)
-        if total_length > 50000:
-            st.warning("📄 Document is very large; the model may truncate content.")
-        chain = load_summarize_chain(
-            llm,
-            chain_type="stuff",
-            prompt=summary_prompt,
-            verbose=verbose
-        )
+def submit_summary_job(docs, chain_type, temperature, document_names, verbose=False, extract_budget_tokens=None,
+                       dedup_threshold=None, facts_sheet=False):
+    payload = {
+        "chain_type": chain_type,
+        "temperature": temperature,
+        "verbose": verbose,
+        "dedup_threshold": dedup_threshold,
+        "extract_budget_tokens": extract_budget_tokens,
+        "facts_sheet": facts_sheet,
+        "chunks": [{"text": doc.page_content, "metadata": doc.metadata} for doc in docs],
+        "document_names": document_names,
+    }
+    # Same documents + settings -> same job ID, so resubmitting reuses finished work
+    job_id = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:32]
+    return job_queue.submit("summarize", payload, job_id=job_id)
 
-    elif chain_type == "map_reduce":
-        combine_prompt = PromptTemplate(template=summary_prompt_template, input_variables=["text"])
-        if version.parse(langchain.__version__) >= version.parse("0.2.0"):
-            chain = load_summarize_chain(
-                llm,
-                chain_type="map_reduce",
-                map_prompt=summary_prompt,
-                combine_prompt=combine_prompt,
-                combine_document_variable_name="text",
-                verbose=verbose
-            )
-        else:
-            chain = load_summarize_chain(
-                llm,
-                chain_type="map_reduce",
-                map_prompt=summary_prompt,
-                reduce_prompt=combine_prompt,
-                combine_document_variable_name="text",
-                verbose=verbose
-            )
+def default_series(file_name):
+    # "acme_q3_fy2024.pdf" -> "acme": the same report series across quarters and years
+    stem = os.path.splitext(file_name)[0]
+    series = re.sub(r"(?i)(^|[\s_.-])(q[1-4]|h[12]|fy\s?\d{2,4}|\d{4}|v\d+|draft|final)(?=$|[\s_.-])", " ", stem)
+    return " ".join(series.replace("_", " ").split()) or stem
+
+def submit_version_job(sections, series, temperature, document_names, verbose=False):
+    payload = {
+        "chain_type": "versioned",
+        "series": series,
+        "temperature": temperature,
+        "verbose": verbose,
+        "sections": sections,
+        "document_names": document_names,
+    }
+    job_id = "v-" + hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:30]
+    return job_queue.submit("summarize_version", payload, job_id=job_id)
 
-    elif chain_type == "refine":
-        initial_prompt = PromptTemplate(template=summary_prompt_template, input_variables=["text"])
-        refine_prompt = PromptTemplate(template=refine_prompt_template, input_variables=["existing_answer", "text"])
-        chain = load_summarize_chain(
-            llm,
-            chain_type="refine",
-            question_prompt=initial_prompt,
-            refine_prompt=refine_prompt,
-            verbose=verbose
-        )
+def trigger_n8n_workflow(summary, job):
+    # Get N8N Webhook URL from environment variables or Streamlit secrets
+    # You should set this in .streamlit/secrets.toml: N8N_SUMMARY_WEBHOOK_URL="your_n8n_webhook_url"
+    N8N_WEBHOOK_URL = os.environ.get("N8N_SUMMARY_WEBHOOK_URL", st.secrets.get("N8N_SUMMARY_WEBHOOK_URL"))
+
+    if N8N_WEBHOOK_URL: # Check if a URL is provided
+        try:
+            # Prepare payload with relevant summary data
+            n8n_payload = {
+                "event": "document_summarized",
+                "summary": summary,
+                "chain_type_used": job["payload"]["chain_type"],
+                "document_names": job["payload"]["document_names"],
+                "num_chunks": len(job["payload"].get("chunks") or job["payload"].get("sections", [])),
+                "timestamp": os.getenv("CURRENT_TIMESTAMP", "N/A") # Example of dynamic data
+            }
+            response = requests.post(N8N_WEBHOOK_URL, json=n8n_payload, timeout=10) # 10-second timeout
+
+            if response.status_code == 200:
+                st.toast("N8N workflow triggered successfully!", icon="✅")
+            else:
+                st.toast(f"N8N workflow trigger failed: HTTP {response.status_code}", icon="⚠️")
+                st.info(f"N8N Response: {response.text}") # Show n8n's response for debugging
+        except requests.exceptions.Timeout:
+            st.toast("N8N workflow trigger timed out.", icon="⚠️")
+        except requests.exceptions.RequestException as e:
+            st.toast(f"N8N request error: {e}", icon="⚠️")
+        except Exception as e:
+            st.toast(f"Unexpected N8N error: {e}", icon="⚠️")
     else:
-        return "Invalid chain_type."
+        st.sidebar.info("N8N Webhook URL not configured. Skipping workflow trigger.")
+
+def render_summary_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        st.warning("⚠️ Summary job not found. It may have been cleaned up; please generate it again.")
+        return
 
-    try:
-        result = chain.invoke({"input_documents": docs}, return_only_outputs=True)
-        return result['output_text']
-    except Exception as e:
-        return f"❌ Error during summarization: {str(e)}"
+    st.subheader("📊 Document Summary")
+    st.caption(f"Job `{job_id}` · {job['payload']['chain_type']} · {', '.join(job['payload']['document_names'])}")
+
+    if job["status"] in ("queued", "running"):
+        total = max(job["total"], 1)
+        st.progress(min(job["completed"] / total, 1.0), text=job["message"] or "Waiting for a worker...")
+        partials = job_queue.chunk_outputs(job_id)
+        if partials:
+            with st.expander(f"🧩 Partial results ({len(partials)} of {job['total']} chunks)", expanded=False):
+                for i, partial in partials.items():
+                    st.markdown(f"**Chunk {i+1}:** {partial}")
+        st.button("🔄 Refresh status", key="refresh_job")
+        st.caption("You can refresh or close this page; the job keeps running and resumes after a restart.")
+
+    elif job["status"] == "failed":
+        st.error(f"❌ Error during summarization: {job['error']}")
+        if st.button("🔁 Retry", key="retry_job"):
+            job_queue.submit(job["kind"], job["payload"], job_id=job_id)
+            st.rerun()
+
+    else:
+        summary = job["result"]["summary"]
+        dedup = job["result"].get("dedup")
+        if dedup and dedup["duplicates"]:
+            per_document = ", ".join(f"{name}: {d['duplicates']} of {d['chunks']}"
+                                     for name, d in dedup["by_document"].items() if d["duplicates"])
+            st.caption(f"🧬 Near-duplicate chunks summarized once ({per_document}): "
+                       f"{dedup['llm_calls_saved']} LLM calls and ~{dedup['tokens_saved']:,} tokens saved")
+        versioning = job["result"].get("versioning")
+        if versioning:
+            st.caption(f"🗂️ {versioning['series']}: {versioning['unchanged']} sections reused, {versioning['changed']} updated "
+                       f"from a diff, {versioning['new']} new · {versioning['llm_calls']} LLM call(s), "
+                       f"~{versioning['tokens_sent']:,} of {versioning['tokens_full']:,} tokens sent")
+        plan = job["result"].get("plan")
+        if plan:
+            st.caption(f"🧭 Auto chose {plan['chain_type']}: {plan['calls']} LLM call(s), {plan['reason']}")
+        from finwise_common.llm_cache import stats_caption
+        from finwise_common.model_router import route_caption
+        st.caption(stats_caption("summarization"))
+        st.caption(route_caption("summarization"))
+        stats = job["result"].get("prefilter")
+        if stats:
+            st.caption(f"✂️ Pre-filter: {stats['tokens_in']:,} → {stats['tokens_out']:,} tokens, "
+                       f"{stats['chunks_in']} → {stats['chunks_out']} chunks "
+                       f"({stats['boilerplate_dropped']} boilerplate sentences dropped)")
+        facts = job["result"].get("facts")
+        if facts:
+            st.caption(f"📊 {facts['figures']} key figures extracted locally; {facts['table_chunks_replaced']} table chunks "
+                       f"(~{facts['tokens_replaced']:,} tokens) sent as a ~{facts['sheet_tokens']:,}-token facts sheet")
+        st.markdown(f'<div class="summary-box"><p>{summary}</p></div>', unsafe_allow_html=True)
+        if facts:
+            with st.expander("📊 Extracted key figures", expanded=False):
+                st.text(facts["sheet"])
+
+        # --- N8N Workflow Trigger (once per job) ---
+        notified = st.session_state.setdefault("notified_jobs", set())
+        if job_id not in notified:
+            trigger_n8n_workflow(summary, job)
+            notified.add(job_id)
+        # --- End N8N Workflow Trigger ---
+
+        # Download summary (stored as a job artifact)
+        with open(job["result"]["artifact_path"], "rb") as f:
+            st.download_button(
+                label="💾 Download Summary",
+                data=f.read(),
+                file_name="financial_summary.txt",
+                mime="text/plain"
+            )
 
 # Main content
 st.markdown('<h1 class="main-header">💼 Financial Document Summarizer</h1>', unsafe_allow_html=True)
@@ -224,55 +331,61 @@ if uploaded_files:
                     st.write(f"**Chunk {i+1}:**")
                     st.text(doc.page_content[:300] + "..." if len(doc.page_content) > 300 else doc.page_content)
         
-        # Summarize button
-        if st.button("🚀 Generate Summary", type="primary"):
-            with st.spinner(f"Summarizing with '{chain_type}' chain... This may take a while for long documents."):
-                summary = summarize_documents(docs, chain_type, llm, verbose)
-            
-            st.subheader("📊 Document Summary")
-            st.markdown(f'<div class="summary-box"><p>{summary}</p></div>', unsafe_allow_html=True)
-            
-            # --- N8N Workflow Trigger ---
-            # Get N8N Webhook URL from environment variables or Streamlit secrets
-            # You should set this in .streamlit/secrets.toml: N8N_SUMMARY_WEBHOOK_URL="your_n8n_webhook_url"
-            N8N_WEBHOOK_URL = os.environ.get("N8N_SUMMARY_WEBHOOK_URL", st.secrets.get("N8N_SUMMARY_WEBHOOK_URL"))
-            
-            if N8N_WEBHOOK_URL: # Check if a URL is provided
-                try:
-                    # Prepare payload with relevant summary data
-                    n8n_payload = {
-                        "event": "document_summarized",
-                        "summary": summary,
-                        "chain_type_used": chain_type,
-                        "document_names": [f.name for f in uploaded_files],
-                        "num_chunks": len(docs),
-                        "timestamp": os.getenv("CURRENT_TIMESTAMP", "N/A") # Example of dynamic data
-                    }
-                    response = requests.post(N8N_WEBHOOK_URL, json=n8n_payload, timeout=10) # 10-second timeout
-                    
-                    if response.status_code == 200:
-                        st.toast("N8N workflow triggered successfully!", icon="✅")
-                    else:
-                        st.toast(f"N8N workflow trigger failed: HTTP {response.status_code}", icon="⚠️")
-                        st.info(f"N8N Response: {response.text}") # Show n8n's response for debugging
-                except requests.exceptions.Timeout:
-                    st.toast("N8N workflow trigger timed out.", icon="⚠️")
-                except requests.exceptions.RequestException as e:
-                    st.toast(f"N8N request error: {e}", icon="⚠️")
-                except Exception as e:
-                    st.toast(f"Unexpected N8N error: {e}", icon="⚠️")
+        if versioned:
+            # Align with the stored previous version now, so the cost is known before starting
+            from section_store import SectionStore, align, split_sections
+            series = st.sidebar.text_input("Report series", value=default_series(uploaded_files[0].name))
+            sections = split_sections([(doc.page_content, doc.metadata.get("page")) for doc in raw_documents])
+            previous = SectionStore(state_path("summaries", "sections.db")).previous_version(series)
+            statuses = [match["status"] for match in align(sections, previous)]
+            to_summarize = len(statuses) - statuses.count("unchanged")
+            if previous:
+                st.info(f"🗂️ {len(sections)} sections vs. the previous '{series}' version: "
+                        f"{statuses.count('unchanged')} unchanged, {statuses.count('changed')} changed, "
+                        f"{statuses.count('new')} new → about {to_summarize + 1} LLM call(s)")
             else:
-                st.sidebar.info("N8N Webhook URL not configured. Skipping workflow trigger.")
-            # --- End N8N Workflow Trigger ---
+                st.info(f"🗂️ First version of '{series}': all {len(sections)} sections will be summarized "
+                        f"({len(sections) + 1} LLM calls); later versions reuse them.")
+            if st.button("🚀 Generate Summary", type="primary"):
+                job_id = submit_version_job(sections, series, temperature, [f.name for f in uploaded_files], verbose)
+                st.session_state.summary_job_id = job_id
+                st.query_params["job"] = job_id
+        else:
+            # Predicted cost of the chosen strategy (after the pre-filter; dedup can only lower it)
+            from chain_planner import STRATEGIES, plan_summary, predict
+            chunk_tokens = [estimate_tokens(doc.page_content) for doc in docs]
+            if use_prefilter and sum(chunk_tokens) > extract_budget:
+                # The pre-filter keeps ~extract_budget tokens re-packed into ~1000-token chunks
+                chunk_tokens = [1000] * (int(extract_budget) // 1000) + [int(extract_budget) % 1000 or 1000]
+            plan = plan_summary(chunk_tokens) if chain_type == "auto" else predict(chain_type, chunk_tokens)
+            st.info(f"🧭 {'Auto → ' if chain_type == 'auto' else ''}{plan['chain_type']}: {plan['calls']} LLM call(s), "
+                    f"about {plan['seconds'] / 60:.1f} min" + (f" ({plan['reason']})" if plan["reason"] else ""))
+            if not plan["fits"]:
+                st.warning(f"📄 {plan['reason'] or 'Document is very large'}; the model may truncate content. Try `auto`.")
+            with st.expander("📐 Compare strategies", expanded=False):
+                options = [(c, predict(c, chunk_tokens)) for c in STRATEGIES]
+                if chain_type == "auto":
+                    options.append((f"auto → {plan['chain_type']} (regrouped)", plan))
+                st.table([
+                    {"Strategy": label, "LLM calls": p["calls"], "Parallel": p["concurrency"],
+                     "Est. time (min)": round(p["seconds"] / 60, 1), "Fits limits": "✅" if p["fits"] else "❌"}
+                    for label, p in options
+                ])
 
-            # Download summary
-            st.download_button(
-                label="💾 Download Summary",
-                data=summary,
-                file_name="financial_summary.txt",
-                mime="text/plain"
-            )
+            # Summarize button: submits a background job and returns immediately
+            if st.button("🚀 Generate Summary", type="primary"):
+                job_id = submit_summary_job(docs, chain_type, temperature, [f.name for f in uploaded_files], verbose,
+                                            extract_budget_tokens=int(extract_budget) if use_prefilter else None,
+                                            dedup_threshold=dedup_threshold if use_dedup else None,
+                                            facts_sheet=use_facts_sheet)
+                st.session_state.summary_job_id = job_id
+                st.query_params["job"] = job_id # Keeps the job visible across page refreshes
     else:
         st.warning("⚠️ No valid content loaded from the uploaded files.")
 else:
     st.info("👆 Please upload at least one PDF or TXT file to get started.")
+
+# Job status, partial results and download for the current summary job
+current_job_id = st.session_state.get("summary_job_id") or st.query_params.get("job")
+if current_job_id:
+    render_summary_job(current_job_id)
@@ -0,0 +1,123 @@
+"""Pick and size the summarization strategy from token counts.
+
+Every strategy is costed from the chunk token counts with a simple latency
+model (fixed overhead per call, prefill and generation speed) plus the
+Gemini rate limits (requests and tokens per minute). A call may not carry
+more than MAX_INPUT_TOKENS; beyond that a single-call summary drops detail
+even though the model window is larger. ``plan_summary`` returns the fastest
+strategy that fits, with chunks regrouped to the largest balanced size, so
+the UI can show the predicted calls and wall time before a job starts.
+
+Limits are read from the environment (SUMMARY_CONTEXT_TOKENS,
+SUMMARY_MAX_INPUT_TOKENS, SUMMARY_RPM, SUMMARY_TPM, SUMMARY_MAX_CONCURRENCY);
+the defaults match gemini-2.0-flash on the free tier.
+"""
+import math
+import os
+
+CONTEXT_TOKENS = int(os.environ.get("SUMMARY_CONTEXT_TOKENS", 1_048_576))
+MAX_INPUT_TOKENS = min(int(os.environ.get("SUMMARY_MAX_INPUT_TOKENS", 100_000)), CONTEXT_TOKENS - 8192)
+REQUESTS_PER_MINUTE = int(os.environ.get("SUMMARY_RPM", 15))
+TOKENS_PER_MINUTE = int(os.environ.get("SUMMARY_TPM", 1_000_000))
+MAX_CONCURRENCY = int(os.environ.get("SUMMARY_MAX_CONCURRENCY", 4))
+
+PROMPT_TOKENS = 80           # Instructions around the text
+MAP_OUTPUT_TOKENS = 250      # A chunk / group summary
+FINAL_OUTPUT_TOKENS = 600    # The final summary (stuff, reduce, refine steps)
+CALL_OVERHEAD_SECONDS = 1.0
+PREFILL_TOKENS_PER_SECOND = 10_000
+OUTPUT_TOKENS_PER_SECOND = 150
+
+STRATEGIES = ("stuff", "map_reduce", "refine")
+
+
+def call_seconds(input_tokens, output_tokens):
+    return CALL_OVERHEAD_SECONDS + input_tokens / PREFILL_TOKENS_PER_SECOND + output_tokens / OUTPUT_TOKENS_PER_SECOND
+
+
+def regroup(texts, group_tokens, separator="\n\n"):
+    """Concatenate consecutive texts into groups of at most ``group_tokens`` (a longer text stays alone)."""
+    from finwise_common.tokens import estimate_tokens
+
+    groups, current, current_tokens = [], [], 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if current and current_tokens + tokens > group_tokens:
+            groups.append(separator.join(current))
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        groups.append(separator.join(current))
+    return groups
+
+
+def _group_sizes(chunk_tokens, group_tokens):
+    sizes, current = [], 0
+    for tokens in chunk_tokens:
+        if current and current + tokens > group_tokens:
+            sizes.append(current)
+            current = 0
+        current += tokens
+    if current:
+        sizes.append(current)
+    return sizes
+
+
+def _rate_floor(calls, tokens):
+    # Whatever exceeds the first minute's allowance of requests or tokens has to wait for later minutes
+    return 60 * max((calls - REQUESTS_PER_MINUTE) / REQUESTS_PER_MINUTE, (tokens - TOKENS_PER_MINUTE) / TOKENS_PER_MINUTE, 0)
+
+
+def predict(chain_type, chunk_tokens, group_tokens=None):
+    """Cost of one strategy: {"chain_type", "group_tokens", "groups", "calls", "concurrency", "seconds", "fits", "reason"}."""
+    total = sum(chunk_tokens)
+    sizes = _group_sizes(chunk_tokens, group_tokens) if group_tokens else list(chunk_tokens)
+    plan = {"chain_type": chain_type, "group_tokens": group_tokens, "groups": len(sizes), "concurrency": 1,
+            "fits": True, "reason": ""}
+    if chain_type == "stuff":
+        plan.update(groups=1, calls=1, seconds=call_seconds(total + PROMPT_TOKENS, FINAL_OUTPUT_TOKENS))
+        if total + PROMPT_TOKENS > MAX_INPUT_TOKENS:
+            plan.update(fits=False, reason=f"{total:,} tokens exceed the {MAX_INPUT_TOKENS:,}-token per-call limit")
+    elif chain_type == "map_reduce":
+        concurrency = max(1, min(MAX_CONCURRENCY, len(sizes)))
+        waves = math.ceil(len(sizes) / concurrency)
+        map_seconds = waves * call_seconds(max(sizes, default=0) + PROMPT_TOKENS, MAP_OUTPUT_TOKENS)
+        reduce_tokens = len(sizes) * MAP_OUTPUT_TOKENS + PROMPT_TOKENS
+        seconds = max(map_seconds, _rate_floor(len(sizes), total)) + call_seconds(reduce_tokens, FINAL_OUTPUT_TOKENS)
+        plan.update(calls=len(sizes) + 1, concurrency=concurrency, seconds=seconds)
+        if max(sizes, default=0) + PROMPT_TOKENS > MAX_INPUT_TOKENS or reduce_tokens > MAX_INPUT_TOKENS:
+            plan.update(fits=False, reason="a group or the combined summaries exceed the per-call limit")
+    elif chain_type == "refine":
+        # Serial: each step carries the running summary along with the next group
+        seconds = sum(call_seconds(size + FINAL_OUTPUT_TOKENS + PROMPT_TOKENS, FINAL_OUTPUT_TOKENS) for size in sizes)
+        plan.update(calls=len(sizes), seconds=max(seconds, _rate_floor(len(sizes), total)))
+        if max(sizes, default=0) + FINAL_OUTPUT_TOKENS + PROMPT_TOKENS > MAX_INPUT_TOKENS:
+            plan.update(fits=False, reason="a chunk exceeds the per-call limit")
+    else:
+        raise ValueError(f"Invalid chain_type: {chain_type}")
+    return plan
+
+
+def plan_summary(chunk_tokens):
+    """Fastest strategy that fits, with chunks regrouped to balanced groups under the per-call limit."""
+    total = sum(chunk_tokens)
+    group_limit = MAX_INPUT_TOKENS - FINAL_OUTPUT_TOKENS - PROMPT_TOKENS
+    n_groups = max(1, math.ceil(total / group_limit))
+    # Balanced groups; a little slack so greedy packing of whole chunks stays within n_groups + 1
+    group_tokens = min(group_limit, math.ceil(total / n_groups * 1.1))
+    candidates = [predict("stuff", chunk_tokens)]
+    candidates += [predict(chain_type, chunk_tokens, group_tokens) for chain_type in ("map_reduce", "refine")]
+    fitting = [plan for plan in candidates if plan["fits"]]
+    if not fitting:
+        best = candidates[1]
+        best["reason"] = f"{total:,} tokens are too many even for map_reduce; raise SUMMARY_MAX_INPUT_TOKENS"
+        return best
+    best = min(fitting, key=lambda plan: plan["seconds"])
+    best["reason"] = {
+        "stuff": f"all {total:,} tokens fit in one call",
+        "map_reduce": f"{total:,} tokens need {best['groups']} groups of up to {group_tokens:,} tokens, "
+                      f"summarized {best['concurrency']} at a time",
+        "refine": "fewest calls for this size",
+    }[best["chain_type"]]
+    return best
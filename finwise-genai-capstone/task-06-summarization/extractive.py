@@ -0,0 +1,183 @@
+"""Local extractive pre-filter for the summarizer.
+
+Runs before any LLM call: drops boilerplate (headers and footers repeated
+across pages, tables of contents, disclaimers), scores the remaining
+sentences with TextRank over TF-IDF cosine similarity, boosts sentences
+that carry figures, percentages or currency amounts, weights them by how
+central their chunk is to the document, and keeps the best ones within a
+token budget. Kept sentences stay in document order and are re-packed into
+chunks, so map_reduce / refine make fewer calls and more documents fit the
+single-call stuff path.
+
+Everything is vectorized with NumPy over a sparse (row, term, weight)
+representation; TextRank multiplies by X·Xᵀ without materializing the
+sentence-by-sentence matrix, so cost grows with the number of terms, not
+the square of the number of sentences.
+"""
+import re
+from collections import Counter
+
+import numpy as np
+
+from finwise_common.tokens import estimate_tokens
+
+# Split after . ! ? followed by whitespace (so 12.5% stays whole), except after "Rs." / "No.", and at line breaks
+_SENTENCE_SPLIT_RE = re.compile(r"(?<!\bRs\.)(?<!\bNo\.)(?<=[.!?])\s+|\n+")
+_WORD_RE = re.compile(r"[a-z][a-z0-9'&-]+|\d[\d,.]*%?")
+_STOPWORDS = frozenset("""a about above after again against all also am an and any are as at be because been before
+being below between both but by can could did do does doing down during each few for from further had has have
+having he her here hers him his how i if in into is it its itself just me more most my no nor not now of off on
+once only or other our ours out over own same she should so some such than that the their them then there these
+they this those through to too under until up very was we were what when where which while who whom why will with
+would you your""".split())
+_FIGURE_RE = re.compile(r"\d")
+_AMOUNT_RE = re.compile(r"(₹|rs\.?\s?\d|inr|\$|€|£|usd|crore|lakh|\bcr\b|million|billion|\bbn\b|\bmn\b|%|per\s?cent|"
+                        r"basis points|\bbps\b)", re.I)
+_BOILERPLATE_RE = re.compile(
+    r"(table of contents|all rights reserved|disclaimer|forward[- ]looking statements?|this (document|report) "
+    r"(is|has been) (prepared|provided) for|past performance is not|mutual fund investments are subject to|"
+    r"read all scheme related documents|for internal use only|confidential|^\s*page \d+( of \d+)?\s*$|"
+    r"\.{4,}\s*\d+\s*$)", re.I | re.M)
+
+FIGURE_BOOST = 0.25  # Any digit
+AMOUNT_BOOST = 0.5   # Currency, percentages, crore / lakh / million
+DAMPING = 0.85
+MAX_SIMILARITY = 0.7  # A sentence this close to one already kept adds nothing
+
+
+def split_sentences(text):
+    return [s.strip() for s in _SENTENCE_SPLIT_RE.split(text) if s.strip()]
+
+
+def _repeated_lines(texts, min_share=0.3):
+    """Lines (normalized) that recur on many chunks: running headers and footers."""
+    if len(texts) < 4:
+        return set()
+    counts = Counter()
+    for text in texts:
+        counts.update({" ".join(line.lower().split()) for line in text.splitlines() if line.strip()})
+    return {line for line, n in counts.items() if n >= max(3, min_share * len(texts))}
+
+
+def _tfidf(token_lists):
+    """Sparse L2-normalized TF-IDF as (rows, cols, vals) arrays plus the vocabulary size."""
+    vocab = {}
+    rows, cols = [], []
+    for i, tokens in enumerate(token_lists):
+        for token in tokens:
+            rows.append(i)
+            cols.append(vocab.setdefault(token, len(vocab)))
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    n, v = len(token_lists), len(vocab)
+    # Collapse duplicate (row, term) pairs into term frequencies
+    keys, tf = np.unique(rows * max(v, 1) + cols, return_counts=True)
+    rows, cols = keys // max(v, 1), keys % max(v, 1)
+    df = np.bincount(cols, minlength=v)
+    vals = (1 + np.log(tf)) * (np.log((1 + n) / (1 + df)) + 1)[cols]
+    norms = np.sqrt(np.bincount(rows, weights=vals ** 2, minlength=n))
+    vals = vals / np.where(norms > 0, norms, 1)[rows]
+    return rows, cols, vals, v
+
+
+def textrank(rows, cols, vals, n, v, iterations=30):
+    """PageRank over cosine similarity S = X·Xᵀ (self-loops removed), matrix-free."""
+    def similarity_times(vector):
+        term_totals = np.bincount(cols, weights=vals * vector[rows], minlength=v)
+        self_sim = np.bincount(rows, weights=vals ** 2, minlength=n)
+        return np.bincount(rows, weights=vals * term_totals[cols], minlength=n) - self_sim * vector
+
+    degree = similarity_times(np.ones(n))
+    degree = np.where(degree > 1e-12, degree, 1.0)
+    rank = np.full(n, 1.0 / n)
+    for _ in range(iterations):
+        updated = (1 - DAMPING) / n + DAMPING * similarity_times(rank / degree)
+        if np.abs(updated - rank).sum() < 1e-6:
+            return updated
+        rank = updated
+    return rank
+
+
+def _centrality(rows, cols, vals, n, v):
+    # Cosine of each row with the L2-normalized centroid of all rows
+    centroid = np.bincount(cols, weights=vals, minlength=v)
+    centroid /= max(np.linalg.norm(centroid), 1e-12)
+    return np.bincount(rows, weights=vals * centroid[cols], minlength=n)
+
+
+def prefilter(texts, max_tokens, pack_tokens=1000):
+    """Keep the highest-scoring sentences of ``texts`` (chunks in order) within ``max_tokens``.
+
+    Returns (packed_texts, stats): the kept sentences in document order, re-packed
+    into chunks of about ``pack_tokens``, and a dict of before / after counts.
+    """
+    repeated = _repeated_lines(texts)
+    sentences, chunk_of, seen = [], [], set()
+    dropped_boilerplate = 0
+    for c, text in enumerate(texts):
+        lines = [line for line in text.splitlines() if " ".join(line.lower().split()) not in repeated]
+        for sentence in split_sentences("\n".join(lines)):
+            key = " ".join(sentence.lower().split())
+            if key in seen:
+                continue  # Exact repeats (chunk overlap, repeated notices) count once
+            seen.add(key)
+            if _BOILERPLATE_RE.search(sentence) or len(_WORD_RE.findall(key)) < 4:
+                dropped_boilerplate += 1
+                continue
+            sentences.append(sentence)
+            chunk_of.append(c)
+    tokens_in = sum(estimate_tokens(t) for t in texts)
+    stats = {"tokens_in": tokens_in, "chunks_in": len(texts), "sentences_in": len(sentences) + dropped_boilerplate,
+             "boilerplate_dropped": dropped_boilerplate}
+    if not sentences:
+        return [], {**stats, "tokens_out": 0, "chunks_out": 0, "sentences_out": 0}
+
+    token_lists = [[w for w in _WORD_RE.findall(s.lower()) if w not in _STOPWORDS] for s in sentences]
+    n = len(sentences)
+    rows, cols, vals, v = _tfidf(token_lists)
+    rank = textrank(rows, cols, vals, n, v) * n  # Mean 1
+
+    # Chunk centrality: chunks far from the document's topic (notices, appendices) count less
+    chunk_of = np.asarray(chunk_of)
+    chunk_ids, chunk_index = np.unique(chunk_of, return_inverse=True)
+    chunk_tokens = [[] for _ in chunk_ids]
+    for i, k in enumerate(chunk_index):
+        chunk_tokens[k].extend(token_lists[i])
+    chunk_rows, chunk_cols, chunk_vals, chunk_v = _tfidf(chunk_tokens)
+    chunk_score = _centrality(chunk_rows, chunk_cols, chunk_vals, len(chunk_ids), chunk_v)
+    chunk_score = chunk_score / max(chunk_score.max(), 1e-12)
+
+    boost = 1 + np.array([AMOUNT_BOOST if _AMOUNT_RE.search(s) else FIGURE_BOOST if _FIGURE_RE.search(s) else 0.0
+                          for s in sentences])
+    score = rank * boost * (0.5 + 0.5 * chunk_score[chunk_index])
+
+    lengths = np.array([estimate_tokens(s) + 1 for s in sentences])
+    keep = np.zeros(n, dtype=bool)
+    closest = np.zeros(n)  # Highest cosine similarity to any kept sentence
+    starts = np.searchsorted(rows, np.arange(n + 1))  # rows is sorted, so each sentence's terms are a slice
+    term_weights = np.zeros(v)
+    budget = max_tokens
+    for i in np.argsort(-score, kind="stable"):
+        if lengths[i] > budget or closest[i] > MAX_SIMILARITY:
+            continue
+        keep[i] = True
+        budget -= lengths[i]
+        if budget < lengths.min():
+            break
+        own = slice(starts[i], starts[i + 1])
+        term_weights[cols[own]] = vals[own]
+        closest = np.maximum(closest, np.bincount(rows, weights=vals * term_weights[cols], minlength=n))
+        term_weights[cols[own]] = 0
+
+    packed, current, current_tokens = [], [], 0
+    for i in np.flatnonzero(keep):
+        if current and current_tokens + lengths[i] > pack_tokens:
+            packed.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(sentences[i])
+        current_tokens += lengths[i]
+    if current:
+        packed.append(" ".join(current))
+    stats.update(tokens_out=sum(estimate_tokens(t) for t in packed), chunks_out=len(packed),
+                 sentences_out=int(keep.sum()))
+    return packed, stats
@@ -0,0 +1,237 @@
+"""Sections of versioned documents and their stored summaries.
+
+A report is cut into sections at headings (numbered, "Note 4", ALL CAPS);
+without headings, content-defined boundaries are used instead: a paragraph
+ends a section when its hash hits a fixed pattern, so an insertion early in
+the report only moves the boundaries around it. Sections are hashed after
+normalization (case, whitespace, page numbers), and each section summary is
+stored by that hash.
+
+For a new upload of a series, ``align`` pairs every section with the
+previous version: an identical hash reuses the stored summary, a fuzzy match
+(title plus MinHash content similarity) is updated from a sentence diff,
+and anything else is summarized from scratch. So a new quarter costs about
+the size of its diff.
+"""
+import difflib
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from finwise_common.tokens import estimate_tokens
+
+# Markdown, numbered ("2.1 Revenue", "IV. Outlook", "Note 4 Borrowings") or ALL CAPS headings
+_HEADING_RE = re.compile(
+    r"^\s*(#{1,4}\s+\S.{0,100}|(\d+(\.\d+){0,3}\.?|[IVX]{1,5}\.|(?i:section|note|part|schedule)\s+\d+[A-Za-z]?[.:]?)"
+    r"\s+[A-Z].{0,100}|[A-Z][A-Z0-9 &/,'()-]{3,80})\s*$")
+_PAGE_LINE_RE = re.compile(r"^\s*(page\s+)?\d+(\s+of\s+\d+)?\s*$", re.I)
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+MIN_SECTION_TOKENS = 150   # Shorter heading sections are merged into the next one
+MAX_SECTION_TOKENS = 3000  # Longer ones are split at content-defined paragraph boundaries
+BOUNDARY_MODULUS = 6       # Content-defined cut after ~1 in 6 paragraphs
+MATCH_THRESHOLD = 0.5      # Below this, a section counts as new
+
+
+def _is_heading(line):
+    stripped = line.strip()
+    # Short, and not ending like a sentence
+    return bool(_HEADING_RE.match(stripped)) and len(stripped.split()) <= 14 and not stripped.endswith((".", ","))
+
+
+def _title_key(title):
+    # "3. Liquidity" and "4. Liquidity" are the same section after renumbering
+    return " ".join(re.sub(r"^\s*(#+|\d+(\.\d+)*\.?|[ivx]+\.)\s*", "", title.lower()).split())
+
+
+def normalize(text):
+    lines = [line for line in text.splitlines() if not _PAGE_LINE_RE.match(line)]
+    return " ".join(" ".join(lines).lower().split())
+
+
+def section_hash(text):
+    return hashlib.sha256(normalize(text).encode()).hexdigest()[:32]
+
+
+def _split_long(title, paragraphs, pages):
+    # Content-defined chunking: boundaries depend on paragraph content, not on offsets
+    sections, current, tokens = [], [], 0
+    for paragraph in paragraphs:
+        current.append(paragraph)
+        tokens += estimate_tokens(paragraph)
+        at_boundary = zlib.crc32(normalize(paragraph).encode()) % BOUNDARY_MODULUS == 0
+        if tokens >= MAX_SECTION_TOKENS or (at_boundary and tokens >= MIN_SECTION_TOKENS * 4):
+            sections.append({"title": title, "text": "\n\n".join(current), "pages": pages})
+            current, tokens = [], 0
+    if current:
+        sections.append({"title": title, "text": "\n\n".join(current), "pages": pages})
+    for i, section in enumerate(sections[1:], start=2):
+        section["title"] = f"{title} (part {i})"
+    return sections
+
+
+def split_sections(pages):
+    """Sections of a document given as [(page_text, page_number)], in order.
+
+    Returns [{"title", "text", "pages", "hash", "tokens"}].
+    """
+    blocks = []  # (title, [paragraphs], {pages})
+    title, paragraphs, block_pages = "Opening", [], set()
+    for page_text, page in pages:
+        paragraph = []
+        for line in page_text.splitlines() + [""]:
+            if _PAGE_LINE_RE.match(line):
+                continue
+            if _is_heading(line):
+                if paragraph:
+                    paragraphs.append("\n".join(paragraph))
+                    paragraph = []
+                if paragraphs:
+                    blocks.append((title, paragraphs, block_pages))
+                title, paragraphs, block_pages = line.strip(), [], set()
+            elif line.strip():
+                paragraph.append(line.strip())
+                if page is not None:
+                    block_pages.add(page)
+            elif paragraph:
+                paragraphs.append("\n".join(paragraph))
+                paragraph = []
+    if paragraphs:
+        blocks.append((title, paragraphs, block_pages))
+
+    # Merge tiny heading blocks forward (a heading followed by one line, a TOC entry)
+    merged = []
+    carry_title, carry_paragraphs, carry_pages = None, [], set()
+    for title, paragraphs, block_pages in blocks:
+        if carry_paragraphs:
+            title = carry_title
+            paragraphs = carry_paragraphs + paragraphs
+            block_pages = carry_pages | block_pages
+        if sum(estimate_tokens(p) for p in paragraphs) < MIN_SECTION_TOKENS:
+            carry_title, carry_paragraphs, carry_pages = title, paragraphs, block_pages
+            continue
+        carry_paragraphs, carry_pages = [], set()
+        merged.append((title, paragraphs, block_pages))
+    if carry_paragraphs:
+        merged.append((carry_title, carry_paragraphs, carry_pages))
+
+    sections = []
+    for title, paragraphs, block_pages in merged:
+        sections.extend(_split_long(title, paragraphs, sorted(block_pages)))
+    for section in sections:
+        section["hash"] = section_hash(section["text"])
+        section["tokens"] = estimate_tokens(section["text"])
+    return sections
+
+
+def sentence_diff(old_text, new_text):
+    """Removed and added sentences between two versions of a section, as prompt text."""
+    old = [s.strip() for s in _SENTENCE_SPLIT_RE.split(old_text) if s.strip()]
+    new = [s.strip() for s in _SENTENCE_SPLIT_RE.split(new_text) if s.strip()]
+    lines = []
+    for op, i1, i2, j1, j2 in difflib.SequenceMatcher(a=old, b=new, autojunk=False).get_opcodes():
+        if op in ("replace", "delete"):
+            lines.extend(f"- {s}" for s in old[i1:i2])
+        if op in ("replace", "insert"):
+            lines.extend(f"+ {s}" for s in new[j1:j2])
+    return "\n".join(lines)
+
+
+def align(sections, previous):
+    """Pair each new section with a previous one.
+
+    Returns one dict per new section: {"status": "unchanged" | "changed" | "new", "previous": dict or None,
+    "similarity"}. Unchanged = same hash; changed = best fuzzy match above MATCH_THRESHOLD (each previous
+    section is used once).
+    """
+    from finwise_common.dedup import minhash_signatures
+
+    result = [{"status": "new", "previous": None, "similarity": 0.0} for _ in sections]
+    by_hash = {}
+    for old in previous:
+        by_hash.setdefault(old["hash"], []).append(old)
+    used = set()
+    for i, section in enumerate(sections):
+        matches = [old for old in by_hash.get(section["hash"], []) if id(old) not in used]
+        if matches:
+            used.add(id(matches[0]))
+            result[i] = {"status": "unchanged", "previous": matches[0], "similarity": 1.0}
+    pending = [i for i, r in enumerate(result) if r["status"] == "new"]
+    remaining = [old for old in previous if id(old) not in used]
+    if not pending or not remaining:
+        return result
+
+    new_signatures = minhash_signatures([normalize(sections[i]["text"]) for i in pending])
+    old_signatures = minhash_signatures([normalize(old["text"]) for old in remaining])
+    content = (new_signatures[:, None, :] == old_signatures[None, :, :]).mean(axis=2)
+    scores = []
+    for a, i in enumerate(pending):
+        for b, old in enumerate(remaining):
+            new_title, old_title = _title_key(sections[i]["title"]), _title_key(old["title"])
+            title = difflib.SequenceMatcher(a=new_title, b=old_title).ratio()
+            score = 0.7 * content[a, b] + 0.3 * title
+            if new_title == old_title and content[a, b] > 0:
+                score = max(score, MATCH_THRESHOLD)  # Same heading, rewritten body: still that section
+            scores.append((score, i, b))
+    # Greedy best-first matching, each side used once
+    taken_new, taken_old = set(), set()
+    for score, i, b in sorted(scores, reverse=True):
+        if score < MATCH_THRESHOLD:
+            break
+        if i in taken_new or b in taken_old:
+            continue
+        taken_new.add(i)
+        taken_old.add(b)
+        result[i] = {"status": "changed", "previous": remaining[b], "similarity": float(score)}
+    return result
+
+
+class SectionStore:
+    """Section summaries by content hash, and the sections of each version of a series."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS section_summaries (
+                    hash TEXT PRIMARY KEY, summary TEXT NOT NULL, created_at REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS versions (
+                    series TEXT NOT NULL, version_id TEXT NOT NULL, sections TEXT NOT NULL,
+                    created_at REAL NOT NULL, PRIMARY KEY (series, version_id));
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def get_summary(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT summary FROM section_summaries WHERE hash = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put_summary(self, key, summary):
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO section_summaries (hash, summary, created_at) VALUES (?, ?, ?)",
+                         (key, summary, time.time()))
+
+    def previous_version(self, series, exclude_version=None):
+        """Sections of the latest stored version of ``series`` (other than ``exclude_version``), or []."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT sections FROM versions WHERE series = ? AND version_id != ? "
+                               "ORDER BY created_at DESC LIMIT 1", (series, exclude_version or "")).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def save_version(self, series, version_id, sections):
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO versions (series, version_id, sections, created_at) VALUES (?, ?, ?, ?)",
+                         (series, version_id, json.dumps(sections), time.time()))
+
+    def versions(self, series):
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT version_id FROM versions WHERE series = ? ORDER BY created_at", (series,))]
@@ -0,0 +1,259 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from finwise_common.tokens import estimate_tokens
+
+# Routes pinned to a temperature; the others use the job's temperature (the sidebar slider)
+ROUTE_TEMPERATURES = {"map": 0}
+
+# Prompt templates
+summary_prompt_template = """Write a concise summary of the following financial document, focusing on key financial figures, strategic developments, and future outlook:
+
+"{text}"
+
+CONCISE SUMMARY:"""
+
+refine_prompt_template = """Your job is to produce a final summary of the provided financial document.
+We have an existing summary up to a certain point: {existing_answer}
+We have the opportunity to refine the existing summary (only if needed) with some more context below:
+------------
+{text}
+------------
+Given the new context, refine the original summary to include any new key financial figures, strategic developments, or future outlook.
+If the context isn't useful, return the original summary.
+REFINED SUMMARY:"""
+
+section_update_prompt_template = """Below is the summary of one section of a financial document, written for its previous version, followed by the sentences that changed in the new version (- removed, + added).
+Update the summary so it describes the new version: replace changed figures, add new developments and drop what was removed. Keep everything else as it is.
+
+PREVIOUS SUMMARY:
+{existing_summary}
+
+CHANGES:
+------------
+{diff}
+------------
+UPDATED SUMMARY:"""
+
+
+def _complete(llm, prompt):
+    return llm.invoke(prompt).content
+
+
+def _pages_from_chunks(chunks):
+    # Reassemble page texts from overlapping chunks (start_index is the offset in the page), so tables keep their headers
+    pages = {}
+    for chunk in sorted(chunks, key=lambda c: c["metadata"].get("start_index", 0)):
+        metadata = chunk["metadata"]
+        key = (metadata.get("file_name") or metadata.get("source"), metadata.get("page"))
+        text = pages.get(key, "")
+        start = metadata.get("start_index", len(text))
+        pages[key] = text[:start] + chunk["text"] if start <= len(text) else text + "\n" + chunk["text"]
+    return [(text, page) for (_, page), text in pages.items()]
+
+
+def summarize_job(ctx):
+    """Job handler for the 'summarize' kind.
+
+    Payload: {"chain_type", "temperature", "chunks": [{"text", "metadata"}], ...}.
+    With "dedup_threshold" set, near-duplicate chunks are summarized once.
+    With "facts_sheet" set, table rows are extracted locally and chunks that
+    are mostly table rows are replaced by one compact facts sheet.
+    With "extract_budget_tokens" set, the chunks first go through the local
+    extractive pre-filter and the kept sentences are re-packed into fewer chunks.
+    chain_type "auto" lets chain_planner pick the fastest strategy that fits and
+    regroup the chunks for it. Map summaries (map_reduce, run concurrently) and
+    running summaries (refine) are checkpointed per chunk, so a resumed job
+    continues from the last completed chunk (the pre-filter and the planner are
+    deterministic, so the chunk indexes still match).
+    """
+    from chain_planner import MAX_CONCURRENCY, plan_summary, regroup
+    from finwise_common.model_router import chat_model, route_policy
+
+    payload = ctx.payload
+    chain_type = payload["chain_type"]
+    texts = [chunk["text"] for chunk in payload["chunks"]]
+    metadatas = [chunk["metadata"] for chunk in payload["chunks"]]
+    # Chunk summaries on the fast model, combining / refining / stuffing on the strong one (summarization.* routes).
+    # Map steps run at temperature 0 so re-summarized chunks hit the completion cache
+    llms = {route: chat_model("summarization", route, temperature=ROUTE_TEMPERATURES.get(route, payload["temperature"]))
+            for route in route_policy("summarization")}
+    done = ctx.completed_chunks()
+
+    def report(message):
+        ctx.set_message(message)
+        if payload.get("verbose"):
+            print(f"[summarize {ctx.job_id[:8]}] {message}")
+
+    sheet, facts_report = "", None
+    if payload.get("facts_sheet"):
+        from finwise_common.facts import TABLE_CHUNK_SHARE, extract_facts, facts_sheet, table_share
+        report("Extracting key figures and tables...")
+        facts = extract_facts(_pages_from_chunks(payload["chunks"]))
+        kept = [i for i, text in enumerate(texts) if table_share(text) < TABLE_CHUNK_SHARE]
+        # Prose figures stay in the kept chunks; the sheet stands in for the rows of the replaced chunks
+        replaced = "\n".join(text for i, text in enumerate(texts) if i not in set(kept))
+        sheet = facts_sheet([fact for fact in facts if fact["kind"] == "table" and fact["context"] in replaced])
+        if sheet:
+            replaced_tokens = sum(estimate_tokens(text) for text in texts) - sum(estimate_tokens(texts[i]) for i in kept)
+            facts_report = {"figures": len(facts), "table_chunks_replaced": len(texts) - len(kept),
+                            "tokens_replaced": replaced_tokens, "sheet_tokens": estimate_tokens(sheet), "sheet": sheet}
+            texts, metadatas = [texts[i] for i in kept], [metadatas[i] for i in kept]
+
+    dedup_report = None
+    if payload.get("dedup_threshold") and texts:
+        from finwise_common.dedup import dedup_chunks
+        kept, _, dedup_report = dedup_chunks(texts, metadatas, payload["dedup_threshold"])
+        kept_set = set(kept)
+        dedup_report["tokens_saved"] = sum(estimate_tokens(t) for i, t in enumerate(texts) if i not in kept_set)
+        # One map / refine call per chunk; with the pre-filter the chunks are re-packed, so only tokens are saved
+        per_chunk_calls = chain_type in ("map_reduce", "refine") and not payload.get("extract_budget_tokens")
+        dedup_report["llm_calls_saved"] = dedup_report["duplicates"] if per_chunk_calls else 0
+        texts = [texts[i] for i in kept]
+
+    prefilter_stats = None
+    if payload.get("extract_budget_tokens") and texts:
+        from extractive import prefilter
+        report("Selecting key sentences locally...")
+        texts, prefilter_stats = prefilter(texts, payload["extract_budget_tokens"])
+    if sheet:
+        texts = [sheet] + texts  # Not pre-filtered: every line is already a figure
+    if not texts:
+        raise ValueError("No content left after removing boilerplate.")
+
+    plan = None
+    if chain_type == "auto":
+        plan = plan_summary([estimate_tokens(t) for t in texts])
+        chain_type = plan["chain_type"]
+        if plan["group_tokens"]:
+            texts = regroup(texts, plan["group_tokens"])
+        report(f"Auto: {chain_type} with {len(texts)} chunk(s), {plan['reason']}")
+
+    if chain_type == "stuff":
+        ctx.set_total(1)
+        report("Summarizing the whole document in one call...")
+        summary = _complete(llms["stuff"], summary_prompt_template.format(text="\n\n".join(texts)))
+
+    elif chain_type == "map_reduce":
+        ctx.set_total(len(texts))
+        pending = [i for i in range(len(texts)) if i not in done]
+
+        def summarize_chunk(i):
+            output = _complete(llms["map"], summary_prompt_template.format(text=texts[i]))
+            ctx.checkpoint(i, output)
+            return i, output
+
+        # Chunk summaries are independent, so they run a few at a time (bounded for the rate limits)
+        workers = max(1, min(MAX_CONCURRENCY, len(pending)))
+        report(f"Summarizing {len(pending)} of {len(texts)} chunks, {workers} at a time...")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for i, output in pool.map(summarize_chunk, pending):
+                done[i] = output
+                report(f"Summarized {len(done)} of {len(texts)} chunks...")
+        report("Combining chunk summaries...")
+        summary = _complete(llms["combine"],
+                            summary_prompt_template.format(text="\n\n".join(done[i] for i in range(len(texts)))))
+
+    elif chain_type == "refine":
+        ctx.set_total(len(texts))
+        summary = None
+        for i, text in enumerate(texts):
+            if i in done:
+                summary = done[i]
+                continue
+            report(f"Refining with chunk {i + 1} of {len(texts)}...")
+            if summary is None:
+                summary = _complete(llms["refine"], summary_prompt_template.format(text=text))
+            else:
+                summary = _complete(llms["refine"], refine_prompt_template.format(existing_answer=summary, text=text))
+            ctx.checkpoint(i, summary)
+
+    else:
+        raise ValueError(f"Invalid chain_type: {chain_type}")
+
+    # Store the summary as a downloadable artifact next to the job record.
+    artifact_path = os.path.join(ctx.artifact_dir(), "financial_summary.txt")
+    with open(artifact_path, "w", encoding="utf-8") as f:
+        f.write(summary)
+    return {"summary": summary, "artifact_path": artifact_path, "prefilter": prefilter_stats,
+            "dedup": dedup_report, "plan": plan, "facts": facts_report}
+
+
+def summarize_versioned_job(ctx):
+    """Job handler for the 'summarize_version' kind: a new version of a document series.
+
+    Payload: {"series", "temperature", "sections": [{"title", "text", "pages", "hash", "tokens"}], ...}.
+    Sections are aligned with the series' previous version. Unchanged sections reuse their stored
+    summary, changed ones are updated from a sentence diff, new ones are summarized; then the section
+    summaries are combined. Section summaries are stored by content hash and checkpointed per section.
+    """
+    from chain_planner import MAX_CONCURRENCY
+    from finwise_common.model_router import chat_model
+    from finwise_common.config import state_path
+    from section_store import SectionStore, align, section_hash, sentence_diff
+
+    payload = ctx.payload
+    series, sections = payload["series"], payload["sections"]
+    # Section summaries and updates are map steps (temperature 0); the combined summary is the synthesis
+    map_llm = chat_model("summarization", "map", temperature=ROUTE_TEMPERATURES["map"])
+    combine_llm = chat_model("summarization", "combine", temperature=payload["temperature"])
+    store = SectionStore(state_path("summaries", "sections.db"))
+    previous = store.previous_version(series, exclude_version=ctx.job_id)
+    alignment = align(sections, previous)
+    done = ctx.completed_chunks()
+    ctx.set_total(len(sections))
+
+    counts = {"unchanged": 0, "changed": 0, "new": 0}
+    tokens_sent = 0
+    summaries, tasks = {}, []
+    for i, (section, match) in enumerate(zip(sections, alignment)):
+        counts[match["status"]] += 1
+        stored = store.get_summary(section["hash"])
+        old_summary = store.get_summary(match["previous"]["hash"]) if match["previous"] else None
+        if i in done or stored:
+            summaries[i] = done.get(i) or stored
+            if i not in done:
+                ctx.checkpoint(i, summaries[i])
+        elif match["status"] == "changed" and old_summary:
+            prompt = section_update_prompt_template.format(
+                existing_summary=old_summary, diff=sentence_diff(match["previous"]["text"], section["text"]))
+            tasks.append((i, prompt))
+        else:
+            tasks.append((i, summary_prompt_template.format(text=section["text"])))
+    tokens_sent += sum(estimate_tokens(prompt) for _, prompt in tasks)
+    llm_calls = len(tasks)
+
+    def summarize_section(task):
+        i, prompt = task
+        output = _complete(map_llm, prompt)
+        store.put_summary(sections[i]["hash"], output)
+        ctx.checkpoint(i, output)
+        return i, output
+
+    ctx.set_message(f"{counts['unchanged']} unchanged, {counts['changed']} changed, {counts['new']} new sections; "
+                    f"summarizing {len(tasks)}...")
+    if tasks:
+        with ThreadPoolExecutor(max_workers=max(1, min(MAX_CONCURRENCY, len(tasks)))) as pool:
+            for i, output in pool.map(summarize_section, tasks):
+                summaries[i] = output
+
+    # The combined summary is reused too when no section changed at all
+    combined_key = section_hash("combine:" + "|".join(section["hash"] for section in sections))
+    summary = store.get_summary(combined_key)
+    if summary is None:
+        ctx.set_message("Combining section summaries...")
+        combined = "\n\n".join(f"{section['title']}:\n{summaries[i]}" for i, section in enumerate(sections))
+        tokens_sent += estimate_tokens(combined)
+        llm_calls += 1
+        summary = _complete(combine_llm, summary_prompt_template.format(text=combined))
+        store.put_summary(combined_key, summary)
+    store.save_version(series, ctx.job_id, [{key: section[key] for key in ("title", "text", "pages", "hash")}
+                                            for section in sections])
+
+    artifact_path = os.path.join(ctx.artifact_dir(), "financial_summary.txt")
+    with open(artifact_path, "w", encoding="utf-8") as f:
+        f.write(summary)
+    versioning = {"series": series, "previous_sections": len(previous), "sections": len(sections), **counts,
+                  "llm_calls": llm_calls,
+                  "tokens_full": sum(section["tokens"] for section in sections), "tokens_sent": tokens_sent}
+    return {"summary": summary, "artifact_path": artifact_path, "versioning": versioning}